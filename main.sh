@@ -1,12 +1,8 @@
 #!/bin/bash
 
-# Ensure the public directory is cleared
-rm -rf public
-mkdir public
+# Build into the existing public/: unchanged pages and static files are left
+# alone, and files the build no longer produces are pruned
+python3 src/main.py --precompress
 
-# Run your Python script to generate the site
-python3 src/main.py
-
-# Change to the public directory and start the server
-cd public
-python3 -m http.server 8888
\ No newline at end of file
+# Serve public/ with keep-alive, caching headers, ranges and precompressed files
+python3 src/serve.py --port 8888
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import random
+
+# Synthetic markdown corpora for the benchmarks. Every shape is generated
+# from a seed, so two runs with the same arguments see identical input.
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "elven", "ring", "shire", "mordor", "gondor"]
+
+CORPUS_SHAPES = ("small-pages", "huge-pages", "inline-heavy", "list-heavy", "code-heavy", "link-dense")
+
+
+def inline_fragment(rng):
+    word = rng.choice(WORDS)
+    kind = rng.randrange(8)
+    if kind == 0:
+        return f"**{word}**"
+    if kind == 1:
+        return f"*{word}*"
+    if kind == 2:
+        return f"`{word}()`"
+    if kind == 3:
+        return f"[{word}](/{word}/{rng.randrange(1000)})"
+    if kind == 4:
+        return f"![{word}](/images/{word}.png)"
+    return word
+
+
+def plain_sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def large_paragraph(rng, words):
+    return " ".join(inline_fragment(rng) for _ in range(words))
+
+
+def long_list_items(rng, items):
+    return [" ".join(inline_fragment(rng) for _ in range(8)) for _ in range(items)]
+
+
+def link_dense_paragraph(rng, links):
+    # Navigation-style text: mostly links, many of them repeated
+    fragments = []
+    for _ in range(links):
+        word = rng.choice(WORDS)
+        if rng.randrange(10) == 0:
+            fragments.append(f"![{word}](/images/{word}.png)")
+        else:
+            fragments.append(f"[{word}](/{word}/{rng.randrange(50)})")
+    return " | ".join(fragments)
+
+
+def code_listing(rng, lines):
+    # A fenced listing with blank lines and markdown-looking characters in it
+    body = []
+    for n in range(lines):
+        if rng.randrange(8) == 0:
+            body.append("")
+        else:
+            body.append(f"    {rng.choice(WORDS)}_{n} = *args[{n}] if a < b else `{rng.choice(WORDS)}`")
+    return "```python\n" + "\n".join(body) + "\n```"
+
+
+def mixed_blocks(rng, count):
+    blocks = []
+    for i in range(count):
+        kind = rng.randrange(6)
+        if kind == 0:
+            blocks.append(f"## {plain_sentence(rng, 4)}")
+        elif kind == 1:
+            blocks.append("\n".join(f"* {large_paragraph(rng, 6)}" for _ in range(rng.randint(2, 6))))
+        elif kind == 2:
+            blocks.append("\n".join(f"{n}. {large_paragraph(rng, 6)}" for n in range(1, rng.randint(3, 7))))
+        elif kind == 3:
+            blocks.append("> " + plain_sentence(rng, 12))
+        elif kind == 4:
+            blocks.append("```\n" + "\n".join(f"line_{n} = {n}" for n in range(rng.randint(3, 12))) + "\n```")
+        else:
+            blocks.append(large_paragraph(rng, rng.randint(20, 60)))
+    return blocks
+
+
+def page(rng, title, blocks):
+    return "\n\n".join([f"# {title}"] + blocks) + "\n"
+
+
+def generate_corpus(shape, pages, seed=0):
+    # Yields (relative path, markdown) pairs. pages scales the corpus: it is
+    # the page count for most shapes and a hundred times the count of huge
+    # pages.
+    if shape not in CORPUS_SHAPES:
+        raise ValueError(f"Unknown corpus shape: {shape}")
+    rng = random.Random(f"{shape}:{seed}")
+    if shape == "huge-pages":
+        for i in range(max(1, pages // 100)):
+            yield f"huge/page{i}.md", page(rng, f"Huge page {i}", mixed_blocks(rng, 5000))
+    elif shape == "small-pages":
+        for i in range(pages):
+            yield f"small/section{i % 20}/page{i}.md", page(rng, f"Page {i}", mixed_blocks(rng, rng.randint(4, 12)))
+    elif shape == "inline-heavy":
+        for i in range(pages):
+            blocks = [large_paragraph(rng, rng.randint(150, 300)) for _ in range(10)]
+            yield f"inline/page{i}.md", page(rng, f"Inline page {i}", blocks)
+    elif shape == "code-heavy":
+        for i in range(pages):
+            blocks = [plain_sentence(rng, 12), code_listing(rng, 1000), plain_sentence(rng, 12)]
+            yield f"code/page{i}.md", page(rng, f"Code page {i}", blocks)
+    elif shape == "link-dense":
+        for i in range(pages):
+            blocks = [link_dense_paragraph(rng, 1000) for _ in range(3)]
+            yield f"links/page{i}.md", page(rng, f"Link page {i}", blocks)
+    else:
+        for i in range(pages):
+            lists = ["\n".join(f"* {item}" for item in long_list_items(rng, 200)) for _ in range(3)]
+            yield f"lists/page{i}.md", page(rng, f"List page {i}", lists)
+
+
+def write_corpus(dest_dir, shape, pages, seed=0):
+    paths = []
+    for rel_path, markdown in generate_corpus(shape, pages, seed):
+        path = os.path.join(dest_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(markdown)
+        paths.append(path)
+    return paths
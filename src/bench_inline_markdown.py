@@ -0,0 +1,43 @@
+import argparse
+import random
+import timeit
+
+from bench_corpus import large_paragraph, link_dense_paragraph, long_list_items
+from inline_markdown import text_to_textnodes, split_nodes, split_nodes_image, split_nodes_link
+from textnode import TextNode, text_type_text, text_type_bold, text_type_italic, text_type_code
+
+# Compares the single-pass inline scanner with the chained split_nodes passes
+# it replaced. Run with: python3 src/bench_inline_markdown.py
+
+
+def chained_text_to_textnodes(text):
+    nodes = [TextNode(text, text_type_text)]
+    nodes = split_nodes(nodes, "**", text_type_bold)
+    nodes = split_nodes(nodes, "*", text_type_italic)
+    nodes = split_nodes(nodes, "`", text_type_code)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return [node for node in nodes if node.text != ""]
+
+
+def run(name, texts, repeat):
+    chained = min(timeit.repeat(lambda: [chained_text_to_textnodes(t) for t in texts], number=1, repeat=repeat))
+    scanner = min(timeit.repeat(lambda: [text_to_textnodes(t) for t in texts], number=1, repeat=repeat))
+    print(f"{name:<18} chained {chained * 1000:9.2f} ms   single-pass {scanner * 1000:9.2f} ms   speedup {chained / scanner:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inline markdown tokenizing")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    run("large paragraph", [large_paragraph(rng, 20000)], args.repeat)
+    run("many paragraphs", [large_paragraph(rng, 100) for _ in range(500)], args.repeat)
+    run("long list", long_list_items(rng, 20000), args.repeat)
+    run("link dense", [link_dense_paragraph(rng, 5000) for _ in range(4)], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from bench_corpus import CORPUS_SHAPES, write_corpus
+from inline_markdown import (
+    block_to_block_type,
+    block_type_code,
+    markdown_to_blocks,
+    markdown_to_html_node,
+    text_to_textnodes,
+)
+from template import Template
+
+# Times each stage of the markdown pipeline over synthetic corpora and
+# saves the results as JSON so later runs can be compared against them.
+#
+#   python3 src/benchmark.py --pages 200 --output bench.json
+#   python3 src/benchmark.py --pages 200 --compare bench.json
+
+BENCH_TEMPLATE = (
+    "<!DOCTYPE html>\n<html>\n<head><title> {{ Title }} </title></head>\n"
+    "<body><article>{{ Content }}</article></body>\n</html>"
+)
+
+STAGES = (
+    "read",
+    "markdown_to_blocks",
+    "block_to_block_type",
+    "text_to_textnodes",
+    "markdown_to_html_node",
+    "to_html",
+    "template",
+    "write",
+)
+
+# markdown_to_blocks, block_to_block_type and text_to_textnodes are timed on
+# their own but also run inside markdown_to_html_node, so only these stages
+# add up to the end-to-end time
+PIPELINE_STAGES = ("read", "markdown_to_html_node", "to_html", "template", "write")
+
+
+def timed(fn, repeat):
+    # Best of repeat runs; the last run's result feeds the next stage
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def write_pages(out_dir, pages):
+    for i, page_html in enumerate(pages):
+        with open(os.path.join(out_dir, f"page{i}.html"), 'w') as f:
+            f.write(page_html)
+
+
+def bench_corpus(shape, pages, seed, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        content_dir = os.path.join(tmp, "content")
+        out_dir = os.path.join(tmp, "public")
+        os.makedirs(out_dir)
+        paths = write_corpus(content_dir, shape, pages, seed)
+
+        def read_all():
+            texts = []
+            for path in paths:
+                with open(path, 'r') as f:
+                    texts.append(f.read())
+            return texts
+
+        timings = {}
+        timings["read"], documents = timed(read_all, repeat)
+        timings["markdown_to_blocks"], page_blocks = timed(
+            lambda: [markdown_to_blocks(document) for document in documents], repeat
+        )
+        blocks = [block for page_block in page_blocks for block in page_block]
+        timings["block_to_block_type"], block_types = timed(lambda: [block_to_block_type(b) for b in blocks], repeat)
+        inline_blocks = [block for block, block_type in zip(blocks, block_types) if block_type != block_type_code]
+        timings["text_to_textnodes"], _ = timed(lambda: [text_to_textnodes(b) for b in inline_blocks], repeat)
+        timings["markdown_to_html_node"], nodes = timed(
+            lambda: [markdown_to_html_node(document) for document in documents], repeat
+        )
+        timings["to_html"], contents = timed(lambda: [node.to_html() for node in nodes], repeat)
+        template = Template(BENCH_TEMPLATE)
+        timings["template"], rendered = timed(
+            lambda: [template.render({"Title": "Benchmark", "Content": content}) for content in contents], repeat
+        )
+        timings["write"], _ = timed(lambda: write_pages(out_dir, rendered), repeat)
+
+        return {
+            "pages": len(paths),
+            "blocks": len(blocks),
+            "bytes": sum(len(document.encode()) for document in documents),
+            "stages": timings,
+            "total": sum(timings[stage] for stage in PIPELINE_STAGES),
+        }
+
+
+def compare(results, baseline, threshold):
+    # Returns the (shape, stage, ratio) entries that got slower than the
+    # baseline by more than threshold
+    regressions = []
+    for shape, result in results["corpora"].items():
+        old = baseline.get("corpora", {}).get(shape)
+        if old is None:
+            continue
+        for stage, seconds in list(result["stages"].items()) + [("total", result["total"])]:
+            old_seconds = old["stages"].get(stage) if stage != "total" else old.get("total")
+            if not old_seconds:
+                continue
+            ratio = seconds / old_seconds
+            marker = "  REGRESSION" if ratio > 1 + threshold else ""
+            print(f"  {shape:<13} {stage:<22} {old_seconds * 1000:10.2f} ms -> {seconds * 1000:10.2f} ms  {ratio:5.2f}x{marker}")
+            if marker:
+                regressions.append((shape, stage, ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the markdown pipeline stage by stage")
+    parser.add_argument("--shapes", nargs="+", choices=CORPUS_SHAPES, default=list(CORPUS_SHAPES))
+    parser.add_argument("--pages", type=int, default=100, help="corpus size (pages per shape; huge-pages uses pages/100)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown ratio reported as a regression (default: 0.10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pages": args.pages,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "corpora": {},
+    }
+    for shape in args.shapes:
+        result = bench_corpus(shape, args.pages, args.seed, args.repeat)
+        results["corpora"][shape] = result
+        print(f"{shape} ({result['pages']} pages, {result['blocks']} blocks, {result['bytes']} bytes)")
+        for stage in STAGES:
+            print(f"  {stage:<22} {result['stages'][stage] * 1000:10.2f} ms")
+        print(f"  {'total':<22} {result['total'] * 1000:10.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+            return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
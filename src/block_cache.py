@@ -0,0 +1,86 @@
+import os
+import sqlite3
+
+from build_manifest import GENERATOR_VERSION, hash_bytes
+from htmlnode import HTMLNode
+
+# SQLite caps the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+# One open cache per path and process, so every page rendered by a worker
+# shares the same connection
+open_block_caches = {}
+
+
+class BlockCache:
+    # On-disk map from a markdown block's hash to the HTML it renders to.
+    # SQLite in WAL mode lets several build processes read and write the
+    # same file at once.
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blocks (key TEXT PRIMARY KEY, html TEXT NOT NULL)")
+        self.connection.commit()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, block):
+        # The generator version is part of the key so a renderer change
+        # never serves fragments produced by the old one
+        return hash_bytes(f"{GENERATOR_VERSION}\0{block}".encode())
+
+    def lookup(self, keys):
+        found = {key: self.pending[key] for key in keys if key in self.pending}
+        missing = list({key for key in keys if key not in found})
+        for i in range(0, len(missing), LOOKUP_BATCH_SIZE):
+            batch = missing[i:i + LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.connection.execute(f"SELECT key, html FROM blocks WHERE key IN ({placeholders})", batch)
+            found.update(rows)
+        return found
+
+    def render_blocks(self, blocks, render_block, anchors):
+        # blocks are MarkdownBlocks and anchors their ids from
+        # heading_anchors; render_block turns a block and its id into an
+        # HTMLNode. A heading's id depends on the headings before it, so it
+        # is part of the key.
+        keys = [self.key(block.text if anchor is None else f"{block.text}\0#{anchor}") for block, anchor in zip(blocks, anchors)]
+        fragments = self.lookup(keys)
+        children = []
+        for block, anchor, key in zip(blocks, anchors, keys):
+            html = fragments.get(key)
+            if html is None:
+                html = render_block(block, anchor=anchor).to_html()
+                fragments[key] = html
+                self.pending[key] = html
+                self.misses += 1
+            else:
+                self.hits += 1
+            children.append(HTMLNode(None, html))
+        return children
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.connection.executemany("INSERT OR REPLACE INTO blocks (key, html) VALUES (?, ?)", self.pending.items())
+        self.connection.commit()
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __repr__(self):
+        return f"BlockCache({self.path}, hits: {self.hits}, misses: {self.misses})"
+
+
+def open_block_cache(path):
+    cache = open_block_caches.get(path)
+    if cache is None:
+        cache = BlockCache(path)
+        open_block_caches[path] = cache
+    return cache
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+
+# Bump whenever a change to the renderer alters the generated HTML, so that
+# manifests written by an older generator are thrown away.
+GENERATOR_VERSION = "4"
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_versioned(path, key):
+    # The key entry of a state file written by save_versioned, or {} when
+    # the file is missing, unreadable or from another generator version
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != GENERATOR_VERSION:
+        return {}
+    return data.get(key, {})
+
+
+def save_versioned(path, key, value, indent=2, separators=None):
+    # Written to a temporary file first so a build killed halfway leaves
+    # the previous state in place
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"version": GENERATOR_VERSION, key: value}, f, indent=indent, separators=separators, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class BuildManifest:
+    def __init__(self, path, pages=None):
+        self.path = path
+        self.pages = pages if pages is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(path, load_versioned(path, "pages"))
+
+    def save(self):
+        save_versioned(self.path, "pages", self.pages)
+
+    def is_current(self, rel_path, source_hash, template_hash, dest_path):
+        entry = self.pages.get(rel_path)
+        if entry is None:
+            return False
+        return (
+            entry["source_hash"] == source_hash
+            and entry["template_hash"] == template_hash
+            and entry["version"] == GENERATOR_VERSION
+            and os.path.exists(dest_path)
+        )
+
+    def record(self, rel_path, source_hash, template_hash, output, references=()):
+        # references are the site paths of the images and assets the page
+        # looked up, so a change to one only rebuilds the pages using it
+        self.pages[rel_path] = {
+            "source_hash": source_hash,
+            "template_hash": template_hash,
+            "output": output,
+            "version": GENERATOR_VERSION,
+            "references": sorted(references),
+        }
+
+    def references(self, rel_path):
+        entry = self.pages.get(rel_path)
+        return entry.get("references", []) if entry is not None else []
+
+    def forget(self, rel_path):
+        self.pages.pop(rel_path, None)
+
+    def remove_stale(self, seen):
+        # Drop entries whose markdown source no longer exists and return the
+        # outputs they produced so the caller can delete them.
+        stale = [rel_path for rel_path in self.pages if rel_path not in seen]
+        return [self.pages.pop(rel_path)["output"] for rel_path in stale]
+
+    def __repr__(self):
+        return f"BuildManifest({self.path}, pages: {len(self.pages)})"
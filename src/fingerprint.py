@@ -0,0 +1,183 @@
+import os
+import posixpath
+import re
+
+from static_sync import cached_hash, load_state, save_state, transfer, walk_files
+
+# Fingerprinted copies of static assets: index.css is also written to
+# public/ as index.<hash>.css, and pages link to that name instead. Its
+# URL changes whenever its content does, so it can be cached forever.
+# The originals are still synced for anything that links to them directly.
+
+HASH_LENGTH = 10
+fingerprinted_pattern = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$')
+
+UNFINGERPRINTED_EXTENSIONS = (".html", ".htm")
+
+url_attribute_pattern = re.compile(r'(\b(?:href|src)=")([^"]*)"|(\bsrcset=")([^"]*)"')
+
+
+class FingerprintStats:
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def summary(self):
+        return f"{self.written} written, {self.unchanged} unchanged, {self.removed} removed"
+
+    def __repr__(self):
+        return f"FingerprintStats({self.summary()})"
+
+
+def fingerprint_name(rel_path, source_hash):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{source_hash[:HASH_LENGTH]}{ext}"
+
+
+def is_fingerprinted(path):
+    return fingerprinted_pattern.search(path) is not None
+
+
+def is_fingerprintable(rel_path):
+    # Hidden files (.DS_Store, anything under .git/) and files without an
+    # extension aren't assets a page links to, and pages keep their URLs
+    name = rel_path.rpartition('/')[2]
+    if any(part.startswith('.') for part in rel_path.split('/')) or '.' not in name:
+        return False
+    return not rel_path.endswith(UNFINGERPRINTED_EXTENSIONS) and not is_fingerprinted(rel_path)
+
+
+def fingerprint_directory(source, destination, state_path, changes=None, minifier=None):
+    # Writes a fingerprinted copy of every asset under source into
+    # destination and removes copies of old versions. Files are only
+    # hashed when their size or mtime changed since the last run. The state
+    # at state_path maps each asset to its fingerprinted name. With a
+    # MinifyCache, the files it handles are written minified. Their name
+    # comes from the source hash and the minifier version, so it changes
+    # with both without minifying unchanged files to find out.
+    old_assets = load_state(state_path)
+    assets = {}
+    stats = FingerprintStats()
+    for rel_path, source_path in walk_files(source):
+        rel_path = rel_path.replace(os.sep, '/')
+        if not is_fingerprintable(rel_path):
+            continue
+        stat = os.stat(source_path)
+        entry = old_assets.get(rel_path)
+        source_hash = cached_hash(source_path, stat, entry)
+        minify = minifier is not None and minifier.handles(rel_path)
+        if minify:
+            output = fingerprint_name(rel_path, minifier.output_hash(source_hash))
+            current_entry = entry and entry["hash"] == source_hash and entry.get("minified") == minifier.version
+            output_size = entry["output_size"] if current_entry else None
+        else:
+            output = fingerprint_name(rel_path, source_hash)
+            output_size = stat.st_size
+        dest_path = os.path.join(destination, output)
+        try:
+            dest_stat = os.stat(dest_path)
+            current = dest_stat.st_size == output_size and dest_stat.st_mtime_ns == stat.st_mtime_ns
+        except FileNotFoundError:
+            current = False
+        if current:
+            stats.unchanged += 1
+        else:
+            if minify:
+                output_size = minifier.install(source_path, source_hash, dest_path, stat.st_mtime_ns)
+            else:
+                transfer(source_path, dest_path)
+            stats.written += 1
+            if changes is not None:
+                changes.write(output)
+        assets[rel_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": source_hash, "output": output}
+        if minify:
+            assets[rel_path].update(minified=minifier.version, output_size=output_size)
+
+    current_outputs = {entry["output"] for entry in assets.values()}
+    for entry in old_assets.values():
+        if entry["output"] in current_outputs:
+            continue
+        stale_path = os.path.join(destination, entry["output"])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+            stats.removed += 1
+            if changes is not None:
+                changes.remove(entry["output"])
+
+    save_state(assets, state_path)
+    return stats
+
+
+def fingerprint_outputs(assets):
+    return {entry["output"] for entry in assets.values()}
+
+
+# Loaded asset states keyed by path, reused until the file changes on disk
+open_asset_states = {}
+
+
+class AssetUrls:
+    # Points href, src and srcset URLs of a rendered page at the
+    # fingerprinted copies of the assets they name. Relative URLs stay
+    # relative, query strings and fragments are kept.
+    def __init__(self, assets):
+        self.outputs = {'/' + rel_path: '/' + entry["output"] for rel_path, entry in assets.items()}
+
+    def resolve(self, path):
+        # What the page renders for an asset at site path path
+        return self.outputs.get(path)
+
+    def rewrite_url(self, url, page_path, references=None):
+        path, separator, suffix = url.partition('?')
+        if not separator:
+            path, separator, suffix = url.partition('#')
+        if path.startswith('/'):
+            if path.startswith('//'):
+                return url
+            path = posixpath.normpath(path)
+            if references is not None:
+                references.add(path)
+            output = self.outputs.get(path)
+            return url if output is None else output + separator + suffix
+        if path == "" or ':' in path.split('/', 1)[0]:
+            # Fragment-only, or a scheme such as https: or mailto:
+            return url
+        base = page_path if page_path.endswith('/') else posixpath.dirname(page_path) + '/'
+        site_path = posixpath.normpath(posixpath.join(base, path))
+        if references is not None:
+            references.add(site_path)
+        output = self.outputs.get(site_path)
+        if output is None:
+            return url
+        # Keep the directory part of the original so the URL stays relative
+        directory = path.rpartition('/')[0]
+        name = output.rpartition('/')[2]
+        return (directory + '/' if directory else "") + name + separator + suffix
+
+    def rewrite(self, html, page_path, references=None):
+        # The site paths looked up are added to references, if given
+        if 'src="' not in html and 'href="' not in html and 'srcset="' not in html:
+            return html
+
+        def replace(match):
+            if match.group(1) is not None:
+                return f'{match.group(1)}{self.rewrite_url(match.group(2), page_path, references)}"'
+            candidates = []
+            for candidate in match.group(4).split(','):
+                url, space, descriptor = candidate.strip().partition(' ')
+                candidates.append(self.rewrite_url(url, page_path, references) + space + descriptor)
+            return f'{match.group(3)}{", ".join(candidates)}"'
+
+        return url_attribute_pattern.sub(replace, html)
+
+
+def open_asset_urls(path):
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = open_asset_states.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    asset_urls = AssetUrls(load_state(path))
+    open_asset_states[path] = (key, asset_urls)
+    return asset_urls
@@ -1,22 +1,59 @@
+class FrozenList(list):
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("shared empty children list cannot be modified")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+
+
+class FrozenDict(dict):
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("shared empty props dict cannot be modified")
+
+    update = pop = popitem = clear = setdefault = _readonly
+    __setitem__ = __delitem__ = __ior__ = _readonly
+
+
+# Leaves and prop-less nodes make up most of a page, so they all point at
+# these instead of allocating an empty list and dict each
+EMPTY_CHILDREN = FrozenList()
+EMPTY_PROPS = FrozenDict()
+
+
 class HTMLNode:
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
-        self.children = children if children is not None else []
-        self.props = props if props is not None else {}
+        self.children = children if children is not None else EMPTY_CHILDREN
+        self.props = props if props is not None else EMPTY_PROPS
 
-    def to_html(self):
+    def iter_html(self):
+        # Yields the serialized HTML in chunks, so large documents can be
+        # streamed to a file without building the whole string first.
         if self.value is None:
-            if self.tag is None:
-                return ''.join(child.to_html() for child in self.children)
-            else:
-                children_html = ''.join(child.to_html() for child in self.children)
-                return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+            if self.tag is not None:
+                yield f"<{self.tag}{self.props_to_html()}>"
+            for child in self.children:
+                yield from child.iter_html()
+            if self.tag is not None:
+                yield f"</{self.tag}>"
         else:
             if self.tag is None:
-                return self.value
+                yield self.value
             else:
-                return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+                yield f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+
+    def to_html(self):
+        return ''.join(self.iter_html())
+
+    def write_html(self, fp):
+        fp.writelines(self.iter_html())
 
     def props_to_html(self):
         if not self.props:
@@ -27,33 +64,38 @@ class HTMLNode:
         return f"HTMLNode(tag='{self.tag}', value='{self.value}', children={self.children}, props={self.props})"
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, None, props)
 
-    def to_html(self):
+    def iter_html(self):
         if self.value is None:
             raise ValueError("Invalid HTML: no value")
         if self.tag is None:
-            return self.value
-        return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+            yield self.value
+        else:
+            yield f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
 
     def __repr__(self):
         return f"LeafNode({self.tag}, {self.value}, {self.props})"
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
 
-    def to_html(self):
+    def iter_html(self):
         if self.tag is None:
             raise ValueError("Invalid HTML: no tag")
         if self.children is None:
             raise ValueError("Invalid HTML: no children")
-        children_html = ""
+        yield f"<{self.tag}{self.props_to_html()}>"
         for child in self.children:
-            children_html += child.to_html()
-        return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+            yield from child.iter_html()
+        yield f"</{self.tag}>"
 
     def __repr__(self):
         return f"ParentNode({self.tag}, children: {self.children}, {self.props})"
@@ -0,0 +1,328 @@
+import os
+import posixpath
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from build_manifest import hash_file, load_versioned, save_versioned
+from static_sync import copy_file, walk_files
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Image stage for static/: reads the size of every image from its header and,
+# if Pillow is installed, writes downscaled copies next to it in public/ as
+# name-<width>w.ext. Pages then get width, height and srcset on their <img>
+# tags. Derived files are kept in the build cache under the source's hash,
+# so an image is only ever resized once.
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+DEFAULT_WIDTHS = (480, 960, 1440)
+
+# How far into a JPEG to look for its frame header before giving up
+MAX_JPEG_HEADER = 1 << 20
+
+
+class ImageStats:
+    def __init__(self):
+        self.processed = 0
+        self.unchanged = 0
+        self.variants = 0
+        self.removed = 0
+
+    def summary(self):
+        return (
+            f"{self.processed} processed, {self.unchanged} unchanged, "
+            f"{self.variants} variants written, {self.removed} removed"
+        )
+
+    def __repr__(self):
+        return f"ImageStats({self.summary()})"
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def jpeg_dimensions(f):
+    # Walks the marker segments up to the first start-of-frame
+    f.seek(2)
+    while f.tell() < MAX_JPEG_HEADER:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xd0 <= code <= 0xd9:
+            # Standalone markers carry no length
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+def read_dimensions(path):
+    # (width, height) from the file header of a PNG, GIF, JPEG or WebP, or
+    # None for anything else
+    try:
+        return header_dimensions(path)
+    except struct.error:
+        # Truncated header
+        return None
+
+
+def header_dimensions(path):
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b'\xff\xd8'):
+            return jpeg_dimensions(f)
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3fff, height & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    return None
+
+
+def variant_name(rel_path, width):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}-{width}w{ext}"
+
+
+def cached_variant_path(cache_dir, source_hash, width, ext):
+    return os.path.join(cache_dir, f"{source_hash}-{width}w{ext.lower()}")
+
+
+def is_current(entry, source_hash, widths, cache_dir, ext):
+    # Whether an entry from the last run still describes the image: same
+    # content, same widths asked for, same resampler available, and every
+    # variant still in the cache
+    return (
+        entry["hash"] == source_hash
+        and entry["widths"] == widths
+        and entry["resized"] == (Image is not None)
+        and all(os.path.exists(cached_variant_path(cache_dir, source_hash, width, ext)) for width, _ in entry["variants"])
+    )
+
+
+def process_image(path, source_hash, cache_dir, widths):
+    # Reads the size of one image and makes sure the cache holds a copy of it
+    # at each width in widths that is smaller than the original. Returns
+    # (width, height, [[variant width, variant height], ...]). Runs in a
+    # worker process.
+    dimensions = read_dimensions(path)
+    if dimensions is None:
+        return None
+    width, height = dimensions
+    variants = []
+    if Image is None:
+        return width, height, variants
+    ext = os.path.splitext(path)[1]
+    for variant_width in sorted(widths):
+        if variant_width >= width:
+            break
+        variant_height = max(1, round(height * variant_width / width))
+        variant_path = cached_variant_path(cache_dir, source_hash, variant_width, ext)
+        if not os.path.exists(variant_path):
+            with Image.open(path) as image:
+                if getattr(image, "is_animated", False):
+                    # Resizing would keep only the first frame
+                    return width, height, []
+                resized = image.resize((variant_width, variant_height), Image.LANCZOS)
+            tmp_path = variant_path + '.tmp'
+            resized.save(tmp_path, format=Image.registered_extensions()[ext.lower()], optimize=True)
+            os.replace(tmp_path, variant_path)
+        variants.append([variant_width, variant_height])
+    return width, height, variants
+
+
+def load_images(path):
+    return load_versioned(path, "images")
+
+
+def save_images(images, path):
+    save_versioned(path, "images", images)
+
+
+def install_variant(cached_path, dest_path):
+    # Copies a cached variant into public/ unless the copy there is already
+    # current; copies carry the cached file's mtime to tell
+    cached_stat = os.stat(cached_path)
+    try:
+        dest_stat = os.stat(dest_path)
+        if dest_stat.st_size == cached_stat.st_size and dest_stat.st_mtime_ns == cached_stat.st_mtime_ns:
+            return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    copy_file(cached_path, dest_path)
+    os.utime(dest_path, ns=(cached_stat.st_atime_ns, cached_stat.st_mtime_ns))
+    return True
+
+
+def process_directory(source, destination, state_path, cache_dir, widths=DEFAULT_WIDTHS, workers=None, changes=None):
+    # Brings the size and variants of every image under source up to date
+    # and writes the variants into destination. Images whose size and mtime
+    # match the state aren't read at all; images whose hash matches aren't
+    # processed again. Returns ImageStats; the state at state_path is what
+    # pages read their image attributes from.
+    old_images = load_images(state_path)
+    images = {}
+    pending = []
+    stats = ImageStats()
+    widths = sorted(set(widths))
+    os.makedirs(cache_dir, exist_ok=True)
+    for rel_path, source_path in walk_files(source):
+        if not is_image(rel_path):
+            continue
+        rel_path = rel_path.replace(os.sep, '/')
+        stat = os.stat(source_path)
+        entry = old_images.get(rel_path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            source_hash = entry["hash"]
+        else:
+            source_hash = hash_file(source_path)
+        if entry is not None and is_current(entry, source_hash, widths, cache_dir, os.path.splitext(rel_path)[1]):
+            images[rel_path] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            stats.unchanged += 1
+            continue
+        pending.append((rel_path, source_path, source_hash, stat))
+
+    if pending:
+        process = partial(process_image, cache_dir=cache_dir, widths=widths)
+        paths = [source_path for _, source_path, _, _ in pending]
+        hashes = [source_hash for _, _, source_hash, _ in pending]
+        if workers == 1 or len(pending) == 1:
+            results = list(map(process, paths, hashes))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(process, paths, hashes))
+        for (rel_path, source_path, source_hash, stat), result in zip(pending, results):
+            if result is None:
+                print(f"Unrecognized image format: {source_path}")
+                continue
+            width, height, variants = result
+            images[rel_path] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "hash": source_hash,
+                "widths": widths,
+                "resized": Image is not None,
+                "width": width,
+                "height": height,
+                "variants": variants,
+            }
+            stats.processed += 1
+
+    for rel_path, entry in images.items():
+        ext = os.path.splitext(rel_path)[1]
+        for variant_width, _ in entry["variants"]:
+            cached_path = cached_variant_path(cache_dir, entry["hash"], variant_width, ext)
+            output = variant_name(rel_path, variant_width)
+            if install_variant(cached_path, os.path.join(destination, output)):
+                stats.variants += 1
+                if changes is not None:
+                    changes.write(output)
+
+    # Variants this run no longer produces
+    for rel_path, entry in old_images.items():
+        current = {width for width, _ in images[rel_path]["variants"]} if rel_path in images else set()
+        for variant_width, _ in entry["variants"]:
+            if variant_width in current:
+                continue
+            output = variant_name(rel_path, variant_width)
+            stale_path = os.path.join(destination, output)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+                stats.removed += 1
+                if changes is not None:
+                    changes.remove(output)
+
+    save_images(images, state_path)
+    return stats
+
+
+def variant_outputs(images):
+    # Paths in public/ of every variant, for pruning
+    return {variant_name(rel_path, width) for rel_path, entry in images.items() for width, _ in entry["variants"]}
+
+
+img_src_pattern = re.compile(r'<img src="([^"]*)"')
+
+# Loaded image states keyed by path, reused until the file changes on disk
+open_image_states = {}
+
+
+class ImageAttributes:
+    # Adds width, height and srcset to the <img> tags of a rendered page.
+    # Applied as the page is written, after the block and inline caches, so
+    # cached fragments don't depend on the images.
+    def __init__(self, images):
+        self.tags = {}
+        for rel_path, entry in images.items():
+            src = '/' + rel_path
+            attributes = f' width="{entry["width"]}" height="{entry["height"]}"'
+            if entry["variants"]:
+                candidates = [f"{variant_name(src, width)} {width}w" for width, _ in entry["variants"]]
+                candidates.append(f"{src} {entry['width']}w")
+                attributes += f' srcset="{", ".join(candidates)}"'
+            self.tags[src] = attributes
+
+    def resolve(self, path):
+        # What the page renders for an image at site path path
+        return self.tags.get(path)
+
+    def rewrite(self, html, page_path, references=None):
+        # Relative srcs are resolved against page_path, and the site paths
+        # looked up are added to references, if given. Tags can be matched
+        # chunk by chunk because RewriteWriter never splits one.
+        if "<img" not in html:
+            return html
+
+        def add_attributes(match):
+            src = match.group(1)
+            if not src.startswith('/'):
+                if '://' in src or src.startswith('data:'):
+                    return match.group(0)
+                base = page_path if page_path.endswith('/') else posixpath.dirname(page_path) + '/'
+                src = posixpath.normpath(posixpath.join(base, src))
+            if references is not None:
+                references.add(src)
+            attributes = self.tags.get(src)
+            if attributes is None:
+                return match.group(0)
+            return match.group(0) + attributes
+
+        return img_src_pattern.sub(add_attributes, html)
+
+
+def open_image_attributes(path):
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = open_image_states.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    attributes = ImageAttributes(load_images(path))
+    open_image_states[path] = (key, attributes)
+    return attributes
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from multiprocessing.util import Finalize
+
+from build_manifest import GENERATOR_VERSION
+from htmlnode import LeafNode
+
+# Entries kept in memory per process, and the longest inline string worth
+# memoizing. Long paragraphs are rarely repeated and would only push the
+# short, repeated strings (nav items, headings, link lists) out.
+DEFAULT_CAPACITY = 10000
+MAX_MEMO_TEXT = 256
+
+# Strings are only memoized the second time they are seen, so pages full of
+# one-off text don't pay for rendering eagerly and filling the cache. This
+# many first sightings are remembered before the record starts over.
+SEEN_CAPACITY = 50000
+
+# One open cache per path and process, like the block cache. New entries and
+# use counts are written once per build, not per page: by
+# flush_inline_caches in the building process, and when a worker process
+# exits for the pages it rendered.
+open_inline_caches = {}
+
+
+class InlineCache:
+    # Bounded LRU from an inline markdown string to the HTML it renders to.
+    # New entries are written to an SQLite table shared by every build
+    # process, and each process starts out with the most used entries from
+    # it, so repeated strings are only tokenized once across builds.
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS inline ("
+            "version TEXT NOT NULL, text TEXT NOT NULL, html TEXT NOT NULL, uses INTEGER NOT NULL, "
+            "PRIMARY KEY (version, text))"
+        )
+        self.connection.commit()
+        self.entries = OrderedDict()
+        self.seen = set()
+        self.size = 0
+        self.pending = {}
+        self.uses = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.preload()
+
+    def preload(self):
+        rows = self.connection.execute(
+            "SELECT text, html FROM inline WHERE version = ? ORDER BY uses DESC LIMIT ?",
+            (GENERATOR_VERSION, self.capacity),
+        )
+        for text, html in rows:
+            self.store(text, html)
+
+    def get(self, text):
+        html = self.entries.get(text)
+        if html is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(text)
+        self.hits += 1
+        self.uses[text] = self.uses.get(text, 0) + 1
+        return html
+
+    def render(self, text, text_to_children):
+        # Returns children for text, either straight from text_to_children
+        # or as one leaf holding the memoized HTML
+        if len(text) > MAX_MEMO_TEXT:
+            return text_to_children(text)
+        html = self.get(text)
+        if html is None:
+            if text not in self.seen:
+                if len(self.seen) >= SEEN_CAPACITY:
+                    self.seen.clear()
+                self.seen.add(text)
+                return text_to_children(text)
+            self.seen.discard(text)
+            html = ''.join(child.to_html() for child in text_to_children(text))
+            self.put(text, html)
+        return [LeafNode(None, html)]
+
+    def put(self, text, html):
+        self.store(text, html)
+        self.pending[text] = html
+        self.uses[text] = self.uses.get(text, 0) + 1
+
+    def store(self, text, html):
+        old = self.entries.pop(text, None)
+        if old is not None:
+            self.size -= len(text) + len(old)
+        self.entries[text] = html
+        self.size += len(text) + len(html)
+        while len(self.entries) > self.capacity:
+            old_text, old_html = self.entries.popitem(last=False)
+            self.size -= len(old_text) + len(old_html)
+            self.evictions += 1
+
+    def flush(self):
+        # One transaction for everything since the last flush
+        if not self.uses:
+            return
+        rows = []
+        for text, uses in self.uses.items():
+            html = self.pending.get(text)
+            if html is None:
+                html = self.entries.get(text)
+            if html is not None:
+                rows.append((GENERATOR_VERSION, text, html, uses))
+        self.connection.executemany(
+            "INSERT INTO inline (version, text, html, uses) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (version, text) DO UPDATE SET uses = uses + excluded.uses",
+            rows,
+        )
+        self.connection.commit()
+        self.pending.clear()
+        self.uses.clear()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def summary(self):
+        return (
+            f"{len(self.entries)} entries ({self.size} chars), {self.hits} hits, "
+            f"{self.misses} misses ({self.hit_rate():.1%} hit rate), {self.evictions} evicted"
+        )
+
+    def __repr__(self):
+        return f"InlineCache({self.path}, {self.summary()})"
+
+
+def open_inline_cache(path):
+    cache = open_inline_caches.get(path)
+    if cache is None:
+        cache = InlineCache(path)
+        open_inline_caches[path] = cache
+        # Runs when the process exits, including pool workers, which skip
+        # atexit handlers
+        Finalize(cache, cache.flush, exitpriority=0)
+    return cache
+
+
+def flush_inline_caches():
+    for cache in open_inline_caches.values():
+        cache.flush()
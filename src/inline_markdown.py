@@ -1,5 +1,8 @@
+import html
+import itertools
 import re
-from htmlnode import HTMLNode
+from functools import partial
+from htmlnode import HTMLNode, LeafNode
 from textnode import TextNode, text_type_text, text_type_bold, text_type_italic, text_type_code, text_type_image, text_type_link
 
 block_type_paragraph = "paragraph"
@@ -9,6 +12,12 @@ block_type_quote = "quote"
 block_type_olist = "ordered_list"
 block_type_ulist = "unordered_list"
 
+# A ``` fence indented by at most three spaces. Backtick fences can't have
+# backticks in their info string, which keeps ```code``` an inline span.
+code_fence_pattern = re.compile(r' {0,3}(`{3,})[^`]*$')
+closing_fence_pattern = re.compile(r' {0,3}(`{3,})\s*$')
+heading_id_pattern = re.compile(r'[^\w\- ]')
+
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     new_nodes = []
     for old_node in old_nodes:
@@ -29,114 +38,352 @@ def split_nodes(old_nodes, delimiter, text_type):
     return split_nodes_delimiter(old_nodes, delimiter, text_type)
 
 def extract_markdown_images(text):
-    pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
-    return re.findall(pattern, text)
+    return [(alt, url) for _, _, _, alt, url in image_spans(text, 0, len(text))]
 
 def extract_markdown_links(text):
-    pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-    return re.findall(pattern, text)
+    return [(link_text, url) for _, _, _, link_text, url in link_spans(text, 0, len(text))]
 
-def split_nodes_image(old_nodes):
+def split_nodes_spans(old_nodes, find_spans):
+    # Splits text nodes around the spans find_spans(text, start, end)
+    # returns, working from their offsets
     new_nodes = []
     for node in old_nodes:
         if node.text_type != text_type_text:
             new_nodes.append(node)
             continue
-
-        images = extract_markdown_images(node.text)
-        if not images:
+        text = node.text
+        start = 0
+        for span_start, span_end, text_type, span_text, url in find_spans(text, 0, len(text)):
+            if span_start > start:
+                new_nodes.append(TextNode(text[start:span_start], text_type_text))
+            new_nodes.append(TextNode(span_text, text_type, url))
+            start = span_end
+        if start == 0:
             new_nodes.append(node)
-            continue
+        elif start < len(text):
+            new_nodes.append(TextNode(text[start:], text_type_text))
+    return new_nodes
 
-        current_text = node.text
-        for alt_text, url in images:
-            parts = current_text.split(f"![{alt_text}]({url})", 1)
-            if parts[0]:
-                new_nodes.append(TextNode(parts[0], text_type_text))
-            new_nodes.append(TextNode(alt_text, text_type_image, url))
-            current_text = parts[1] if len(parts) > 1 else ""
+def split_nodes_image(old_nodes):
+    return split_nodes_spans(old_nodes, image_spans)
 
-        if current_text:
-            new_nodes.append(TextNode(current_text, text_type_text))
+def split_nodes_link(old_nodes):
+    return split_nodes_spans(old_nodes, link_spans)
 
-    return new_nodes
+inline_delimiter_pattern = re.compile(r'\*\*|\*|`')
 
-def split_nodes_link(old_nodes):
-    new_nodes = []
-    for node in old_nodes:
-        if node.text_type != text_type_text:
-            new_nodes.append(node)
-            continue
+# Which delimiters are still live while a given span type is open. Bold
+# swallows everything up to the closing "**", italic ignores backticks, and
+# any "**" or "*" ends an open code span, matching the order in which the
+# chained split_nodes passes used to peel the delimiters off.
+inline_delimiters_in_span = {
+    text_type_text: ("**", "*", "`"),
+    text_type_bold: ("**",),
+    text_type_italic: ("**", "*"),
+    text_type_code: ("**", "*", "`"),
+}
+inline_delimiter_types = {
+    "**": text_type_bold,
+    "*": text_type_italic,
+    "`": text_type_code,
+}
 
-        links = extract_markdown_links(node.text)
-        if not links:
-            new_nodes.append(node)
-            continue
+# Images and links are found with str.find rather than regexes such as
+# !\[([^\]]*)\]\(([^)]+)\) and \[([^\]]+)\]\(([^)]+)\), which match the same
+# spans but rescan the rest of the text from every unclosed bracket. Lookup
+# positions only move forward, so the last "]" and ")" found stay valid
+# until they are passed, and a run is scanned a bounded number of times
+# however many unclosed brackets it holds. Spans are
+# (start, end, text type, text, URL).
 
-        current_text = node.text
-        for anchor_text, url in links:
-            parts = current_text.split(f"[{anchor_text}]({url})", 1)
-            if parts[0]:
-                new_nodes.append(TextNode(parts[0], text_type_text))
-            new_nodes.append(TextNode(anchor_text, text_type_link, url))
-            current_text = parts[1] if len(parts) > 1 else ""
+def image_spans(text, start, end):
+    # The images in text[start:end], in order. The alt text may be empty.
+    if text.find("](", start, end) == -1:
+        return []
+    images = []
+    close = paren = -1
+    bang = text.find("![", start, end)
+    while bang != -1:
+        if close < bang + 2:
+            close = text.find("]", bang + 2, end)
+            if close == -1:
+                break
+        if close + 1 < end and text[close + 1] == "(":
+            if paren < close + 2:
+                paren = text.find(")", close + 2, end)
+                if paren == -1:
+                    break
+            if paren > close + 2:
+                images.append((bang, paren + 1, text_type_image, text[bang + 2:close], text[close + 2:paren]))
+                bang = text.find("![", paren + 1, end)
+                continue
+        bang = text.find("![", bang + 1, end)
+    return images
 
-        if current_text:
-            new_nodes.append(TextNode(current_text, text_type_text))
+def link_spans(text, start, end, images=()):
+    # The links in text[start:end], in order. With images, the image spans
+    # found in the same run, links are only looked for in the gaps between
+    # them and the images are merged in, as when split_nodes_image runs
+    # before split_nodes_link.
+    if text.find("](", start, end) == -1:
+        return []
+    spans = []
+    close = paren = -1
+    gap_start = start
+    for image in list(images) + [None]:
+        gap_end = end if image is None else image[0]
+        bracket = text.find("[", gap_start, gap_end)
+        while bracket != -1:
+            if close <= bracket:
+                close = text.find("]", bracket + 1, end)
+                if close == -1:
+                    break
+            if close >= gap_end:
+                break
+            if close > bracket + 1 and close + 1 < gap_end and text[close + 1] == "(":
+                if paren < close + 2:
+                    paren = text.find(")", close + 2, end)
+                    if paren == -1:
+                        break
+                if paren >= gap_end:
+                    break
+                if paren > close + 2:
+                    spans.append((bracket, paren + 1, text_type_link, text[bracket + 1:close], text[close + 2:paren]))
+                    bracket = text.find("[", paren + 1, gap_end)
+                    continue
+            bracket = text.find("[", bracket + 1, gap_end)
+        if image is not None:
+            spans.append(image)
+            gap_start = image[1]
+    return spans
 
-    return new_nodes
+def image_and_link_spans(text, start, end):
+    # The images and links in text[start:end], in order
+    return link_spans(text, start, end, image_spans(text, start, end))
+
+def append_text_run(text, start, end, nodes):
+    if text.find("[", start, end) == -1:
+        nodes.append(TextNode(text[start:end], text_type_text))
+        return
+    for match_start, match_end, text_type, match_text, url in image_and_link_spans(text, start, end):
+        if match_start > start:
+            nodes.append(TextNode(text[start:match_start], text_type_text))
+        # Images without alt text are dropped
+        if match_text:
+            nodes.append(TextNode(match_text, text_type, url))
+        start = match_end
+    if start < end:
+        nodes.append(TextNode(text[start:end], text_type_text))
 
 def text_to_textnodes(text):
     if not text:
         return [TextNode("", text_type_text)]
-    nodes = [TextNode(text, text_type_text)]
-    nodes = split_nodes(nodes, "**", text_type_bold)
-    nodes = split_nodes(nodes, "*", text_type_italic)
-    nodes = split_nodes(nodes, "`", text_type_code)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-    return [node for node in nodes if node.text != ""]  # Remove empty nodes
+    # Single left-to-right scan over the delimiters; text runs between them
+    # are checked for images and links as they are closed off.
+    nodes = []
+    span_type = text_type_text
+    start = 0
+    for match in inline_delimiter_pattern.finditer(text):
+        delimiter = match.group()
+        if delimiter not in inline_delimiters_in_span[span_type]:
+            continue
+        end = match.start()
+        if end > start:
+            if span_type == text_type_text:
+                append_text_run(text, start, end, nodes)
+            else:
+                nodes.append(TextNode(text[start:end], span_type))
+        delimiter_type = inline_delimiter_types[delimiter]
+        span_type = text_type_text if span_type == delimiter_type else delimiter_type
+        start = match.end()
+    if start < len(text):
+        if span_type == text_type_text:
+            append_text_run(text, start, len(text), nodes)
+        else:
+            nodes.append(TextNode(text[start:], span_type))
+    return nodes
+
+class MarkdownBlock:
+    __slots__ = ("text", "lines", "block_type", "line", "offset")
+
+    def __init__(self, text, lines, block_type, line, offset):
+        self.text = text
+        self.lines = lines
+        self.block_type = block_type
+        self.line = line  # 1-based line number where the block starts
+        self.offset = offset  # character offset of the block in the source
+
+    def __repr__(self):
+        return f"MarkdownBlock({self.block_type}, line {self.line}, {self.text!r})"
+
+
+class BlockScanner:
+    # Splits markdown into typed blocks one line at a time, so a file object
+    # can be fed in directly without reading the whole document first. Blocks
+    # are separated by empty lines, except inside a ``` fence, which runs to
+    # its closing fence blank lines and all. The first "# " line outside a
+    # fence is kept as the title along the way, and a front matter header
+    # is parsed into front_matter instead of being rendered.
+    def __init__(self):
+        self.title = None
+        self.front_matter = {}
+
+    def scan(self, lines):
+        lines, line_number, offset = self.read_front_matter(iter(lines))
+        group = []
+        group_line = 1
+        group_offset = 0
+        fence = None
+        for line in lines:
+            if line.endswith('\n'):
+                line = line[:-1]
+            line_number += 1
+            if fence is not None:
+                # Inside a fence every line belongs to the code block as is
+                group.append(line)
+                if '```' in line[:6] and is_closing_fence(line, fence):
+                    yield self.make_code_block(group, group_line, group_offset)
+                    group = []
+                    fence = None
+            elif '```' in line[:6] and code_fence_pattern.match(line):
+                # An opening fence also ends the block it interrupts
+                if group:
+                    block = self.make_block(group, group_line, group_offset)
+                    if block is not None:
+                        yield block
+                group = [line]
+                group_line = line_number
+                group_offset = offset
+                fence = code_fence_pattern.match(line).group(1)
+            else:
+                if self.title is None and line.startswith('# '):
+                    self.title = line[2:].strip()
+                if line:
+                    if not group:
+                        group_line = line_number
+                        group_offset = offset
+                    group.append(line)
+                elif group:
+                    block = self.make_block(group, group_line, group_offset)
+                    if block is not None:
+                        yield block
+                    group = []
+            offset += len(line) + 1
+        if fence is not None:
+            # An unclosed fence runs to the end of the document
+            while group[-1] == "":
+                group.pop()
+            yield self.make_code_block(group, group_line, group_offset)
+        elif group:
+            block = self.make_block(group, group_line, group_offset)
+            if block is not None:
+                yield block
+
+    def read_front_matter(self, lines):
+        # Returns the remaining lines plus the line number and offset they
+        # start after. Front matter is a block of "key: value" lines between
+        # two "---" lines at the very top; without the closing line, the
+        # lines read ahead are handed back as ordinary markdown.
+        first = next(lines, None)
+        if first is None:
+            return lines, 0, 0
+        if first.rstrip('\n') != '---':
+            return itertools.chain([first], lines), 0, 0
+        header = [first]
+        for line in lines:
+            header.append(line)
+            if line.rstrip('\n') in ('---', '...'):
+                self.front_matter = parse_front_matter(line.rstrip('\n') for line in header[1:-1])
+                return lines, len(header), sum(len(line.rstrip('\n')) + 1 for line in header)
+        return itertools.chain(header, lines), 0, 0
+
+    def make_code_block(self, group, line, offset):
+        return MarkdownBlock('\n'.join(group), group, block_type_code, line, offset)
+
+    def make_block(self, group, line, offset):
+        first, last = group[0], group[-1]
+        if first[0].isspace() or last[-1].isspace():
+            joined = '\n'.join(group)
+            text = joined.strip()
+            if not text:
+                return None
+            leading = joined[:len(joined) - len(joined.lstrip())]
+            line += leading.count('\n')
+            offset += len(leading)
+            lines = text.split('\n')
+        else:
+            text = '\n'.join(group)
+            lines = group
+        return MarkdownBlock(text, lines, block_lines_to_block_type(lines), line, offset)
+
+
+def parse_front_matter(lines):
+    # Flat "key: value" pairs, the subset of YAML front matter pages use
+    front_matter = {}
+    for line in lines:
+        key, separator, value = line.partition(':')
+        if not separator or not key.strip() or line[0].isspace():
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        front_matter[key.strip().lower()] = value
+    return front_matter
+
+def is_closing_fence(line, fence):
+    match = closing_fence_pattern.match(line)
+    return match is not None and len(match.group(1)) >= len(fence)
+
+def code_block_content(lines):
+    # The lines between the fences, with the opening fence's indentation
+    # taken off each one
+    opener = lines[0]
+    indent = len(opener) - len(opener.lstrip(' '))
+    match = code_fence_pattern.match(opener)
+    fence = match.group(1) if match else '```'
+    end = len(lines) - 1 if len(lines) > 1 and is_closing_fence(lines[-1], fence) else len(lines)
+    content = lines[1:end]
+    if indent:
+        content = [line[min(indent, len(line) - len(line.lstrip(' '))):] for line in content]
+    return '\n'.join(content)
+
 
 def markdown_to_blocks(markdown):
-    # Split the markdown into blocks based on blank lines
-    blocks = markdown.split('\n\n')
-    
-    # Strip leading/trailing whitespace and remove empty blocks
-    cleaned_blocks = [block.strip() for block in blocks if block.strip()]
-    
-    return cleaned_blocks
+    return [block.text for block in BlockScanner().scan(markdown.split('\n'))]
 
 
 def block_to_block_type(block):
-    lines = block.split("\n")
+    return block_lines_to_block_type(block.split("\n"))
 
+def block_lines_to_block_type(lines):
+    first = lines[0]
     if (
-        block.startswith("# ")
-        or block.startswith("## ")
-        or block.startswith("### ")
-        or block.startswith("#### ")
-        or block.startswith("##### ")
-        or block.startswith("###### ")
+        first.startswith("# ")
+        or first.startswith("## ")
+        or first.startswith("### ")
+        or first.startswith("#### ")
+        or first.startswith("##### ")
+        or first.startswith("###### ")
     ):
         return block_type_heading
-    if len(lines) > 1 and lines[0].startswith("```") and lines[-1].startswith("```"):
+    if len(lines) > 1 and first.startswith("```") and lines[-1].startswith("```"):
         return block_type_code
-    if block.startswith(">"):
+    if first.startswith(">"):
         for line in lines:
             if not line.startswith(">"):
                 return block_type_paragraph
         return block_type_quote
-    if block.startswith("* "):
+    if first.startswith("* "):
         for line in lines:
             if not line.startswith("* "):
                 return block_type_paragraph
         return block_type_ulist
-    if block.startswith("- "):
+    if first.startswith("- "):
         for line in lines:
             if not line.startswith("- "):
                 return block_type_paragraph
         return block_type_ulist
-    if block.startswith("1. "):
+    if first.startswith("1. "):
         i = 1
         for line in lines:
             if not line.startswith(f"{i}. "):
@@ -145,54 +392,130 @@ def block_to_block_type(block):
         return block_type_olist
     return block_type_paragraph
 
-def text_to_children(text):
+def text_to_children(text, inline_cache=None):
+    # Formatted runs become a single leaf carrying their text, which renders
+    # the same as a tag wrapping a separate text node
+    if inline_cache is not None:
+        return inline_cache.render(text, text_to_children)
     nodes = text_to_textnodes(text)
     children = []
     for node in nodes:
         if node.text_type == text_type_text:
-            children.append(HTMLNode(None, node.text))
+            children.append(LeafNode(None, node.text))
         elif node.text_type == text_type_bold:
-            children.append(HTMLNode("b", None, [HTMLNode(None, node.text)]))
+            children.append(LeafNode("b", node.text))
         elif node.text_type == text_type_italic:
-            children.append(HTMLNode("i", None, [HTMLNode(None, node.text)]))
+            children.append(LeafNode("i", node.text))
         elif node.text_type == text_type_code:
-            children.append(HTMLNode("code", None, [HTMLNode(None, node.text)]))
+            children.append(LeafNode("code", node.text))
         elif node.text_type == text_type_link:
-            children.append(HTMLNode("a", None, [HTMLNode(None, node.text)], {"href": node.url}))
+            children.append(LeafNode("a", node.text, {"href": node.url}))
         elif node.text_type == text_type_image:
-            children.append(HTMLNode("img", "", None, {"src": node.url, "alt": node.text}))
+            children.append(LeafNode("img", "", {"src": node.url, "alt": node.text}))
     return children
 
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    children = []
+def heading_text(block):
+    # A heading's inline markdown, without the #s
+    return block.text[len(block.text.split()[0]) + 1:].strip()
+
+def block_inline_texts(block):
+    # The runs of inline markdown a block renders: one per list item, with
+    # the list and quote markers stripped. Code has none.
+    if block.block_type == block_type_heading:
+        return [heading_text(block)]
+    if block.block_type == block_type_code:
+        return []
+    if block.block_type == block_type_quote:
+        return ['\n'.join(line.strip('> ').strip() for line in block.lines)]
+    if block.block_type == block_type_ulist:
+        return [item.strip('* ').strip() for item in block.lines if item.strip()]
+    if block.block_type == block_type_olist:
+        return [item.split('. ', 1)[1].strip() for item in block.lines if item.strip()]
+    return [block.text]
+
+def heading_anchors(blocks):
+    # The id of each block: a heading's GitHub-style anchor, with "-1",
+    # "-2", ... appended when an earlier heading on the page already has it,
+    # and None for other blocks and headings with no id
+    seen = set()
+    anchors = []
     for block in blocks:
-        block_type = block_to_block_type(block)
-        if block_type == "paragraph":
-            children.append(HTMLNode("p", None, text_to_children(block)))
-        elif block_type == "heading":
-            level = len(block.split()[0])  # Count the number of '#' characters
-            children.append(HTMLNode(f"h{level}", None, text_to_children(block[level+1:].strip())))
-        elif block_type == "code":
-            code_content = block.strip('`').strip()
-            children.append(HTMLNode("pre", None, [HTMLNode("code", code_content)]))
-        elif block_type == "quote":
-            quote_content = '\n'.join(line.strip('> ').strip() for line in block.split('\n'))
-            children.append(HTMLNode("blockquote", None, text_to_children(quote_content)))
-        elif block_type == "unordered_list":
-            list_items = [HTMLNode("li", None, text_to_children(item.strip('* ').strip())) for item in block.split('\n') if item.strip()]
-            children.append(HTMLNode("ul", None, list_items))
-        elif block_type == "ordered_list":
-            list_items = [HTMLNode("li", None, text_to_children(item.split('. ', 1)[1].strip())) for item in block.split('\n') if item.strip()]
-            children.append(HTMLNode("ol", None, list_items))
-    
-    return HTMLNode("div", None, children)
+        anchor = None
+        if block.block_type == block_type_heading:
+            anchor = heading_id(plain_text(heading_text(block)))
+            if anchor:
+                unique = anchor
+                count = 0
+                while unique in seen:
+                    count += 1
+                    unique = f"{anchor}-{count}"
+                seen.add(unique)
+                anchor = unique
+            else:
+                anchor = None
+        anchors.append(anchor)
+    return anchors
+
+def block_to_html_node(block, inline_cache=None, anchor=None):
+    # block is a MarkdownBlock, so its type and lines are already known.
+    # anchor is a heading's id from heading_anchors; without it the id comes
+    # from the heading alone.
+    block_type = block.block_type
+    if block_type == "heading":
+        level = len(block.text.split()[0])  # Count the number of '#' characters
+        heading = heading_text(block)
+        if anchor is None:
+            anchor = heading_id(plain_text(heading))
+        props = {"id": anchor} if anchor else None
+        return HTMLNode(f"h{level}", None, text_to_children(heading, inline_cache), props)
+    if block_type == "code":
+        # Code never goes through the inline parser, only one escape pass
+        code_content = html.escape(code_block_content(block.lines), quote=False)
+        return HTMLNode("pre", None, [HTMLNode("code", code_content)])
+    texts = block_inline_texts(block)
+    if block_type == "quote":
+        return HTMLNode("blockquote", None, text_to_children(texts[0], inline_cache))
+    if block_type == "unordered_list":
+        return HTMLNode("ul", None, [HTMLNode("li", None, text_to_children(item, inline_cache)) for item in texts])
+    if block_type == "ordered_list":
+        return HTMLNode("ol", None, [HTMLNode("li", None, text_to_children(item, inline_cache)) for item in texts])
+    return HTMLNode("p", None, text_to_children(texts[0], inline_cache))
+
+def blocks_to_html_node(blocks, block_cache=None, inline_cache=None):
+    blocks = list(blocks)
+    anchors = heading_anchors(blocks)
+    if block_cache is not None:
+        # Blocks seen before come back as pre-rendered HTML fragments
+        render_block = partial(block_to_html_node, inline_cache=inline_cache)
+        return HTMLNode("div", None, block_cache.render_blocks(blocks, render_block, anchors))
+    return HTMLNode("div", None, [block_to_html_node(block, inline_cache, anchor) for block, anchor in zip(blocks, anchors)])
+
+def markdown_to_html_node(markdown, block_cache=None, inline_cache=None):
+    return blocks_to_html_node(BlockScanner().scan(markdown.split('\n')), block_cache, inline_cache)
 
 def extract_title(markdown):
-    lines = markdown.split('\n')
-    for line in lines:
-        if line.startswith('# '):
-            return line[2:].strip()
+    scanner = BlockScanner()
+    for _ in scanner.scan(markdown.split('\n')):
+        if scanner.title is not None:
+            return scanner.title
+    if scanner.title is not None:
+        return scanner.title
     raise ValueError("No h1 header found in the markdown file")
-    
-    return HTMLNode("div", None, children)
\ No newline at end of file
+
+def extract_description(markdown):
+    return blocks_description(BlockScanner().scan(markdown.split('\n')))
+
+def plain_text(text):
+    # Inline markdown with the markup stripped, image alt text included
+    return ''.join(node.text for node in text_to_textnodes(text))
+
+def heading_id(text):
+    # GitHub-style anchor for a heading's plain text: "Hello, World!" -> "hello-world"
+    return heading_id_pattern.sub('', text.lower()).replace(' ', '-')
+
+def blocks_description(blocks):
+    # Plain text of the first paragraph, for summaries and <meta> tags
+    for block in blocks:
+        if block.block_type == block_type_paragraph:
+            return ''.join(node.text for node in text_to_textnodes(block.text.replace('\n', ' ')) if node.text_type != text_type_image)
+    return ""
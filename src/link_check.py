@@ -0,0 +1,125 @@
+import os
+import posixpath
+from urllib.parse import unquote, urlsplit
+
+from inline_markdown import block_inline_texts, text_to_textnodes
+from textnode import text_type_image, text_type_link
+
+# Checks the links and images of every rendered page against the files in
+# public/ and the heading ids of the page they point at. The URLs are
+# collected while pages render, along with the rest of their site file
+# record, and the files are listed once, so checking is a set lookup per
+# link rather than a stat.
+
+
+class BrokenLink:
+    __slots__ = ("page", "url", "reason")
+
+    def __init__(self, page, url, reason):
+        self.page = page
+        self.url = url
+        self.reason = reason
+
+    def __eq__(self, other):
+        return (self.page, self.url, self.reason) == (other.page, other.url, other.reason)
+
+    def __repr__(self):
+        return f"BrokenLink({self.page}, {self.url}, {self.reason})"
+
+
+def page_links(blocks):
+    # Link and image URLs of a page, each once, in the order they appear
+    urls = {}
+    for block in blocks:
+        if "](" not in block.text:
+            continue
+        # Per list item and without quote markers, as the page renders them
+        for text in block_inline_texts(block):
+            for node in text_to_textnodes(text):
+                if node.text_type == text_type_link or node.text_type == text_type_image:
+                    urls[node.url] = None
+    return list(urls)
+
+
+def list_files(root):
+    # Every file under root as a "/"-separated path relative to it
+    files = set()
+    for dirpath, _, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, '/')
+        prefix = "" if rel_dir == "." else rel_dir + '/'
+        for filename in filenames:
+            files.add(prefix + filename)
+    return files
+
+
+def page_file(url):
+    # The file in public/ a page URL is served from, e.g. "/blog/" -> "blog/index.html"
+    path = url.lstrip('/')
+    return path + "index.html" if path == "" or path.endswith('/') else path
+
+
+class LinkChecker:
+    def __init__(self, files, anchors):
+        # files is the set from list_files; anchors maps the file of each
+        # rendered page to the set of heading ids on it
+        self.files = files
+        self.anchors = anchors
+        self.resolved = {}
+
+    @classmethod
+    def from_records(cls, public_dir, records):
+        anchors = {page_file(page["url"]): set(page["anchors"]) for page in records.pages.values()}
+        return cls(list_files(public_dir), anchors)
+
+    def resolve(self, path):
+        # The file a site path is served from, or None. A directory is
+        # served from its index.html, with or without the trailing slash.
+        if path in self.resolved:
+            return self.resolved[path]
+        rel_path = posixpath.normpath(path).lstrip('/')
+        index_path = posixpath.join(rel_path, "index.html")
+        if rel_path in self.files:
+            target = rel_path
+        elif index_path in self.files:
+            target = index_path
+        else:
+            target = None
+        self.resolved[path] = target
+        return target
+
+    def check_url(self, page_url, url):
+        # Returns why url on page_url is broken, or None if it isn't, or if
+        # it points off the site
+        parts = urlsplit(url)
+        if parts.scheme or parts.netloc:
+            return None
+        path = unquote(parts.path)
+        if path == "":
+            target = page_file(page_url)
+        else:
+            if not path.startswith('/'):
+                path = posixpath.join(page_url if page_url.endswith('/') else posixpath.dirname(page_url) + '/', path)
+            target = self.resolve(path)
+            if target is None:
+                return "missing target"
+        if parts.fragment:
+            ids = self.anchors.get(target)
+            if ids is not None and unquote(parts.fragment) not in ids:
+                return "missing anchor"
+        return None
+
+    def check(self, pages):
+        # pages is an iterable of (page URL, [link URLs]); returns the broken
+        # links in page order
+        broken = []
+        for page_url, urls in pages:
+            for url in urls:
+                reason = self.check_url(page_url, url)
+                if reason is not None:
+                    broken.append(BrokenLink(page_url, url, reason))
+        return broken
+
+
+def check_links(public_dir, records):
+    checker = LinkChecker.from_records(public_dir, records)
+    return checker.check((page["url"], page["links"]) for page in records.sorted_records())
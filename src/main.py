@@ -1,41 +1,313 @@
+import argparse
 import os
-import shutil
-from page_generator import generate_pages_recursive
+import sys
+from build_manifest import BuildManifest
+from fingerprint import fingerprint_directory, fingerprint_outputs
+from images import DEFAULT_WIDTHS, load_images, process_directory, variant_outputs
+from inline_cache import open_inline_caches
+from link_check import check_links
+from minify import MinifyCache, MinifyStats, html_stats
+from output_writer import ChangeList, prune_directory
+from page_generator import RenderOptions, generate_pages_recursive
+from pipeline import DEFAULT_IO_THREADS, PagePipeline
+from precompress import DEFAULT_GZIP_LEVEL, DEFAULT_BROTLI_QUALITY, DEFAULT_MIN_SIZE, precompress_directory, sibling_suffixes
+from profiling import BuildProfiler, profile_span
+from site_files import PageRecords, SITE_FILE_NAMES, write_site_files
+from site_index import SiteIndex
+from static_sync import load_state, sync_directory, walk_files
 
 # Get the absolute path of the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".build_cache")
 
-def copy_directory(source, destination):
-    if os.path.exists(destination):
-        shutil.rmtree(destination)
-    os.mkdir(destination)
-    for item in os.listdir(source):
-        source_path = os.path.join(source, item)
-        destination_path = os.path.join(destination, item)
-        if os.path.isfile(source_path):
-            shutil.copy(source_path, destination_path)
-            print(f"Copied file: {destination_path}")
-        else:
-            copy_directory(source_path, destination_path)
-            print(f"Copied directory: {destination_path}")
-
-def main():
-    # Define paths
-    content_dir = os.path.join(PROJECT_ROOT, "content")
-    static_dir = os.path.join(PROJECT_ROOT, "static")
-    public_dir = os.path.join(PROJECT_ROOT, "public")
-    template_path = os.path.join(PROJECT_ROOT, "template.html")
-
-    # Delete and recreate public directory
-    if os.path.exists(public_dir):
-        shutil.rmtree(public_dir)
-    os.makedirs(public_dir)
-
-    # Copy static files
-    copy_directory(static_dir, public_dir)
+# Define paths
+CONTENT_DIR = os.path.join(PROJECT_ROOT, "content")
+STATIC_DIR = os.path.join(PROJECT_ROOT, "static")
+PUBLIC_DIR = os.path.join(PROJECT_ROOT, "public")
+TEMPLATE_PATH = os.path.join(PROJECT_ROOT, "template.html")
+MANIFEST_PATH = os.path.join(CACHE_DIR, "manifest.json")
+STATIC_STATE_PATH = os.path.join(CACHE_DIR, "static.json")
+BLOCK_CACHE_PATH = os.path.join(CACHE_DIR, "blocks.sqlite")
+INLINE_CACHE_PATH = os.path.join(CACHE_DIR, "inline.sqlite")
+CHANGED_FILES_PATH = os.path.join(CACHE_DIR, "changed-files.txt")
+SITE_INDEX_PATH = os.path.join(CACHE_DIR, "site-index.json")
+PAGE_RECORDS_PATH = os.path.join(CACHE_DIR, "page-records.json")
+IMAGE_STATE_PATH = os.path.join(CACHE_DIR, "images.json")
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+ASSET_STATE_PATH = os.path.join(CACHE_DIR, "assets.json")
+MINIFY_CACHE_DIR = os.path.join(CACHE_DIR, "minify")
+DEFAULT_BASE_URL = "http://localhost:8888"
+SITE_TITLE = "Tolkien Fan Club"
+
+def parse_widths(value):
+    try:
+        widths = [int(width) for width in value.split(',') if width.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a comma-separated list of widths: {value}")
+    if not widths or min(widths) <= 0:
+        raise argparse.ArgumentTypeError(f"not a comma-separated list of widths: {value}")
+    return widths
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site into public/")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-render pages whose markdown or template changed since the last build",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to render pages (default: 1)",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="compare static files by content hash, not just size and mtime",
+    )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="hardlink static files into public/ instead of copying them when possible",
+    )
+    parser.add_argument(
+        "--block-cache",
+        action="store_true",
+        help="reuse rendered HTML for markdown blocks seen in earlier builds",
+    )
+    parser.add_argument(
+        "--inline-cache",
+        action="store_true",
+        help="memoize rendered HTML for repeated inline text such as nav items and headings",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap reading, rendering and writing pages using reader and writer threads",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=DEFAULT_IO_THREADS,
+        help=f"reader and writer threads each for --pipeline (default: {DEFAULT_IO_THREADS})",
+    )
+    parser.add_argument(
+        "--images",
+        action="store_true",
+        help="add width, height and srcset to <img> tags, writing downscaled copies of static images if Pillow is installed",
+    )
+    parser.add_argument(
+        "--image-widths",
+        type=parse_widths,
+        default=list(DEFAULT_WIDTHS),
+        help=f"comma-separated widths of the downscaled copies (default: {','.join(map(str, DEFAULT_WIDTHS))})",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="also write static assets as name.<hash>.ext and point pages and the template at those copies",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="minify pages as they are written and CSS files copied from static/",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="write .gz (and .br, if brotli is installed) siblings of HTML, CSS and JS files in public/",
+    )
+    parser.add_argument(
+        "--compress-min-size",
+        type=int,
+        default=DEFAULT_MIN_SIZE,
+        help=f"smallest file in bytes worth precompressing (default: {DEFAULT_MIN_SIZE})",
+    )
+    parser.add_argument(
+        "--gzip-level",
+        type=int,
+        choices=range(1, 10),
+        default=DEFAULT_GZIP_LEVEL,
+        help=f"gzip compression level for --precompress (default: {DEFAULT_GZIP_LEVEL})",
+    )
+    parser.add_argument(
+        "--brotli-quality",
+        type=int,
+        choices=range(0, 12),
+        default=DEFAULT_BROTLI_QUALITY,
+        help=f"brotli quality for --precompress (default: {DEFAULT_BROTLI_QUALITY})",
+    )
+    parser.add_argument(
+        "--site-files",
+        action="store_true",
+        help="write sitemap.xml, an Atom feed.xml and search-index.json from the rendered pages",
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="report links and images that point at missing files or headings; fails the build if any do",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=DEFAULT_BASE_URL,
+        help=f"absolute site URL used in the sitemap and feed (default: {DEFAULT_BASE_URL})",
+    )
+    parser.add_argument(
+        "--changed-files",
+        metavar="PATH",
+        default=CHANGED_FILES_PATH,
+        help="where to write the list of output files this build changed (default: .build_cache/changed-files.txt)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print time spent per build stage and the slowest pages",
+    )
+    parser.add_argument(
+        "--profile-trace",
+        metavar="PATH",
+        help="write a Chrome trace of the build to PATH (implies --profile)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        help="number of slowest pages to list in the profile (default: 10)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = BuildProfiler() if args.profile or args.profile_trace else None
+
+    if args.incremental:
+        # Keep the previous output and let the manifest decide what to rebuild
+        os.makedirs(PUBLIC_DIR, exist_ok=True)
+        manifest = BuildManifest.load(MANIFEST_PATH)
+    else:
+        # Render every page again, but into the existing public directory so
+        # that pages which come out the same keep their mtime. Files this
+        # build doesn't produce are pruned afterwards.
+        os.makedirs(PUBLIC_DIR, exist_ok=True)
+
+        # Start a fresh manifest so the next incremental build can reuse this one
+        manifest = BuildManifest(MANIFEST_PATH)
+
+    records = None
+    if args.site_files or args.check_links:
+        # Pages skipped by an incremental build keep their earlier record
+        records = PageRecords.load(PAGE_RECORDS_PATH) if args.incremental else PageRecords(PAGE_RECORDS_PATH)
+
+    changes = ChangeList()
+    minifier = MinifyCache(MINIFY_CACHE_DIR) if args.minify else None
+
+    # Copy static files that are new or changed since the last sync
+    with profile_span(profiler, "static"):
+        stats = sync_directory(STATIC_DIR, PUBLIC_DIR, STATIC_STATE_PATH, args.checksum, args.link, changes, minifier)
+    print(f"Synced static files: {stats.summary()}")
+
+    image_state_path = None
+    if args.images:
+        # Sizes and variants have to be known before pages are rendered
+        with profile_span(profiler, "images"):
+            image_stats = process_directory(
+                STATIC_DIR, PUBLIC_DIR, IMAGE_STATE_PATH, IMAGE_CACHE_DIR, args.image_widths, changes=changes
+            )
+        print(f"Images: {image_stats.summary()}")
+        image_state_path = IMAGE_STATE_PATH
+
+    asset_state_path = None
+    if args.fingerprint:
+        with profile_span(profiler, "fingerprint"):
+            fingerprint_stats = fingerprint_directory(STATIC_DIR, PUBLIC_DIR, ASSET_STATE_PATH, changes, minifier)
+        print(f"Fingerprinted assets: {fingerprint_stats.summary()}")
+        asset_state_path = ASSET_STATE_PATH
+
+    # Refresh titles and hashes of new or edited pages; the manifest check
+    # below reuses the hashes of the rest
+    with profile_span(profiler, "index"):
+        site_index = SiteIndex.load(SITE_INDEX_PATH)
+        site_index.update(CONTENT_DIR)
+        site_index.save()
 
     # Generate pages recursively
-    generate_pages_recursive(content_dir, template_path, public_dir)
+    options = RenderOptions(
+        block_cache_path=BLOCK_CACHE_PATH if args.block_cache else None,
+        inline_cache_path=INLINE_CACHE_PATH if args.inline_cache else None,
+        image_state_path=image_state_path,
+        asset_state_path=asset_state_path,
+        minify_html=args.minify,
+    )
+    pipeline = None
+    if args.pipeline:
+        pipeline = PagePipeline(TEMPLATE_PATH, args.jobs, args.io_threads, options=options,
+                                collect_records=records is not None)
+    errors = generate_pages_recursive(
+        CONTENT_DIR, TEMPLATE_PATH, PUBLIC_DIR, manifest=manifest, jobs=args.jobs, options=options, profiler=profiler,
+        pipeline=pipeline, changes=changes, records=records, site_index=site_index,
+    )
+    if records is not None:
+        records.save()
+    if args.site_files:
+        with profile_span(profiler, "site files"):
+            written = write_site_files(PUBLIC_DIR, records, args.base_url, SITE_TITLE, changes)
+        print(f"Site files: {len(records.pages)} pages, {len(written)} file(s) written")
+    if not args.incremental:
+        keep = {rel_path for rel_path, _ in walk_files(STATIC_DIR)}
+        keep.update(entry["output"] for entry in manifest.pages.values())
+        if args.site_files:
+            keep.update(SITE_FILE_NAMES)
+        if args.images:
+            keep.update(variant_outputs(load_images(IMAGE_STATE_PATH)))
+        if args.fingerprint:
+            keep.update(fingerprint_outputs(load_state(ASSET_STATE_PATH)))
+        if args.precompress:
+            # Compressed siblings are checked against their sources below
+            keep.update(rel_path + suffix for rel_path in list(keep) for suffix in sibling_suffixes())
+        prune_directory(PUBLIC_DIR, keep, changes)
+    broken_links = []
+    if args.check_links:
+        # Runs once public/ holds exactly what this build produced
+        with profile_span(profiler, "links"):
+            broken_links = check_links(PUBLIC_DIR, records)
+        links = sum(len(page["links"]) for page in records.pages.values())
+        print(f"Checked links: {links} in {len(records.pages)} pages, {len(broken_links)} broken")
+    if args.precompress:
+        with profile_span(profiler, "compress"):
+            compress_stats = precompress_directory(
+                PUBLIC_DIR, None, args.compress_min_size, args.gzip_level, args.brotli_quality, changes
+            )
+        print(f"Precompressed files: {compress_stats.summary()}")
+    changes.save(args.changed_files)
+    print(f"Changed files: {changes.summary()}, listed in {args.changed_files}")
+    # Serial builds render in this process, so the cache's own stats are here
+    for inline_cache in open_inline_caches.values():
+        print(f"Inline cache: {inline_cache.summary()}")
+    if minifier is not None:
+        # Pages rendered by worker processes were merged into html_stats
+        minify_stats = MinifyStats()
+        minify_stats.merge(minifier.stats)
+        minify_stats.merge(html_stats)
+        print(f"Minified: {minify_stats.summary()}")
+
+    if profiler is not None:
+        print(profiler.summary(args.profile_top))
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+            print(f"Trace written to {args.profile_trace}")
+
+    if broken_links:
+        print(f"{len(broken_links)} broken link(s):")
+        for link in broken_links:
+            print(f"  {link.page}: {link.url} ({link.reason})")
+    if errors:
+        print(f"{len(errors)} page(s) failed to build:")
+        for md_path, error in errors:
+            print(f"  {md_path}: {error}")
+    if errors or broken_links:
+        return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,9 +1,2 @@
-import re
-
-def extract_markdown_images(text):
-    pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
-    return re.findall(pattern, text)
-
-def extract_markdown_links(text):
-    pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-    return re.findall(pattern, text)
\ No newline at end of file
+# Kept for existing imports; the patterns live with the inline parser
+from inline_markdown import extract_markdown_images, extract_markdown_links
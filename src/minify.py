@@ -0,0 +1,208 @@
+import os
+import re
+import shutil
+
+from build_manifest import hash_bytes
+
+# Optional minification of generated pages and of CSS under static/.
+# Pages are minified as they stream out, one chunk at a time; CSS files are
+# minified when they are copied into public/, and the result is cached
+# under the source's content hash.
+
+# Bump when the output of either minifier changes, so cached results and
+# fingerprints of minified files are thrown away
+MINIFY_VERSION = "2"
+
+# Elements whose whitespace is significant or isn't HTML
+PRESERVE_TAGS = ("pre", "textarea", "script", "style")
+
+# Whitespace next to these never renders, so it can go entirely. Around
+# anything else (inline elements and text) one space is kept.
+BLOCK_TAGS = frozenset((
+    "!doctype", "html", "head", "body", "title", "meta", "link", "base", "script", "style", "noscript",
+    "header", "footer", "main", "nav", "section", "article", "aside", "div", "p", "h1", "h2", "h3", "h4",
+    "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd", "blockquote", "pre", "figure", "figcaption", "hr",
+    "table", "thead", "tbody", "tfoot", "tr", "th", "td", "form", "fieldset", "details", "summary",
+))
+
+html_token_pattern = re.compile(r'(<!--.*?-->|<[^>]*>)', re.S)
+tag_name_pattern = re.compile(r'<(/?)([!A-Za-z][\w:-]*)')
+# HTML and CSS whitespace only: \s would also take non-breaking spaces
+whitespace_pattern = re.compile(r'[ \t\n\r\f]+')
+
+css_token_pattern = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+# Whitespace around these never matters; after a colon it doesn't either,
+# but before one it can separate a selector from a pseudo-class
+css_punctuation_pattern = re.compile(r'[ \t\n\r\f]*([{};,>])[ \t\n\r\f]*|(:)[ \t\n\r\f]+')
+
+
+class MinifyStats:
+    # Files and bytes before and after minification, per file type
+    def __init__(self):
+        self.types = {}
+
+    def add(self, file_type, bytes_in, bytes_out, files=1):
+        counts = self.types.setdefault(file_type, [0, 0, 0])
+        counts[0] += files
+        counts[1] += bytes_in
+        counts[2] += bytes_out
+
+    def merge(self, other):
+        for file_type, (files, bytes_in, bytes_out) in other.types.items():
+            self.add(file_type, bytes_in, bytes_out, files)
+
+    def summary(self):
+        if not self.types:
+            return "nothing minified"
+        return ", ".join(
+            f"{file_type}: {files} files, {bytes_in} -> {bytes_out} bytes ({bytes_in - bytes_out} saved)"
+            for file_type, (files, bytes_in, bytes_out) in sorted(self.types.items())
+        )
+
+    def __repr__(self):
+        return f"MinifyStats({self.summary()})"
+
+
+# Pages minified in this process, plus those generate_pages_recursive
+# merges in from worker processes
+html_stats = MinifyStats()
+
+
+class HtmlMinifier:
+    # Streaming HTML minifier with the rewrite(html, page_path) interface of
+    # the other page rewriters. One instance per page: it carries whether a
+    # preserved element is open and whether whitespace is pending from the
+    # end of the last chunk. RewriteWriter never splits a tag between
+    # chunks.
+    def __init__(self, stats=html_stats):
+        self.stats = stats
+        self.preserve = None
+        self.pending_space = False
+        self.after_block = True
+        stats.add(".html", 0, 0)
+
+    def rewrite(self, html, page_path):
+        out = []
+        for index, token in enumerate(html_token_pattern.split(html)):
+            if index % 2:
+                self.tag(token, out)
+            elif token:
+                self.text(token, out)
+        minified = ''.join(out)
+        self.stats.add(".html", len(html.encode()), len(minified.encode()), files=0)
+        return minified
+
+    def tag(self, token, out):
+        match = tag_name_pattern.match(token)
+        if self.preserve is not None:
+            out.append(token)
+            if match is not None and match.group(1) and match.group(2).lower() == self.preserve:
+                self.preserve = None
+                self.after_block = True
+            return
+        if token.startswith("<!--"):
+            if token.startswith("<!--[if"):
+                # Conditional comments still mean something to old browsers
+                out.append(token)
+            return
+        block = match is not None and match.group(2).lower() in BLOCK_TAGS
+        if self.pending_space and not block and not self.after_block:
+            out.append(' ')
+        self.pending_space = False
+        out.append(token)
+        self.after_block = block
+        if match is not None and not match.group(1) and match.group(2).lower() in PRESERVE_TAGS:
+            self.preserve = match.group(2).lower()
+
+    def text(self, token, out):
+        if self.preserve is not None:
+            out.append(token)
+            return
+        text = whitespace_pattern.sub(' ', token)
+        if text.startswith(' '):
+            self.pending_space = True
+            text = text[1:]
+        if not text:
+            return
+        if self.pending_space and not self.after_block:
+            out.append(' ')
+        self.pending_space = text.endswith(' ')
+        out.append(text[:-1] if self.pending_space else text)
+        self.after_block = False
+
+
+def keep_punctuation(match):
+    return match.group(1) or match.group(2)
+
+
+def minify_css_code(code):
+    # Code between strings and licence comments
+    code = css_punctuation_pattern.sub(keep_punctuation, whitespace_pattern.sub(' ', code))
+    return code.replace(';}', '}')
+
+
+def minify_css(css):
+    # Drops comments (except /*! ... */ licence comments), whitespace that
+    # doesn't separate anything and semicolons that end a block. Strings are
+    # left as they are.
+    out = []
+    code = []
+    position = 0
+    for match in css_token_pattern.finditer(css):
+        code.append(css[position:match.start()])
+        string, comment = match.groups()
+        if string is None and not comment.startswith("/*!"):
+            # A comment still separates what's on either side of it
+            code.append(' ')
+        else:
+            out.append(minify_css_code(''.join(code)))
+            out.append(string or comment)
+            code = []
+        position = match.end()
+    code.append(css[position:])
+    out.append(minify_css_code(''.join(code)))
+    return ''.join(out).strip(" \t\n\r\f")
+
+
+class MinifyCache:
+    # Minified copies of static files, stored under the hash of the source
+    # they came from so each version of a file is only minified once
+    version = MINIFY_VERSION
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stats = MinifyStats()
+
+    def handles(self, path):
+        return path.endswith(".css")
+
+    def cache_path(self, source_hash, ext):
+        return os.path.join(self.cache_dir, f"{source_hash}-{MINIFY_VERSION}{ext}")
+
+    def output_hash(self, source_hash):
+        # Stands in for the hash of the minified file, e.g. in fingerprints
+        return hash_bytes(f"{source_hash}\0minify-{MINIFY_VERSION}".encode())
+
+    def minified_path(self, source_path, source_hash):
+        # Path of the minified copy of source_path, minifying it on a miss
+        cache_path = self.cache_path(source_hash, os.path.splitext(source_path)[1])
+        if not os.path.exists(cache_path):
+            with open(source_path, 'r') as f:
+                minified = minify_css(f.read())
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(minified)
+            os.replace(tmp_path, cache_path)
+        return cache_path
+
+    def install(self, source_path, source_hash, destination, mtime_ns):
+        # Writes the minified copy to destination with the source's mtime,
+        # which is what later runs compare against. Returns its size.
+        cache_path = self.minified_path(source_path, source_hash)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.lexists(destination):
+            os.remove(destination)
+        shutil.copyfile(cache_path, destination)
+        os.utime(destination, ns=(mtime_ns, mtime_ns))
+        return os.path.getsize(destination)
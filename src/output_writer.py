@@ -0,0 +1,210 @@
+import hashlib
+import os
+import tempfile
+
+from build_manifest import hash_file
+
+# mkstemp creates files readable only by their owner; outputs should get
+# the same permissions open() would have given them
+umask = os.umask(0)
+os.umask(umask)
+OUTPUT_MODE = 0o666 & ~umask
+
+
+class AtomicOutput:
+    # A text file that is written to a temp file next to dest_path and only
+    # renamed over it on commit if the content differs from what is already
+    # there. An unchanged page keeps its old mtime, so rsync and CDN syncs
+    # don't see it as modified, and readers never see a half-written page.
+    def __init__(self, dest_path):
+        self.dest_path = dest_path
+        directory, name = os.path.split(dest_path)
+        fd, self.tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+        self.file = os.fdopen(fd, 'wb')
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode()
+        self.file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def unchanged(self):
+        try:
+            stat = os.stat(self.dest_path)
+        except FileNotFoundError:
+            return False
+        # Only a file of the same size is worth reading back to compare
+        return stat.st_size == self.size and hash_file(self.dest_path) == self.digest.hexdigest()
+
+    def commit(self):
+        # Returns True if dest_path was replaced, False if it already held
+        # the same content
+        self.file.close()
+        if self.unchanged():
+            os.remove(self.tmp_path)
+            return False
+        try:
+            os.chmod(self.tmp_path, OUTPUT_MODE)
+            os.replace(self.tmp_path, self.dest_path)
+        except BaseException:
+            os.remove(self.tmp_path)
+            raise
+        return True
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def remove_partial_outputs(dest_path):
+    # Deletes the temp files of AtomicOutputs for dest_path whose process
+    # was killed before it could commit or abort them
+    directory, name = os.path.split(dest_path)
+    try:
+        entries = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.startswith(f".{name}.") and entry.endswith(".tmp"):
+            os.remove(os.path.join(directory, entry))
+
+
+def partial_tag_start(html):
+    # Where a tag or comment that html ends in the middle of starts, or
+    # len(html) if it doesn't end in one
+    start = html.rfind('<')
+    if start == -1 or html.find('>', start) != -1:
+        start = len(html)
+    comment = html.rfind('<!--')
+    if comment != -1 and comment < start and html.find('-->', comment) == -1:
+        start = comment
+    return start
+
+
+class RewriteWriter:
+    # File-like wrapper that passes each chunk of a page through rewriters
+    # (objects with rewrite(html, page_path)) on its way to fp. A tag split
+    # between chunks, such as one with a template placeholder in an
+    # attribute, is held back until the rest of it arrives, so rewriters can
+    # match one tag at a time. finish() writes out what is left at the end
+    # of the page.
+    def __init__(self, fp, rewriters, page_path):
+        self.fp = fp
+        self.rewriters = rewriters
+        self.page_path = page_path
+        self.pending = ""
+
+    def write(self, text):
+        if self.pending:
+            text = self.pending + text
+        cut = partial_tag_start(text)
+        self.pending = text[cut:]
+        if cut:
+            self.rewrite(text[:cut])
+
+    def rewrite(self, text):
+        for rewriter in self.rewriters:
+            text = rewriter.rewrite(text, self.page_path)
+        self.fp.write(text)
+
+    def finish(self):
+        if self.pending:
+            self.rewrite(self.pending)
+            self.pending = ""
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.fp.flush()
+
+
+class TrackedRewriter:
+    # One page's view of a rewriter shared between pages (ImageAttributes,
+    # AssetUrls): the site paths its URLs are looked up under go into
+    # references, so the build knows which images and assets the page
+    # depends on
+    def __init__(self, rewriter, references):
+        self.rewriter = rewriter
+        self.references = references
+
+    def rewrite(self, html, page_path):
+        return self.rewriter.rewrite(html, page_path, self.references)
+
+
+def write_output(dest_path, text):
+    output = AtomicOutput(dest_path)
+    try:
+        output.write(text)
+    except BaseException:
+        output.abort()
+        raise
+    return output.commit()
+
+
+class ChangeList:
+    # Output files (relative to the public directory) that this build
+    # wrote or deleted, for deploy steps that only push what changed
+    def __init__(self):
+        self.written = set()
+        self.removed = set()
+
+    def write(self, rel_path):
+        rel_path = rel_path.replace(os.sep, '/')
+        self.written.add(rel_path)
+        self.removed.discard(rel_path)
+
+    def remove(self, rel_path):
+        rel_path = rel_path.replace(os.sep, '/')
+        self.removed.add(rel_path)
+        self.written.discard(rel_path)
+
+    def summary(self):
+        return f"{len(self.written)} written, {len(self.removed)} removed"
+
+    def save(self, path):
+        # One "M path" or "D path" line per file, like git diff --name-status
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = [f"M {rel_path}\n" for rel_path in sorted(self.written)]
+        lines += [f"D {rel_path}\n" for rel_path in sorted(self.removed)]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, path)
+
+    def __repr__(self):
+        return f"ChangeList({self.summary()})"
+
+
+def prune_directory(root, keep, changes=None):
+    # Removes every file under root whose relative path isn't in keep, then
+    # any directories left empty. Returns the number of files removed.
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root)
+            if rel_path not in keep:
+                os.remove(path)
+                removed += 1
+                if changes is not None:
+                    changes.remove(rel_path)
+        if dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
@@ -1,50 +1,193 @@
+import html
 import os
-from inline_markdown import markdown_to_html_node, extract_title
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from functools import partial
+from inline_markdown import BlockScanner, blocks_to_html_node, blocks_description
+from build_manifest import hash_bytes, hash_file
+from template import load_template
+from block_cache import open_block_cache
+from inline_cache import flush_inline_caches, open_inline_cache
+from profiling import PageProfile, TimedReader, TimedWriter, profile_span
+from output_writer import AtomicOutput, RewriteWriter, TrackedRewriter, remove_partial_outputs
+from site_files import page_record
+from images import open_image_attributes
+from fingerprint import open_asset_urls
+from minify import MINIFY_VERSION, HtmlMinifier, MinifyStats, html_stats
 
-def generate_page(from_path, template_path, dest_path):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    
-    # Read markdown file
-    with open(from_path, 'r') as f:
-        markdown_content = f.read()
-    
-    # Read template file
-    with open(template_path, 'r') as f:
-        template_content = f.read()
-    
-    # Convert markdown to HTML
-    html_node = markdown_to_html_node(markdown_content)
-    print(f"HTML Node: {html_node}")  # Debug print
-    
-    if html_node is None:
-        print("Error: markdown_to_html_node returned None")
-        return
+# What generate_page returns for a page it rendered; False means it failed
+PAGE_WRITTEN = "written"
+PAGE_UNCHANGED = "unchanged"
 
-    try:
-        html_content = html_node.to_html()
-    except Exception as e:
-        print(f"Error generating HTML content: {e}")
-        return
-    
-    # Extract title
-    try:
-        title = extract_title(markdown_content)
-    except ValueError:
+# Error reported for a page whose worker process died while rendering it
+WORKER_DIED = "worker process died while rendering the page"
+
+class RenderOptions:
+    # How every page of a build is rendered, handed as one object from main
+    # down to render_page and on to worker processes: the block and inline
+    # caches to use, the image and asset states pages take their <img>
+    # attributes and fingerprinted URLs from, and whether pages are minified
+    def __init__(self, block_cache_path=None, inline_cache_path=None, image_state_path=None, asset_state_path=None, minify_html=False):
+        self.block_cache_path = block_cache_path
+        self.inline_cache_path = inline_cache_path
+        self.image_state_path = image_state_path
+        self.asset_state_path = asset_state_path
+        self.minify_html = minify_html
+
+    def __repr__(self):
+        return f"RenderOptions({self.__dict__})"
+
+def page_url(rel_path):
+    # Site URL for a content file, e.g. "blog/index.md" -> "/blog/"
+    url = '/' + rel_path[:-3].replace(os.sep, '/') + '.html'
+    if url.endswith('/index.html'):
+        url = url[:-len('index.html')]
+    return url
+
+def page_values(template, scanner, blocks, html_node, from_path, page_path=None, mtime=None):
+    # The scanner picks up the first h1 while splitting; a title in the
+    # front matter takes precedence
+    title = scanner.front_matter.get("title") or scanner.title
+    if title is None:
         title = "Untitled"  # Fallback title if no h1 is found
     
-    # Replace placeholders in template
-    full_html = template_content.replace("{{ Title }}", title).replace("{{ Content }}", html_content)
-    
+    # Only compute the optional placeholders the template actually uses
+    values = {"Title": title, "Content": html_node}
+    if "Description" in template.names:
+        values["Description"] = html.escape(blocks_description(blocks))
+    if "Date" in template.names:
+        if mtime is None:
+            mtime = os.path.getmtime(from_path)
+        values["Date"] = date.fromtimestamp(mtime).isoformat()
+    if "Path" in template.names and page_path is not None:
+        values["Path"] = page_path
+    return values
+
+def page_rewriters(options, references=None, minified=None):
+    # What rendered pages pass through on their way out, in order: image
+    # sizes are looked up by the original URL, before it is fingerprinted,
+    # and minification comes last. The minifier keeps state between the
+    # chunks of a page, so every page needs a fresh list. references, if
+    # given, is a set that collects the site paths of the images and assets
+    # the page looks up; minified, a MinifyStats the bytes saved are counted
+    # in instead of this process's html_stats.
+    rewriters = []
+    if options.image_state_path:
+        rewriters.append(open_image_attributes(options.image_state_path))
+    if options.asset_state_path:
+        rewriters.append(open_asset_urls(options.asset_state_path))
+    if references is not None:
+        rewriters = [TrackedRewriter(rewriter, references) for rewriter in rewriters]
+    if options.minify_html:
+        rewriters.append(HtmlMinifier(minified if minified is not None else html_stats))
+    return rewriters
+
+def render_page(lines, mtime, from_path, page_path, template_path, fp, options=None, profile=None, records=None, references=None, minified=None):
+    # Renders markdown, given as an iterable of lines, into fp: a file being
+    # written or a buffer. Shared by generate_page and the pipeline's render
+    # stage. options are the build's RenderOptions. profile is a PageProfile
+    # to record stage timings in, or None to skip the bookkeeping entirely.
+    # records, if given, is a list the page's site file record is appended
+    # to. With an image state, <img> tags get the size and srcset of the
+    # images they show; with an asset state, URLs of static assets point at
+    # their fingerprinted copies, and the site paths looked up go into the
+    # set references, if given. A minified page's sizes before and after
+    # go into the MinifyStats minified, if given.
+    if options is None:
+        options = RenderOptions()
+
+    # Compiled once per build and reused for every page
+    template = load_template(template_path)
+    if profile is not None:
+        read_seconds = time.perf_counter() - profile.last
+        # Reading and scanning interleave when lines come straight from a
+        # file, so time the reads separately
+        lines = TimedReader(lines)
+
+    scanner = BlockScanner()
+    block_cache = open_block_cache(options.block_cache_path) if options.block_cache_path else None
+    inline_cache = open_inline_cache(options.inline_cache_path) if options.inline_cache_path else None
+    blocks = list(scanner.scan(lines))
+    if profile is not None:
+        read_seconds += lines.seconds
+
+    # Convert markdown to HTML, reusing cached fragments for unchanged blocks
+    # and memoized HTML for repeated inline strings
+    if inline_cache is not None:
+        inline_lookups = (inline_cache.hits, inline_cache.misses)
+    html_node = blocks_to_html_node(blocks, block_cache, inline_cache)
+    if block_cache is not None:
+        block_cache.flush()
+    if inline_cache is not None:
+        if profile is not None:
+            profile.inline_hits = inline_cache.hits - inline_lookups[0]
+            profile.inline_misses = inline_cache.misses - inline_lookups[1]
+
+    values = page_values(template, scanner, blocks, html_node, from_path, page_path, mtime)
+    if records is not None:
+        records.append(page_record(scanner, blocks, values["Title"], page_path, mtime))
+
+    if profile is not None:
+        profile.mark_split("parse", "read", read_seconds, first=True)
+
+    rewriters = page_rewriters(options, references, minified)
+    if not rewriters:
+        template.write(fp, values)
+        return
+    page_writer = RewriteWriter(fp, rewriters, page_path or '/')
+    template.write(page_writer, values)
+    page_writer.finish()
+
+def generate_page(from_path, template_path, dest_path, page_path=None, options=None, profile=None, records=None, references=None, minified=None):
+    # See render_page for the options
+    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+
     # Ensure the directory exists
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
     
-    # Write the full HTML to the destination file
-    with open(dest_path, 'w') as f:
-        f.write(full_html)
+    # Stream the filled-in template into a temp file that only replaces the
+    # destination if the page actually changed
+    output = AtomicOutput(dest_path)
+    # Serialization and writing interleave, so when profiling, time the
+    # writes separately and attribute the rest to serialization
+    writer = output if profile is None else TimedWriter(output)
+    try:
+        # Split the markdown into blocks straight from the file, one line at
+        # a time, instead of reading it whole and splitting the string
+        with open(from_path, 'r') as f:
+            stat = os.fstat(f.fileno())
+            if profile is not None:
+                profile.bytes_read = stat.st_size
+            render_page(
+                f, stat.st_mtime, from_path, page_path, template_path, writer,
+                options=options, profile=profile, records=records, references=references, minified=minified,
+            )
+        if profile is not None:
+            writer.flush()
+    except BaseException:
+        # Don't leave a half-written page behind
+        output.abort()
+        raise
+    if profile is None:
+        written = output.commit()
+    else:
+        # Comparing against the old file and renaming count as writing
+        start = time.perf_counter()
+        written = output.commit()
+        writer.seconds += time.perf_counter() - start
+        profile.mark_split("serialize", "write", writer.seconds)
+        profile.bytes_written = output.size
 
+    if not written:
+        print(f"Page unchanged: {dest_path}")
+        return PAGE_UNCHANGED
     print(f"Page generated successfully: {dest_path}")
+    return PAGE_WRITTEN
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path):
+def find_pages(dir_path_content, dest_dir_path):
+    pages = []
     for root, _, files in os.walk(dir_path_content):
         for file in files:
             if file.endswith('.md'):
@@ -54,13 +197,189 @@ def generate_pages_recursive(dir_path_content, template_path, dest_dir_path):
                 # Construct the destination path
                 rel_path = os.path.relpath(md_path, dir_path_content)
                 dest_path = os.path.join(dest_dir_path, rel_path[:-3] + '.html')
-                
-                # Ensure the destination directory exists
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                
-                # Generate the page
-                generate_page(md_path, template_path, dest_path)
-                print(f"Generated page: {dest_path}")
+                pages.append((md_path, rel_path, dest_path))
+    return pages
+
+def build_page(md_path, dest_path, page_path, template_path, options=None, profile=False, collect_records=False):
+    # Failures are returned instead of raised so that one bad page doesn't
+    # abort the rest of the build (render_pages handles a worker process
+    # that dies outright). Returns
+    # (error, PageProfile or None, whether the output file was written,
+    # site file record or None, site paths of the images and assets used,
+    # MinifyStats of the page or None).
+    page_profile = PageProfile(md_path) if profile else None
+    records = [] if collect_records else None
+    references = set()
+    minified = MinifyStats() if options is not None and options.minify_html else None
+    try:
+        # Ensure the destination directory exists
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        result = generate_page(
+            md_path, template_path, dest_path, page_path,
+            options=options, profile=page_profile, records=records, references=references, minified=minified,
+        )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", page_profile, False, None, (), None
+    return None, page_profile, result == PAGE_WRITTEN, records[0] if records else None, references, minified
+
+class IsolatedWorker:
+    # Runs calls one at a time in a single worker process, so a page that
+    # crashes its process (segfault, out of memory) only fails itself. A
+    # call that kills the worker raises BrokenProcessPool, and the next call
+    # starts a fresh one.
+    def __init__(self):
+        self.executor = None
+
+    def run(self, fn, *args, **kwargs):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        try:
+            return self.executor.submit(fn, *args, **kwargs).result()
+        except BrokenProcessPool:
+            self.close()
+            raise
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+def render_pages(pages, template_path, jobs=1, options=None, profile=False, collect_records=False):
+    md_paths = [page[0] for page in pages]
+    dest_paths = [page[2] for page in pages]
+    page_paths = [page_url(page[1]) for page in pages]
+    build = partial(
+        build_page,
+        template_path=template_path,
+        options=options,
+        profile=profile,
+        collect_records=collect_records,
+    )
+    if jobs <= 1 or len(pages) <= 1:
+        return list(map(build, md_paths, dest_paths, page_paths))
+    # Hand each worker several pages at a time to keep IPC overhead low
+    chunksize = max(1, len(pages) // (jobs * 4))
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for result in executor.map(build, md_paths, dest_paths, page_paths, chunksize=chunksize):
+                results.append(result)
+    except BrokenProcessPool:
+        # A worker died without reporting back (killed, out of memory, ...),
+        # which takes the whole pool down. Which page killed it isn't known,
+        # and it may do the same to this process, so the rest are rendered
+        # one at a time in a worker of their own. Workers killed mid-page
+        # leave temp files next to the page, which go first.
+        done = len(results)
+        print(f"Worker process died; rendering the remaining {len(pages) - done} pages one at a time")
+        worker = IsolatedWorker()
+        try:
+            for md_path, dest_path, page_path in zip(md_paths[done:], dest_paths[done:], page_paths[done:]):
+                remove_partial_outputs(dest_path)
+                try:
+                    results.append(worker.run(build, md_path, dest_path, page_path))
+                except BrokenProcessPool:
+                    results.append((WORKER_DIED, None, False, None, (), None))
+                    remove_partial_outputs(dest_path)
+        finally:
+            worker.close()
+    return results
+
+def page_template_hash(template_hash, references, resolvers):
+    # template_hash extended with what each image and asset the page
+    # references renders as now, so only the pages using an image or asset
+    # are rebuilt when it changes. resolvers are the ImageAttributes and
+    # AssetUrls in use.
+    if not resolvers:
+        return template_hash
+    resolved = [[path] + [resolver.resolve(path) for resolver in resolvers] for path in sorted(references)]
+    return hash_bytes(f"{template_hash}\0{resolved!r}".encode())
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, manifest=None, jobs=1, options=None, profiler=None, pipeline=None, changes=None, records=None, site_index=None):
+    # With a manifest, pages whose markdown and template are unchanged since
+    # the last build are skipped, and outputs of deleted sources are removed.
+    # An up to date SiteIndex, if given, supplies the content hashes, so
+    # pages whose size and mtime haven't changed aren't hashed again.
+    # Returns a list of (md_path, error) for the pages that failed. A
+    # PagePipeline, if given, renders the pages instead of render_pages. A
+    # ChangeList, if given, collects the outputs written or removed. A
+    # PageRecords, if given, gets the site file record of every page. With
+    # an image or asset state in options, a page is rebuilt whenever the
+    # size or variants of an image it shows, or the fingerprint of an asset
+    # it links to, change.
+    if options is None:
+        options = RenderOptions()
+    with profile_span(profiler, "walk"):
+        pages = find_pages(dir_path_content, dest_dir_path)
+
+    seen = set()
+    pending = []
+    source_hashes = {}
+    with profile_span(profiler, "hash"):
+        template_hash = hash_file(template_path) if manifest is not None else None
+        resolvers = []
+        if template_hash is not None and options.image_state_path:
+            resolvers.append(open_image_attributes(options.image_state_path))
+        if template_hash is not None and options.asset_state_path:
+            resolvers.append(open_asset_urls(options.asset_state_path))
+        if template_hash is not None and options.minify_html:
+            template_hash = hash_bytes(f"{template_hash}\0minify-{MINIFY_VERSION}".encode())
+        for md_path, rel_path, dest_path in pages:
+            seen.add(rel_path)
+            if manifest is not None:
+                entry = site_index.pages.get(rel_path.replace(os.sep, '/')) if site_index is not None else None
+                source_hash = entry["hash"] if entry is not None else hash_file(md_path)
+                # A skipped page still needs a record from an earlier build
+                has_record = records is None or rel_path in records.pages
+                page_hash = page_template_hash(template_hash, manifest.references(rel_path), resolvers)
+                if has_record and manifest.is_current(rel_path, source_hash, page_hash, dest_path):
+                    print(f"Skipped unchanged page: {dest_path}")
+                    continue
+                manifest.forget(rel_path)
+                source_hashes[rel_path] = source_hash
+            pending.append((md_path, rel_path, dest_path))
+
+    errors = []
+    if pipeline is not None:
+        results = pipeline.run(pending, profiler is not None)
+    else:
+        results = render_pages(
+            pending, template_path, jobs, options, profile=profiler is not None, collect_records=records is not None,
+        )
+    for (md_path, rel_path, dest_path), (error, page_profile, written, record, references, minified) in zip(pending, results):
+        if page_profile is not None:
+            profiler.add_page(page_profile)
+        if minified is not None:
+            # Pages minified in worker processes are counted here
+            html_stats.merge(minified)
+        if error is not None:
+            print(f"Failed to generate page {md_path}: {error}")
+            errors.append((md_path, error))
+            continue
+        output = os.path.relpath(dest_path, dest_dir_path)
+        if written:
+            print(f"Generated page: {dest_path}")
+            if changes is not None:
+                changes.write(output)
+        if records is not None:
+            records.record(rel_path, record)
+        if manifest is not None:
+            page_hash = page_template_hash(template_hash, references, resolvers)
+            manifest.record(rel_path, source_hashes[rel_path], page_hash, output, references)
 
+    if options.inline_cache_path:
+        # Pages rendered in this process; workers flush as they exit
+        flush_inline_caches()
 
-                
\ No newline at end of file
+    if manifest is not None:
+        for output in manifest.remove_stale(seen):
+            stale_path = os.path.join(dest_dir_path, output)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+                print(f"Removed stale page: {stale_path}")
+                if changes is not None:
+                    changes.remove(output)
+        manifest.save()
+    if records is not None:
+        records.remove_stale(seen)
+    return errors
@@ -0,0 +1,239 @@
+import io
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from output_writer import write_output
+from minify import MinifyStats
+from page_generator import WORKER_DIED, IsolatedWorker, page_url, render_page
+from profiling import PageProfile
+
+# Pages waiting between two stages. Every queue is bounded, so only about
+# this many sources and rendered pages are held in memory at a time no
+# matter how large the site is.
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_IO_THREADS = 4
+
+
+def read_source(path):
+    with open(path, 'r') as f:
+        text = f.read()
+        stat = os.fstat(f.fileno())
+    return text, stat.st_mtime, stat.st_size
+
+
+def render_page_source(text, mtime, from_path, page_path, template_path, options=None, collect_records=False, profile=None):
+    # Renders markdown that has already been read into the finished page as
+    # a string. Runs in the pipeline's render stage, either in the calling
+    # process or in a worker. Returns (page HTML, site file record or None,
+    # PageProfile or None, site paths of the images and assets used,
+    # MinifyStats of the page or None).
+    print(f"Generating page from {from_path} using {template_path}")
+    if profile is not None:
+        profile.resume()
+    records = [] if collect_records else None
+    references = set()
+    minified = MinifyStats() if options is not None and options.minify_html else None
+    buffer = io.StringIO()
+    render_page(
+        text.split('\n'), mtime, from_path, page_path, template_path, buffer,
+        options=options, profile=profile, records=records, references=references, minified=minified,
+    )
+    if profile is not None:
+        profile.mark("serialize")
+    return buffer.getvalue(), records[0] if records else None, profile, references, minified
+
+
+class PagePipeline:
+    # Builds pages in three overlapping stages so the CPU isn't left idle
+    # while files are read or written:
+    #
+    #   reader threads -> render (this process or jobs workers) -> writer threads
+    #
+    # Stages hand pages over through bounded queues. run() returns results
+    # in the same (error, profile, written, record, references, minified)
+    # form as render_pages, in page order; with profile, each page's
+    # PageProfile travels along with it through the stages.
+    def __init__(self, template_path, jobs=1, io_threads=DEFAULT_IO_THREADS, queue_size=DEFAULT_QUEUE_SIZE,
+                 options=None, collect_records=False):
+        self.template_path = template_path
+        self.jobs = jobs
+        self.io_threads = max(1, io_threads)
+        self.queue_size = max(1, queue_size)
+        self.options = options
+        self.collect_records = collect_records
+        self.directories = set()
+        self.lock = threading.Lock()
+
+    def run(self, pages, profile=False):
+        results = [None] * len(pages)
+        read_queue = queue.Queue(self.queue_size)
+        render_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+
+        def feed():
+            for index, (md_path, rel_path, dest_path) in enumerate(pages):
+                read_queue.put((index, md_path, dest_path, page_url(rel_path)))
+            for _ in range(self.io_threads):
+                read_queue.put(None)
+
+        def read():
+            while True:
+                item = read_queue.get()
+                if item is None:
+                    # Tells the render stage this reader is done
+                    render_queue.put(None)
+                    return
+                index, md_path, dest_path, page_path = item
+                page_profile = PageProfile(md_path) if profile else None
+                try:
+                    text, mtime, size = read_source(md_path)
+                except Exception as e:
+                    results[index] = (f"{type(e).__name__}: {e}", page_profile, False, None, (), None)
+                    continue
+                if page_profile is not None:
+                    page_profile.mark("read")
+                    page_profile.bytes_read = size
+                render_queue.put((index, md_path, dest_path, page_path, text, mtime, page_profile))
+
+        def write():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                index, dest_path, (page_html, record, page_profile, references, minified) = item
+                results[index] = self.write_page(dest_path, page_html, record, page_profile, references, minified)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        threads += [threading.Thread(target=read, daemon=True) for _ in range(self.io_threads)]
+        writers = [threading.Thread(target=write, daemon=True) for _ in range(self.io_threads)]
+        for thread in threads + writers:
+            thread.start()
+
+        if self.jobs <= 1:
+            self.render_serial(render_queue, write_queue, results)
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                self.render_parallel(executor, render_queue, write_queue, results)
+
+        for thread in threads:
+            thread.join()
+        for _ in writers:
+            write_queue.put(None)
+        for thread in writers:
+            thread.join()
+        return results
+
+    def sources(self, render_queue):
+        # Yields read pages until every reader has finished
+        finished = 0
+        while finished < self.io_threads:
+            item = render_queue.get()
+            if item is None:
+                finished += 1
+            else:
+                yield item
+
+    def render_serial(self, render_queue, write_queue, results):
+        for index, md_path, dest_path, page_path, text, mtime, page_profile in self.sources(render_queue):
+            try:
+                rendered = render_page_source(
+                    text, mtime, md_path, page_path, self.template_path,
+                    options=self.options, collect_records=self.collect_records, profile=page_profile,
+                )
+            except Exception as e:
+                results[index] = (f"{type(e).__name__}: {e}", page_profile, False, None, (), None)
+                continue
+            write_queue.put((index, dest_path, rendered))
+
+    def render_parallel(self, executor, render_queue, write_queue, results):
+        # At most queue_size pages are rendering at once; the oldest is
+        # handed to the writers before another is submitted. If a worker
+        # dies the pool is gone: the pages that were in it and the ones
+        # still to come are rendered one at a time in a worker of their own,
+        # as render_pages does, so only the page that crashed fails.
+        in_flight = deque()
+        isolated = IsolatedWorker()
+        broken = False
+
+        def render_isolated(item):
+            index, md_path, dest_path, page_path, text, mtime, page_profile = item
+            try:
+                rendered = isolated.run(
+                    render_page_source,
+                    text, mtime, md_path, page_path, self.template_path,
+                    options=self.options, collect_records=self.collect_records, profile=page_profile,
+                )
+            except BrokenProcessPool:
+                results[index] = (WORKER_DIED, page_profile, False, None, (), None)
+                return
+            except Exception as e:
+                results[index] = (f"{type(e).__name__}: {e}", page_profile, False, None, (), None)
+                return
+            write_queue.put((index, dest_path, rendered))
+
+        def hand_off():
+            nonlocal broken
+            item, future = in_flight.popleft()
+            index, dest_path = item[0], item[2]
+            try:
+                write_queue.put((index, dest_path, future.result()))
+            except BrokenProcessPool:
+                if not broken:
+                    print("Worker process died; rendering the remaining pages one at a time")
+                    broken = True
+                render_isolated(item)
+            except Exception as e:
+                results[index] = (f"{type(e).__name__}: {e}", None, False, None, (), None)
+
+        try:
+            for item in self.sources(render_queue):
+                if not broken:
+                    index, md_path, dest_path, page_path, text, mtime, page_profile = item
+                    try:
+                        future = executor.submit(
+                            render_page_source,
+                            text, mtime, md_path, page_path, self.template_path,
+                            options=self.options, collect_records=self.collect_records, profile=page_profile,
+                        )
+                    except BrokenProcessPool:
+                        print("Worker process died; rendering the remaining pages one at a time")
+                        broken = True
+                        future = None
+                if broken:
+                    while in_flight:
+                        hand_off()
+                    render_isolated(item)
+                    continue
+                in_flight.append((item, future))
+                if len(in_flight) >= self.queue_size:
+                    hand_off()
+            while in_flight:
+                hand_off()
+        finally:
+            isolated.close()
+
+    def ensure_directory(self, directory):
+        # Each output directory is created once per build, not once per page
+        if directory in self.directories:
+            return
+        with self.lock:
+            if directory not in self.directories:
+                os.makedirs(directory, exist_ok=True)
+                self.directories.add(directory)
+
+    def write_page(self, dest_path, page_html, record=None, page_profile=None, references=(), minified=None):
+        if page_profile is not None:
+            page_profile.resume()
+        try:
+            self.ensure_directory(os.path.dirname(dest_path))
+            written = write_output(dest_path, page_html)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}", page_profile, False, None, (), None
+        if page_profile is not None:
+            page_profile.mark("write")
+            page_profile.bytes_written = len(page_html.encode())
+        return None, page_profile, written, record, references, minified
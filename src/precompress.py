@@ -0,0 +1,152 @@
+import gzip
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from output_writer import OUTPUT_MODE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Text types a static server can hand out pre-compressed
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".svg", ".xml", ".json", ".txt")
+
+# Files smaller than this gain little from compression, and compressing
+# them can even make the response bigger
+DEFAULT_MIN_SIZE = 256
+DEFAULT_GZIP_LEVEL = 9
+DEFAULT_BROTLI_QUALITY = 11
+
+
+class CompressStats:
+    def __init__(self):
+        self.compressed = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.removed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def summary(self):
+        return (
+            f"{self.compressed} compressed, {self.unchanged} unchanged, {self.skipped} skipped, "
+            f"{self.removed} removed ({self.bytes_in} -> {self.bytes_out} bytes)"
+        )
+
+    def __repr__(self):
+        return f"CompressStats({self.summary()})"
+
+
+def encodings(gzip_level=DEFAULT_GZIP_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+    # (suffix, compress function) for every encoder available here. mtime=0
+    # keeps the gzip output identical from one build to the next.
+    available = [(".gz", lambda data: gzip.compress(data, compresslevel=gzip_level, mtime=0))]
+    if brotli is not None:
+        available.append((".br", lambda data: brotli.compress(data, quality=brotli_quality)))
+    return available
+
+
+def sibling_suffixes():
+    return [".gz", ".br"] if brotli is not None else [".gz"]
+
+
+def is_compressible(path):
+    return path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def write_sibling(path, data, mtime_ns):
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # The sibling carries its source's mtime, which is how later builds
+        # tell it is up to date
+        os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.chmod(tmp_path, OUTPUT_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def compress_file(path, encoders, min_size=DEFAULT_MIN_SIZE):
+    # Returns one (suffix, outcome, bytes in, bytes out) entry per encoder,
+    # where outcome is "compressed", "unchanged", "skipped" or "removed"
+    stat = os.stat(path)
+    results = []
+    data = None
+    for suffix, compress in encoders:
+        sibling = path + suffix
+        try:
+            sibling_stat = os.stat(sibling)
+        except FileNotFoundError:
+            sibling_stat = None
+        if stat.st_size < min_size:
+            outcome = "skipped"
+        elif sibling_stat is not None and sibling_stat.st_mtime_ns == stat.st_mtime_ns:
+            results.append((suffix, "unchanged", 0, 0))
+            continue
+        else:
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                write_sibling(sibling, compressed, stat.st_mtime_ns)
+                results.append((suffix, "compressed", len(data), len(compressed)))
+                continue
+            # Not worth serving compressed
+            outcome = "skipped"
+        if sibling_stat is not None:
+            os.remove(sibling)
+            outcome = "removed"
+        results.append((suffix, outcome, 0, 0))
+    return results
+
+
+def precompress_directory(root, workers=None, min_size=DEFAULT_MIN_SIZE, gzip_level=DEFAULT_GZIP_LEVEL,
+                          brotli_quality=DEFAULT_BROTLI_QUALITY, changes=None):
+    # Writes a .gz (and .br, when the brotli module is installed) sibling next
+    # to every compressible file under root that is at least min_size bytes,
+    # skipping siblings already up to date and removing ones whose source is
+    # gone. zlib releases the GIL, so threads compress in parallel.
+    encoders = encodings(gzip_level, brotli_quality)
+    suffixes = sibling_suffixes()
+    stats = CompressStats()
+    sources = []
+    for dirpath, _, filenames in os.walk(root):
+        names = set(filenames)
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if is_compressible(filename):
+                sources.append(path)
+                continue
+            for suffix in suffixes:
+                if filename.endswith(suffix) and is_compressible(filename[:-len(suffix)]) and filename[:-len(suffix)] not in names:
+                    os.remove(path)
+                    stats.removed += 1
+                    if changes is not None:
+                        changes.remove(os.path.relpath(path, root))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, results in zip(sources, executor.map(lambda path: compress_file(path, encoders, min_size), sources)):
+            for suffix, outcome, bytes_in, bytes_out in results:
+                rel_path = os.path.relpath(path + suffix, root)
+                if outcome == "compressed":
+                    stats.compressed += 1
+                    stats.bytes_in += bytes_in
+                    stats.bytes_out += bytes_out
+                    if changes is not None:
+                        changes.write(rel_path)
+                elif outcome == "removed":
+                    stats.removed += 1
+                    if changes is not None:
+                        changes.remove(rel_path)
+                elif outcome == "unchanged":
+                    stats.unchanged += 1
+                else:
+                    stats.skipped += 1
+    return stats
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class PageProfile:
+    # Timing spans for one page. Built inside whichever process rendered the
+    # page and sent back to the parent, so it only holds plain values.
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.spans = []
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.inline_hits = 0
+        self.inline_misses = 0
+        self.last = time.perf_counter()
+
+    def resume(self):
+        # Starts the next span now, for pages that waited between stages
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        # Closes the span running since the previous mark
+        now = time.perf_counter()
+        self.spans.append((stage, self.last, now - self.last))
+        self.last = now
+
+    def mark_split(self, stage, sub_stage, sub_seconds, first=False):
+        # Like mark, but the last sub_seconds of the span (the first, with
+        # first) go to sub_stage
+        now = time.perf_counter()
+        if first:
+            split = self.last + sub_seconds
+            self.spans.append((sub_stage, self.last, sub_seconds))
+            self.spans.append((stage, split, now - split))
+        else:
+            split = now - sub_seconds
+            self.spans.append((stage, self.last, split - self.last))
+            self.spans.append((sub_stage, split, sub_seconds))
+        self.last = now
+
+    def duration(self):
+        return sum(duration for _, _, duration in self.spans)
+
+    def __repr__(self):
+        return f"PageProfile({self.path}, {self.duration() * 1000:.2f} ms)"
+
+
+class TimedWriter:
+    # Wraps a file so time spent in write() can be told apart from the time
+    # spent producing the chunks being written.
+    def __init__(self, fp):
+        self.fp = fp
+        self.seconds = 0.0
+
+    def write(self, text):
+        start = time.perf_counter()
+        self.fp.write(text)
+        self.seconds += time.perf_counter() - start
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        start = time.perf_counter()
+        self.fp.flush()
+        self.seconds += time.perf_counter() - start
+
+
+class TimedReader:
+    # Wraps a file that is iterated line by line, so time spent reading it
+    # can be told apart from the time spent scanning the lines.
+    def __init__(self, fp):
+        self.lines = iter(fp)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self.lines)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+class BuildProfiler:
+    def __init__(self):
+        self.spans = []
+        self.pages = []
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((stage, start, time.perf_counter() - start, os.getpid(), None))
+
+    def add_page(self, page_profile):
+        self.pages.append(page_profile)
+        for stage, start, duration in page_profile.spans:
+            self.spans.append((stage, start, duration, page_profile.pid, page_profile.path))
+
+    def stage_totals(self):
+        totals = {}
+        for stage, _, duration, _, _ in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration
+        return totals
+
+    def summary(self, top=10):
+        elapsed = time.perf_counter() - self.start
+        totals = self.stage_totals()
+        lines = [f"Build profile: {elapsed * 1000:.1f} ms wall clock, {len(self.pages)} page(s) rendered"]
+        lines.append(f"  {'stage':<14} {'total ms':>12} {'share':>7}")
+        busy = sum(totals.values()) or 1.0
+        for stage, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {stage:<14} {seconds * 1000:12.2f} {seconds / busy:7.1%}")
+        bytes_read = sum(page.bytes_read for page in self.pages)
+        bytes_written = sum(page.bytes_written for page in self.pages)
+        lines.append(f"  bytes read: {bytes_read}, bytes written: {bytes_written}")
+        inline_hits = sum(page.inline_hits for page in self.pages)
+        inline_misses = sum(page.inline_misses for page in self.pages)
+        if inline_hits or inline_misses:
+            hit_rate = inline_hits / (inline_hits + inline_misses)
+            lines.append(f"  inline cache: {inline_hits} hits, {inline_misses} misses ({hit_rate:.1%} hit rate)")
+        if self.pages:
+            lines.append(f"  slowest {min(top, len(self.pages))} page(s):")
+            for page in sorted(self.pages, key=PageProfile.duration, reverse=True)[:top]:
+                lines.append(f"    {page.duration() * 1000:10.2f} ms  {page.path}")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace event format, viewable in chrome://tracing or Perfetto
+        events = []
+        for stage, start, duration, pid, page_path in self.spans:
+            event = {
+                "name": stage,
+                "ph": "X",
+                "ts": (start - self.start) * 1e6,
+                "dur": duration * 1e6,
+                "pid": pid,
+                "tid": pid,
+            }
+            if page_path is not None:
+                event["args"] = {"page": page_path}
+            events.append(event)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def profile_span(profiler, stage):
+    return profiler.span(stage) if profiler is not None else nullcontext()
@@ -0,0 +1,274 @@
+import argparse
+import os
+import sys
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from main import PUBLIC_DIR
+from fingerprint import is_fingerprinted
+from precompress import is_compressible
+
+# Serves public/ for production-like testing:
+#
+#   python3 src/serve.py --port 8888
+#
+# Requests run on their own threads over keep-alive connections, responses
+# carry ETag and Last-Modified for revalidation, Range requests get partial
+# content, and .br/.gz siblings written by --precompress are sent to clients
+# that accept them. Assets fingerprinted by --fingerprint may be cached
+# forever.
+
+# Files up to MAX_CACHED_FILE bytes are kept in memory, up to CACHE_SIZE
+# bytes in total, least recently used first out
+DEFAULT_CACHE_SIZE = 64 << 20
+MAX_CACHED_FILE = 1 << 20
+
+# Fingerprinted assets never change under their URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content encodings in order of preference, with the sibling suffix each one
+# is stored under
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class FileCache:
+    # Bounded LRU of file bodies, checked against the file's size and mtime
+    # on every lookup so an edited file is never served stale
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, stat):
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        if stat.st_size > MAX_CACHED_FILE or stat.st_size > self.max_size:
+            return None
+        with open(path, 'rb') as f:
+            body = f.read()
+        if len(body) != stat.st_size:
+            # Changed while reading; let the caller stream it instead
+            return None
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[path] = (key, body)
+            self.size += len(body)
+            while self.size > self.max_size:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return body
+
+
+def etag_for(stat, encoding=None):
+    tag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    if encoding is not None:
+        tag += f"-{encoding}"
+    return f'"{tag}"'
+
+
+def parse_range(header, size):
+    # Returns (start, end) for a single "bytes=" range, None when the header
+    # should be ignored, or "unsatisfiable"
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    # Plain digits only: int() would also take a sign, as in "bytes=--5"
+    if not all(part.isdigit() for part in (start, end) if part):
+        return None
+    try:
+        if start == "":
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length == 0 or size == 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class StaticHandler(SimpleHTTPRequestHandler):
+    # Reuses SimpleHTTPRequestHandler's path translation and content types;
+    # everything about the response itself is handled here
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, file_cache=None, **kwargs):
+        self.file_cache = file_cache
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.send_file(head=False)
+
+    def do_HEAD(self):
+        self.send_file(head=True)
+
+    def resolve(self):
+        # Returns the file to serve for the request path, or None after an
+        # error or redirect has already been sent
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            url_path = self.path.split('?', 1)[0].split('#', 1)[0]
+            if not url_path.endswith('/'):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", url_path + '/')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        return path
+
+    def choose_encoding(self, path, stat):
+        # A compressed sibling is only used while it carries its source's
+        # mtime, which is how precompress marks it as up to date
+        accepted = {
+            value.split(';', 1)[0].strip().lower()
+            for value in self.headers.get("Accept-Encoding", "").split(',')
+        }
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                sibling_stat = os.stat(path + suffix)
+            except OSError:
+                continue
+            if sibling_stat.st_mtime_ns == stat.st_mtime_ns:
+                return encoding, path + suffix, sibling_stat
+        return None, path, stat
+
+    def not_modified(self, etag, stat):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+    def send_file(self, head):
+        path = self.resolve()
+        if path is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        content_type = self.guess_type(path)
+        encoding, body_path, body_stat = self.choose_encoding(path, stat)
+        etag = etag_for(stat, encoding)
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        if self.not_modified(etag, stat):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            return
+
+        size = body_stat.st_size
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header is not None and (if_range is None or if_range in (etag, last_modified)):
+            byte_range = parse_range(range_header, size)
+            if byte_range == "unsatisfiable":
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                status = HTTPStatus.PARTIAL_CONTENT
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Accept-Ranges", "bytes")
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        if is_compressible(path):
+            self.send_header("Vary", "Accept-Encoding")
+        if is_fingerprinted(path):
+            self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head or size == 0:
+            return
+
+        body = self.file_cache.get(body_path, body_stat) if self.file_cache is not None else None
+        if body is not None:
+            self.wfile.write(body[start:end + 1])
+            return
+        # Large files go straight from the page cache to the socket
+        with open(body_path, 'rb') as f:
+            self.wfile.flush()
+            self.connection.sendfile(f, start, end - start + 1)
+
+
+def make_server(directory, port, bind="", cache_size=DEFAULT_CACHE_SIZE):
+    handler = partial(StaticHandler, directory=directory, file_cache=FileCache(cache_size))
+    server = ThreadingHTTPServer((bind, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the built site from public/")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--bind", default="", help="address to listen on (default: all interfaces)")
+    parser.add_argument("--directory", default=PUBLIC_DIR, help="directory to serve (default: public/)")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=f"bytes of hot files to keep in memory (default: {DEFAULT_CACHE_SIZE})",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = make_server(args.directory, args.port, args.bind, args.cache_size)
+    print(f"Serving {args.directory} on port {args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import json
+import os
+import re
+from datetime import date, datetime, timezone
+from xml.sax.saxutils import escape
+
+from build_manifest import load_versioned, save_versioned
+from inline_markdown import block_type_code, block_type_heading, blocks_description, heading_anchors, heading_text, plain_text
+from link_check import page_links
+from output_writer import AtomicOutput
+
+# Site-wide files written from the per-page records collected while
+# rendering: a sitemap, an Atom feed and an inverted search index
+SITEMAP_NAME = "sitemap.xml"
+FEED_NAME = "feed.xml"
+SEARCH_INDEX_NAME = "search-index.json"
+SITE_FILE_NAMES = (SITEMAP_NAME, FEED_NAME, SEARCH_INDEX_NAME)
+
+FEED_ENTRIES = 20
+
+word_pattern = re.compile(r"[^\W_]+")
+# Link and image targets are URLs, not words anyone searches for
+link_target_pattern = re.compile(r"\]\([^)]*\)")
+
+
+def search_terms(text):
+    # Term frequencies of the words in markdown text, without running the
+    # inline parser: markdown punctuation isn't part of any word anyway
+    terms = {}
+    for word in word_pattern.findall(link_target_pattern.sub("]", text).lower()):
+        if len(word) > 1:
+            terms[word] = terms.get(word, 0) + 1
+    return terms
+
+
+def updated_time(value, mtime, page_path):
+    # Atom timestamp from a front matter date (2024-05-01, or a full ISO
+    # date and time), falling back to the file's mtime
+    if value:
+        try:
+            if 'T' in value:
+                parsed = datetime.fromisoformat(value)
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            return f"{date.fromisoformat(value).isoformat()}T00:00:00Z"
+        except ValueError:
+            print(f"Warning: invalid date {value!r} on {page_path}, using the file's modification time")
+    return datetime.fromtimestamp(mtime, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def page_record(scanner, blocks, title, page_path, mtime):
+    # Everything the site files need from one page, as plain values so it
+    # can come back from a worker process and be stored between builds
+    headings = []
+    anchors = []
+    # A title from the front matter isn't in any block
+    terms = search_terms(title) if title != scanner.title else {}
+    for block, anchor in zip(blocks, heading_anchors(blocks)):
+        if block.block_type == block_type_code:
+            continue
+        if block.block_type == block_type_heading:
+            headings.append(plain_text(heading_text(block)))
+            if anchor is not None:
+                anchors.append(anchor)
+        for term, count in search_terms(block.text).items():
+            terms[term] = terms.get(term, 0) + count
+    updated = updated_time(scanner.front_matter.get("date"), mtime, page_path)
+    return {
+        "url": page_path,
+        "title": title,
+        "headings": headings,
+        "description": blocks_description(blocks),
+        "updated": updated,
+        "terms": terms,
+        "links": page_links(blocks),
+        "anchors": anchors,
+    }
+
+
+class PageRecords:
+    # Records of every page, keyed by content path and kept between builds
+    # so an incremental build only re-collects the pages it renders
+    def __init__(self, path, pages=None):
+        self.path = path
+        self.pages = pages if pages is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(path, load_versioned(path, "pages"))
+
+    def save(self):
+        save_versioned(self.path, "pages", self.pages, indent=None, separators=(',', ':'))
+
+    def record(self, rel_path, page_record):
+        self.pages[rel_path] = page_record
+
+    def remove_stale(self, seen):
+        for rel_path in [rel_path for rel_path in self.pages if rel_path not in seen]:
+            del self.pages[rel_path]
+
+    def sorted_records(self):
+        return sorted(self.pages.values(), key=lambda page: page["url"])
+
+    def __repr__(self):
+        return f"PageRecords({self.path}, pages: {len(self.pages)})"
+
+
+def write_sitemap(output, records, base_url):
+    output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    output.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for page in records:
+        output.write(f"  <url><loc>{escape(base_url + page['url'])}</loc><lastmod>{page['updated'][:10]}</lastmod></url>\n")
+    output.write("</urlset>\n")
+
+
+def write_feed(output, records, base_url, title):
+    # The most recently updated pages, newest first
+    entries = sorted(records, key=lambda page: page["updated"], reverse=True)[:FEED_ENTRIES]
+    updated = entries[0]["updated"] if entries else "1970-01-01T00:00:00Z"
+    output.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    output.write('<feed xmlns="http://www.w3.org/2005/Atom">\n')
+    output.write(f"  <title>{escape(title)}</title>\n")
+    output.write(f'  <link href="{escape(base_url)}/"/>\n')
+    output.write(f'  <link rel="self" href="{escape(base_url)}/{FEED_NAME}"/>\n')
+    output.write(f"  <id>{escape(base_url)}/</id>\n")
+    output.write(f"  <updated>{updated}</updated>\n")
+    for page in entries:
+        url = escape(base_url + page["url"])
+        output.write("  <entry>\n")
+        output.write(f"    <title>{escape(page['title'])}</title>\n")
+        output.write(f'    <link href="{url}"/>\n')
+        output.write(f"    <id>{url}</id>\n")
+        output.write(f"    <updated>{page['updated']}</updated>\n")
+        if page["description"]:
+            output.write(f"    <summary>{escape(page['description'])}</summary>\n")
+        output.write("  </entry>\n")
+    output.write("</feed>\n")
+
+
+def write_search_index(output, records):
+    # {"pages": [[url, title, [headings]], ...], "terms": {term: [page, count, page, count, ...]}}
+    # Pages are numbered by their position in "pages", and the postings of
+    # each term are flattened pairs to keep the file small
+    postings = {}
+    output.write('{"pages":[')
+    for number, page in enumerate(records):
+        if number:
+            output.write(',')
+        output.write(json.dumps([page["url"], page["title"], page["headings"]], separators=(',', ':')))
+        for term, count in page["terms"].items():
+            postings.setdefault(term, []).extend((number, count))
+    output.write('],"terms":{')
+    for number, term in enumerate(sorted(postings)):
+        if number:
+            output.write(',')
+        output.write(f"{json.dumps(term)}:{json.dumps(postings[term], separators=(',', ':'))}")
+    output.write('}}\n')
+
+
+def write_site_files(public_dir, records, base_url, title, changes=None):
+    # Streams each file through an AtomicOutput, so a file whose content
+    # didn't change keeps its mtime. Returns the names written.
+    base_url = base_url.rstrip('/')
+    pages = records.sorted_records()
+    written = []
+    for name, write in (
+        (SITEMAP_NAME, lambda output: write_sitemap(output, pages, base_url)),
+        (FEED_NAME, lambda output: write_feed(output, pages, base_url, title)),
+        (SEARCH_INDEX_NAME, lambda output: write_search_index(output, pages)),
+    ):
+        output = AtomicOutput(os.path.join(public_dir, name))
+        try:
+            write(output)
+        except BaseException:
+            output.abort()
+            raise
+        if output.commit():
+            written.append(name)
+            if changes is not None:
+                changes.write(name)
+    return written
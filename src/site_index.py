@@ -0,0 +1,81 @@
+import itertools
+import os
+
+from build_manifest import hash_file, load_versioned, save_versioned
+from inline_markdown import BlockScanner
+from page_generator import page_url
+
+# How far into a file the metadata pass looks for front matter and the
+# first h1 before giving up on finding a title
+HEAD_LINES = 200
+
+
+def read_metadata(path):
+    # Reads only the head of a markdown file: the front matter and the
+    # lines up to the first h1. Returns (title, front matter).
+    scanner = BlockScanner()
+    with open(path, 'r') as f:
+        for _ in scanner.scan(itertools.islice(f, HEAD_LINES)):
+            if scanner.title is not None:
+                break
+    return scanner.front_matter.get("title") or scanner.title, scanner.front_matter
+
+
+class SiteIndex:
+    # Title, URL, mtime and content hash of every page, kept between builds
+    # so listings, sitemaps and search can be produced without rendering
+    # anything. A page is only re-read when its size or mtime changes.
+    def __init__(self, path, pages=None):
+        self.path = path
+        self.pages = pages if pages is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(path, load_versioned(path, "pages"))
+
+    def save(self):
+        save_versioned(self.path, "pages", self.pages)
+
+    def update(self, content_dir):
+        # Brings the index in line with content_dir and returns how many
+        # entries were added, refreshed or removed
+        seen = set()
+        updated = 0
+        for root, _, files in os.walk(content_dir):
+            for file in files:
+                if not file.endswith('.md'):
+                    continue
+                md_path = os.path.join(root, file)
+                rel_path = os.path.relpath(md_path, content_dir).replace(os.sep, '/')
+                seen.add(rel_path)
+                stat = os.stat(md_path)
+                entry = self.pages.get(rel_path)
+                if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    continue
+                self.pages[rel_path] = self.read_entry(md_path, rel_path, stat)
+                updated += 1
+        for rel_path in [rel_path for rel_path in self.pages if rel_path not in seen]:
+            del self.pages[rel_path]
+            updated += 1
+        return updated
+
+    def read_entry(self, md_path, rel_path, stat):
+        # stat is taken before the file is read, so a write that lands in
+        # between shows up as a changed mtime on the next update
+        title, front_matter = read_metadata(md_path)
+        return {
+            "title": title if title is not None else "Untitled",
+            "url": page_url(rel_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hash_file(md_path),
+            "front_matter": front_matter,
+        }
+
+    def entries(self, prefix=""):
+        # (rel_path, entry) pairs under a content directory prefix, in path
+        # order, e.g. entries("blog/") for a blog listing
+        return [(rel_path, self.pages[rel_path]) for rel_path in sorted(self.pages) if rel_path.startswith(prefix)]
+
+    def __repr__(self):
+        return f"SiteIndex({self.path}, pages: {len(self.pages)})"
@@ -0,0 +1,182 @@
+import os
+import shutil
+
+from build_manifest import hash_file, load_versioned, save_versioned
+
+
+class SyncStats:
+    def __init__(self):
+        self.copied = 0
+        self.linked = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_copied = 0
+
+    def summary(self):
+        return (
+            f"{self.copied} copied, {self.linked} linked, {self.unchanged} unchanged, "
+            f"{self.removed} removed ({self.bytes_copied} bytes copied)"
+        )
+
+    def __repr__(self):
+        return f"SyncStats({self.summary()})"
+
+
+def load_state(path):
+    if path is None:
+        return {}
+    return load_versioned(path, "files")
+
+
+def save_state(state, path):
+    save_versioned(path, "files", state, indent=None)
+
+
+def walk_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, root), path
+
+
+def cached_hash(path, stat, entry):
+    # The state records the hash of each source file along with the size and
+    # mtime it had; a synced copy carries the same mtime, so it can reuse it.
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns and entry.get("hash"):
+        return entry["hash"]
+    return hash_file(path)
+
+
+def copy_file(source, destination):
+    # copy_file_range lets the kernel copy (or reflink, on filesystems that
+    # share extents) without bouncing the data through userspace.
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            except OSError:
+                remaining = -1
+            if remaining == 0:
+                return
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+def transfer(source, destination, link=False):
+    # The old file is unlinked first so that a previous hardlink never lets
+    # a write reach back into the source tree.
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.lexists(destination):
+        os.remove(destination)
+    if link:
+        try:
+            os.link(source, destination)
+            return "linked"
+        except OSError:
+            pass
+    copy_file(source, destination)
+    shutil.copystat(source, destination)
+    return "copied"
+
+
+def sync_minified(minifier, source_path, source_stat, destination_path, entry):
+    # Minified files can't be compared with their source, so the state
+    # records the size of the copy written; a copy with that size and the
+    # source's mtime is current. Returns (hash, output size, written).
+    same_source = entry and entry["size"] == source_stat.st_size and entry["mtime_ns"] == source_stat.st_mtime_ns
+    if same_source and entry.get("minified") == minifier.version:
+        try:
+            destination_stat = os.stat(destination_path)
+        except FileNotFoundError:
+            destination_stat = None
+        if (
+            destination_stat is not None
+            and destination_stat.st_size == entry["output_size"]
+            and destination_stat.st_mtime_ns == source_stat.st_mtime_ns
+        ):
+            return entry.get("hash"), entry["output_size"], False
+    source_hash = cached_hash(source_path, source_stat, entry)
+    return source_hash, minifier.install(source_path, source_hash, destination_path, source_stat.st_mtime_ns), True
+
+
+def sync_directory(source, destination, state_path=None, checksum=False, link=False, changes=None, minifier=None):
+    # Mirrors source into destination, touching only files whose size or
+    # mtime (or, with checksum, content) differ, and removing files that were
+    # synced before but are gone from source. Other files in destination,
+    # such as generated pages, are left alone. A ChangeList, if given,
+    # collects the paths copied, linked or removed. With a MinifyCache, the
+    # files it handles are written minified instead of copied.
+    old_state = load_state(state_path)
+    state = {}
+    stats = SyncStats()
+    for rel_path, source_path in walk_files(source):
+        source_stat = os.stat(source_path)
+        destination_path = os.path.join(destination, rel_path)
+        entry = old_state.get(rel_path)
+        if minifier is not None and minifier.handles(rel_path):
+            source_hash, output_size, written = sync_minified(minifier, source_path, source_stat, destination_path, entry)
+            if written:
+                stats.copied += 1
+                stats.bytes_copied += output_size
+                if changes is not None:
+                    changes.write(rel_path)
+            else:
+                stats.unchanged += 1
+            minifier.stats.add(os.path.splitext(rel_path)[1], source_stat.st_size, output_size)
+            state[rel_path] = {
+                "size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns, "hash": source_hash,
+                "minified": minifier.version, "output_size": output_size,
+            }
+            continue
+        if checksum:
+            source_hash = cached_hash(source_path, source_stat, entry)
+        elif entry and entry["size"] == source_stat.st_size and entry["mtime_ns"] == source_stat.st_mtime_ns:
+            source_hash = entry.get("hash")
+        else:
+            source_hash = None
+        try:
+            destination_stat = os.stat(destination_path)
+        except FileNotFoundError:
+            destination_stat = None
+
+        if destination_stat is None or destination_stat.st_size != source_stat.st_size:
+            unchanged = False
+        elif checksum:
+            unchanged = cached_hash(destination_path, destination_stat, entry) == source_hash
+            if unchanged and destination_stat.st_mtime_ns != source_stat.st_mtime_ns:
+                # Same content, so just bring the mtime in line
+                os.utime(destination_path, ns=(destination_stat.st_atime_ns, source_stat.st_mtime_ns))
+        else:
+            unchanged = destination_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+        if unchanged:
+            stats.unchanged += 1
+        else:
+            if transfer(source_path, destination_path, link) == "linked":
+                stats.linked += 1
+            else:
+                stats.copied += 1
+                stats.bytes_copied += source_stat.st_size
+            if changes is not None:
+                changes.write(rel_path)
+        state[rel_path] = {"size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns, "hash": source_hash}
+
+    for rel_path in old_state:
+        if rel_path not in state:
+            stale_path = os.path.join(destination, rel_path)
+            if os.path.lexists(stale_path):
+                os.remove(stale_path)
+                stats.removed += 1
+                if changes is not None:
+                    changes.remove(rel_path)
+
+    if state_path is not None:
+        save_state(state, state_path)
+    return stats
@@ -0,0 +1,57 @@
+import io
+import os
+import re
+
+placeholder_pattern = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Compiled templates keyed by path, reused until the file changes on disk
+template_cache = {}
+
+
+class Template:
+    def __init__(self, source):
+        # The source is split once into literal segments with a named slot
+        # between each pair, so rendering is a single walk over the pieces.
+        self.segments = []
+        self.slots = []
+        position = 0
+        for match in placeholder_pattern.finditer(source):
+            self.segments.append(source[position:match.start()])
+            self.slots.append((match.group(1), match.group(0)))
+            position = match.end()
+        self.segments.append(source[position:])
+        self.names = {name for name, _ in self.slots}
+
+    def write(self, fp, values):
+        # Values with a write_html method (HTML nodes) are streamed into fp;
+        # placeholders without a value are left in the output untouched.
+        fp.write(self.segments[0])
+        for (name, raw), segment in zip(self.slots, self.segments[1:]):
+            value = values.get(name)
+            if value is None:
+                fp.write(raw)
+            elif hasattr(value, "write_html"):
+                value.write_html(fp)
+            else:
+                fp.write(value)
+            fp.write(segment)
+
+    def render(self, values):
+        buffer = io.StringIO()
+        self.write(buffer, values)
+        return buffer.getvalue()
+
+    def __repr__(self):
+        return f"Template(slots: {[name for name, _ in self.slots]})"
+
+
+def load_template(path):
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = template_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'r') as f:
+        template = Template(f.read())
+    template_cache[path] = (key, template)
+    return template
@@ -0,0 +1,27 @@
+import unittest
+
+from bench_corpus import CORPUS_SHAPES, generate_corpus
+from inline_markdown import markdown_to_html_node
+
+
+class TestBenchCorpus(unittest.TestCase):
+    def test_same_seed_same_corpus(self):
+        for shape in CORPUS_SHAPES:
+            self.assertEqual(list(generate_corpus(shape, 3, seed=7)), list(generate_corpus(shape, 3, seed=7)))
+
+    def test_different_seed_different_corpus(self):
+        self.assertNotEqual(list(generate_corpus("small-pages", 3, seed=1)), list(generate_corpus("small-pages", 3, seed=2)))
+
+    def test_every_shape_renders(self):
+        for shape in CORPUS_SHAPES:
+            for rel_path, markdown in generate_corpus(shape, 2):
+                self.assertTrue(rel_path.endswith(".md"))
+                self.assertTrue(markdown_to_html_node(markdown).to_html().startswith("<div><h1 id="))
+
+    def test_unknown_shape(self):
+        with self.assertRaises(ValueError):
+            list(generate_corpus("tiny", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
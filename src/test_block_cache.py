@@ -0,0 +1,66 @@
+import os
+import unittest
+
+from block_cache import BlockCache
+from inline_markdown import markdown_to_html_node
+from test_helpers import TempDirTestCase
+
+MARKDOWN = """# Title
+
+A paragraph with **bold** and a [link](/somewhere).
+
+* one
+* two
+
+```
+code
+```
+
+> quoted"""
+
+
+class TestBlockCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, "cache", "blocks.sqlite")
+
+    def test_cached_render_matches_uncached(self):
+        cache = BlockCache(self.path)
+        expected = markdown_to_html_node(MARKDOWN).to_html()
+        self.assertEqual(markdown_to_html_node(MARKDOWN, cache).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 5))
+        self.assertEqual(markdown_to_html_node(MARKDOWN, cache).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (5, 5))
+        cache.close()
+
+    def test_fragments_persist_across_connections(self):
+        cache = BlockCache(self.path)
+        markdown_to_html_node(MARKDOWN, cache)
+        cache.close()
+
+        cache = BlockCache(self.path)
+        edited = MARKDOWN.replace("* two", "* three")
+        html = markdown_to_html_node(edited, cache).to_html()
+        self.assertEqual(html, markdown_to_html_node(edited).to_html())
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+        cache.close()
+
+    def test_repeated_block_in_one_page_renders_once(self):
+        cache = BlockCache(self.path)
+        markdown_to_html_node("Footer text\n\nBody\n\nFooter text", cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.close()
+
+
+    def test_repeated_headings_keep_their_own_ids(self):
+        cache = BlockCache(self.path)
+        markdown = "## Usage\n\nOne\n\n## Usage"
+        html = markdown_to_html_node(markdown, cache).to_html()
+        self.assertEqual(html, '<div><h2 id="usage">Usage</h2><p>One</p><h2 id="usage-1">Usage</h2></div>')
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+        self.assertEqual(markdown_to_html_node("## Usage", cache).to_html(), '<div><h2 id="usage">Usage</h2></div>')
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from build_manifest import BuildManifest, hash_file, load_versioned, save_versioned
+from page_generator import generate_pages_recursive
+from test_helpers import TEMPLATE, TempDirTestCase, write_file
+
+
+class TestBuildManifest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.public_dir = os.path.join(root, "public")
+        self.template_path = os.path.join(root, "template.html")
+        self.manifest_path = os.path.join(root, ".build_cache", "manifest.json")
+        write_file(self.template_path, TEMPLATE)
+        write_file(os.path.join(self.content_dir, "index.md"), "# Home\n\nHello")
+        write_file(os.path.join(self.content_dir, "blog", "post.md"), "# Post\n\nWords")
+
+    def build(self):
+        manifest = BuildManifest.load(self.manifest_path)
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, manifest)
+        return BuildManifest.load(self.manifest_path)
+
+    def test_records_every_page(self):
+        manifest = self.build()
+        self.assertEqual(sorted(manifest.pages), [os.path.join("blog", "post.md"), "index.md"])
+        entry = manifest.pages["index.md"]
+        self.assertEqual(entry["output"], "index.html")
+        self.assertEqual(entry["source_hash"], hash_file(os.path.join(self.content_dir, "index.md")))
+        self.assertEqual(entry["template_hash"], hash_file(self.template_path))
+
+    def test_skips_unchanged_pages(self):
+        self.build()
+        index_html = os.path.join(self.public_dir, "index.html")
+        os.utime(index_html, (0, 0))
+        self.build()
+        self.assertEqual(os.path.getmtime(index_html), 0)
+
+    def test_rebuilds_changed_source(self):
+        self.build()
+        write_file(os.path.join(self.content_dir, "index.md"), "# Home\n\nChanged")
+        self.build()
+        with open(os.path.join(self.public_dir, "index.html")) as f:
+            self.assertIn("Changed", f.read())
+
+    def test_rebuilds_everything_when_template_changes(self):
+        self.build()
+        write_file(self.template_path, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.build()
+        with open(os.path.join(self.public_dir, "blog", "post.html")) as f:
+            self.assertTrue(f.read().startswith("<h1>Post</h1>"))
+
+    def test_removes_outputs_of_deleted_sources(self):
+        self.build()
+        os.remove(os.path.join(self.content_dir, "blog", "post.md"))
+        manifest = self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "blog", "post.html")))
+        self.assertEqual(list(manifest.pages), ["index.md"])
+
+    def test_load_ignores_other_generator_versions(self):
+        os.makedirs(os.path.dirname(self.manifest_path))
+        write_file(self.manifest_path, '{"version": "0", "pages": {"index.md": {}}}')
+        self.assertEqual(BuildManifest.load(self.manifest_path).pages, {})
+
+    def test_versioned_state_round_trips(self):
+        state_path = os.path.join(self.tmp.name, ".build_cache", "state.json")
+        self.assertEqual(load_versioned(state_path, "files"), {})
+        save_versioned(state_path, "files", {"a.css": "1234"})
+        self.assertEqual(load_versioned(state_path, "files"), {"a.css": "1234"})
+        self.assertEqual(load_versioned(state_path, "pages"), {})
+        self.assertFalse(os.path.exists(state_path + ".tmp"))
+        write_file(state_path, "[]")
+        self.assertEqual(load_versioned(state_path, "files"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import unittest
+
+from build_manifest import BuildManifest
+from fingerprint import AssetUrls, fingerprint_directory, fingerprint_name, is_fingerprinted
+from output_writer import ChangeList
+from page_generator import RenderOptions, generate_pages_recursive
+from static_sync import load_state
+from test_helpers import TempDirTestCase, write_file
+
+TEMPLATE = '<link href="/site.css" rel="stylesheet"><title>{{ Title }}</title><body>{{ Content }}</body>'
+
+
+class TestFingerprint(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        self.state_path = os.path.join(root, "cache", "assets.json")
+        self.write("site.css", "body { color: black }")
+        self.write(os.path.join("images", "logo.png"), "png bytes")
+        self.write("404.html", "<p>Not found</p>")
+        self.write(".DS_Store", "finder")
+        self.write(os.path.join(".well-known", "security.txt"), "contact")
+        self.write("CNAME", "example.com")
+
+    def write(self, rel_path, text, mtime=None):
+        write_file(os.path.join(self.static_dir, rel_path), text, mtime)
+
+    def outputs(self):
+        return {rel_path: entry["output"] for rel_path, entry in load_state(self.state_path).items()}
+
+    def test_fingerprint_name(self):
+        self.assertEqual(fingerprint_name("css/site.css", "0123456789abcdef"), "css/site.0123456789.css")
+        self.assertTrue(is_fingerprinted("css/site.0123456789.css"))
+        self.assertFalse(is_fingerprinted("css/site.css"))
+
+    def test_copies_and_stale_versions(self):
+        changes = ChangeList()
+        stats = fingerprint_directory(self.static_dir, self.public_dir, self.state_path, changes)
+        outputs = self.outputs()
+        self.assertEqual(sorted(outputs), ["images/logo.png", "site.css"])
+        self.assertEqual(changes.written, set(outputs.values()))
+        self.assertEqual(stats.written, 2)
+        with open(os.path.join(self.public_dir, outputs["site.css"])) as f:
+            self.assertEqual(f.read(), "body { color: black }")
+
+        stats = fingerprint_directory(self.static_dir, self.public_dir, self.state_path)
+        self.assertEqual((stats.written, stats.unchanged), (0, 2))
+
+        self.write("site.css", "body { color: white }")
+        changes = ChangeList()
+        stats = fingerprint_directory(self.static_dir, self.public_dir, self.state_path, changes)
+        self.assertEqual((stats.written, stats.removed), (1, 1))
+        self.assertEqual(changes.removed, {outputs["site.css"]})
+        self.assertNotEqual(self.outputs()["site.css"], outputs["site.css"])
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, outputs["site.css"])))
+
+    def test_hashes_are_cached_by_size_and_mtime(self):
+        fingerprint_directory(self.static_dir, self.public_dir, self.state_path)
+        outputs = self.outputs()
+        # Same size and mtime as recorded, so the stale hash is trusted
+        state = load_state(self.state_path)
+        self.write("site.css", "body { color: white }", mtime=state["site.css"]["mtime_ns"])
+        fingerprint_directory(self.static_dir, self.public_dir, self.state_path)
+        self.assertEqual(self.outputs()["site.css"], outputs["site.css"])
+
+    def test_rewrite(self):
+        asset_urls = AssetUrls({
+            "site.css": {"output": "site.0123456789.css"},
+            "images/logo.png": {"output": "images/logo.abcdef0123.png"},
+        })
+        html = (
+            '<link href="/site.css?v=1" rel="stylesheet"><a href="../images/logo.png#top">logo</a>'
+            '<img src="images/logo.png" srcset="/images/logo.png 2x, /images/small.png 1x" alt="">'
+            '<a href="https://example.com/site.css">elsewhere</a><a href="/missing.css">missing</a>'
+        )
+        self.assertEqual(
+            asset_urls.rewrite(html, "/blog/"),
+            '<link href="/site.0123456789.css?v=1" rel="stylesheet"><a href="../images/logo.abcdef0123.png#top">logo</a>'
+            '<img src="images/logo.png" srcset="/images/logo.abcdef0123.png 2x, /images/small.png 1x" alt="">'
+            '<a href="https://example.com/site.css">elsewhere</a><a href="/missing.css">missing</a>',
+        )
+
+    def test_pages_point_at_fingerprinted_assets(self):
+        content_dir = os.path.join(self.tmp.name, "content")
+        template_path = os.path.join(self.tmp.name, "template.html")
+        manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+        write_file(template_path, TEMPLATE)
+        write_file(os.path.join(content_dir, "index.md"), "# Home\n\n![Logo](/images/logo.png)")
+
+        def build():
+            fingerprint_directory(self.static_dir, self.public_dir, self.state_path)
+            changes = ChangeList()
+            generate_pages_recursive(
+                content_dir, template_path, self.public_dir, BuildManifest.load(manifest_path), changes=changes,
+                options=RenderOptions(asset_state_path=self.state_path),
+            )
+            with open(os.path.join(self.public_dir, "index.html")) as f:
+                return changes.written, f.read()
+
+        written, page = build()
+        outputs = self.outputs()
+        self.assertIn(f'<link href="/{outputs["site.css"]}"', page)
+        self.assertIn(f'<img src="/{outputs["images/logo.png"]}"', page)
+        self.assertEqual(build()[0], set())
+        self.write("site.css", "body { color: white }")
+        written, page = build()
+        self.assertEqual(written, {"index.html"})
+        self.assertIn(f'<link href="/{self.outputs()["site.css"]}"', page)
+
+    def test_only_pages_using_a_changed_asset_are_rebuilt(self):
+        content_dir = os.path.join(self.tmp.name, "content")
+        template_path = os.path.join(self.tmp.name, "template.html")
+        manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+        write_file(template_path, "<title>{{ Title }}</title><body>{{ Content }}</body>")
+        write_file(os.path.join(content_dir, "index.md"), "# Home\n\n![Logo](/images/logo.png)")
+        write_file(os.path.join(content_dir, "blog", "index.md"), "# Blog\n\nSee [the new styles](../new.css)")
+
+        def build():
+            fingerprint_directory(self.static_dir, self.public_dir, self.state_path)
+            changes = ChangeList()
+            generate_pages_recursive(
+                content_dir, template_path, self.public_dir, BuildManifest.load(manifest_path), changes=changes,
+                options=RenderOptions(asset_state_path=self.state_path),
+            )
+            return changes.written - set(self.outputs().values())
+
+        self.assertEqual(build(), {"index.html", os.path.join("blog", "index.html")})
+        self.write("site.css", "body { color: white }")
+        self.assertEqual(build(), set())
+        self.write(os.path.join("images", "logo.png"), "new png bytes")
+        self.assertEqual(build(), {"index.html"})
+        # A link to an asset that didn't exist yet is rewritten once it does
+        self.write("new.css", "p { margin: 0 }")
+        self.assertEqual(build(), {os.path.join("blog", "index.html")})
+        with open(os.path.join(self.public_dir, "blog", "index.html")) as f:
+            self.assertIn(f'href="../{self.outputs()["new.css"]}"', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+# Fixtures shared by the tests that build pages or copy files on disk
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+
+def write_file(path, data, mtime_ns=None):
+    # Writes text or bytes to path, creating its directory first, and
+    # returns the path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def read_tree(root):
+    # Contents of every file under root, by path relative to it
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+class TempDirTestCase(unittest.TestCase):
+    # Gives every test a fresh temporary directory, self.tmp
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
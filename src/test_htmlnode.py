@@ -1,3 +1,4 @@
+import io
 import unittest
 from htmlnode import LeafNode, ParentNode, HTMLNode
 
@@ -101,6 +102,41 @@ class TestHTMLNode(unittest.TestCase):
             "<h2><b>Bold text</b>Normal text<i>italic text</i>Normal text</h2>",
         )
 
+    def test_write_html_streams_same_output(self):
+        node = ParentNode(
+            "ul",
+            [ParentNode("li", [LeafNode(None, f"item {i}"), LeafNode("b", "!")]) for i in range(50)],
+            {"class": "list"},
+        )
+        buffer = io.StringIO()
+        node.write_html(buffer)
+        self.assertEqual(buffer.getvalue(), node.to_html())
+        self.assertEqual("".join(node.iter_html()), node.to_html())
+
+    def test_iter_html_yields_chunks(self):
+        node = HTMLNode("div", None, [HTMLNode("p", "one"), HTMLNode(None, "two")])
+        self.assertEqual(list(node.iter_html()), ["<div>", "<p>one</p>", "two", "</div>"])
+
+    def test_write_html_invalid_leaf(self):
+        node = ParentNode("div", [LeafNode("b", None)])
+        with self.assertRaises(ValueError):
+            node.write_html(io.StringIO())
+
+    def test_nodes_have_no_instance_dict(self):
+        for node in (HTMLNode("p", "x"), LeafNode("b", "x"), ParentNode("div", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_empty_children_and_props_are_shared(self):
+        first = LeafNode(None, "one")
+        second = HTMLNode("p", "two")
+        self.assertIs(first.children, second.children)
+        self.assertIs(first.props, second.props)
+        with self.assertRaises(TypeError):
+            first.children.append(second)
+        with self.assertRaises(TypeError):
+            first.props["class"] = "x"
+        self.assertEqual(HTMLNode("p").props, {})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+import os
+import struct
+import unittest
+import zlib
+
+from build_manifest import BuildManifest
+from images import Image, ImageAttributes, load_images, process_directory, read_dimensions
+from output_writer import ChangeList
+from page_generator import RenderOptions, generate_pages_recursive
+from test_helpers import TEMPLATE, TempDirTestCase, write_file
+
+
+def png(width, height):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\x80\x40\x20" * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def jpeg_header(width, height):
+    # SOI, an APP0 segment to skip over, then a baseline frame header
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+class TestImages(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        self.cache_dir = os.path.join(root, "cache", "images")
+        self.state_path = os.path.join(root, "cache", "images.json")
+        self.write(os.path.join("images", "wide.png"), png(1200, 600))
+        self.write("photo.jpg", jpeg_header(640, 480))
+        self.write("notes.txt", b"not an image")
+
+    def write(self, rel_path, data):
+        return write_file(os.path.join(self.static_dir, rel_path), data)
+
+    def test_read_dimensions(self):
+        self.assertEqual(read_dimensions(os.path.join(self.static_dir, "images", "wide.png")), (1200, 600))
+        self.assertEqual(read_dimensions(os.path.join(self.static_dir, "photo.jpg")), (640, 480))
+        gif = self.write("anim.gif", b"GIF89a" + struct.pack("<HH", 32, 16) + b"\x00" * 20)
+        self.assertEqual(read_dimensions(gif), (32, 16))
+        webp = self.write("lossy.webp", b"RIFF\x00\x00\x00\x00WEBPVP8X" + b"\x00" * 8 + (99).to_bytes(3, "little") + (49).to_bytes(3, "little"))
+        self.assertEqual(read_dimensions(webp), (100, 50))
+        self.assertIsNone(read_dimensions(os.path.join(self.static_dir, "notes.txt")))
+        self.assertIsNone(read_dimensions(self.write("cut.jpg", b"\xff\xd8\xff\xc0\x00")))
+
+    def test_unchanged_images_are_not_processed_again(self):
+        stats = process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir)
+        self.assertEqual((stats.processed, stats.unchanged), (2, 0))
+        images = load_images(self.state_path)
+        self.assertEqual(sorted(images), ["images/wide.png", "photo.jpg"])
+        self.assertEqual((images["photo.jpg"]["width"], images["photo.jpg"]["height"]), (640, 480))
+
+        stats = process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir)
+        self.assertEqual((stats.processed, stats.unchanged), (0, 2))
+
+        # Rewriting a file with the same content only costs a hash
+        path = self.write("photo.jpg", jpeg_header(640, 480))
+        os.utime(path, ns=(1, 1))
+        stats = process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir)
+        self.assertEqual((stats.processed, stats.unchanged), (0, 2))
+        self.write("photo.jpg", jpeg_header(320, 240))
+        stats = process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir)
+        self.assertEqual((stats.processed, stats.unchanged), (1, 1))
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_variants(self):
+        changes = ChangeList()
+        stats = process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir, [300, 800, 2000], changes=changes)
+        self.assertEqual(stats.variants, 2)
+        self.assertEqual(changes.written, {"images/wide-300w.png", "images/wide-800w.png"})
+        self.assertEqual(read_dimensions(os.path.join(self.public_dir, "images", "wide-300w.png")), (300, 150))
+
+        changes = ChangeList()
+        process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir, [300], changes=changes)
+        self.assertEqual((changes.written, changes.removed), (set(), {"images/wide-800w.png"}))
+
+    def test_rewrite(self):
+        attributes = ImageAttributes({
+            "images/wide.png": {"width": 1200, "height": 600, "variants": [[480, 240], [960, 480]]},
+            "photo.jpg": {"width": 640, "height": 480, "variants": []},
+        })
+        html = '<p><img src="/images/wide.png" alt="a"></img> <img src="../photo.jpg" alt="b"></img></p>'
+        self.assertEqual(
+            attributes.rewrite(html, "/blog/post.html"),
+            '<p><img src="/images/wide.png" width="1200" height="600" '
+            'srcset="/images/wide-480w.png 480w, /images/wide-960w.png 960w, /images/wide.png 1200w" alt="a"></img> '
+            '<img src="../photo.jpg" width="640" height="480" alt="b"></img></p>',
+        )
+        untouched = '<img src="https://example.com/photo.jpg" alt=""></img><img src="/missing.png" alt=""></img>'
+        self.assertEqual(attributes.rewrite(untouched, "/"), untouched)
+
+    def test_pages_are_rebuilt_when_an_image_changes(self):
+        content_dir = os.path.join(self.tmp.name, "content")
+        template_path = os.path.join(self.tmp.name, "template.html")
+        manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+        write_file(template_path, TEMPLATE)
+        write_file(os.path.join(content_dir, "index.md"), "# Home\n\n![A photo](photo.jpg)")
+        write_file(os.path.join(content_dir, "about.md"), "# About\n\n![Another photo](other.jpg)")
+
+        def build():
+            process_directory(self.static_dir, self.public_dir, self.state_path, self.cache_dir)
+            changes = ChangeList()
+            generate_pages_recursive(
+                content_dir, template_path, self.public_dir, BuildManifest.load(manifest_path), changes=changes,
+                options=RenderOptions(image_state_path=self.state_path),
+            )
+            with open(os.path.join(self.public_dir, "index.html")) as f:
+                return changes.written, f.read()
+
+        written, page = build()
+        self.assertEqual(written, {"index.html", "about.html"})
+        self.assertIn('<img src="photo.jpg" width="640" height="480" alt="A photo">', page)
+        self.assertEqual(build()[0], set())
+        self.write("photo.jpg", jpeg_header(800, 600))
+        written, page = build()
+        self.assertEqual(written, {"index.html"})
+        self.assertIn('width="800" height="600"', page)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import unittest
+
+from inline_cache import InlineCache, MAX_MEMO_TEXT, open_inline_caches
+from inline_markdown import markdown_to_html_node, text_to_children
+from page_generator import RenderOptions, generate_pages_recursive
+from test_helpers import TempDirTestCase, write_file
+
+MARKDOWN = """# Title
+
+* [Home](/)
+* [Blog](/blog/) with **bold**
+* [Home](/)
+
+## Title
+
+A paragraph with *italic* and `code`."""
+
+
+class TestInlineCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, "cache", "inline.sqlite")
+
+    def test_cached_render_matches_uncached(self):
+        cache = InlineCache(self.path)
+        expected = markdown_to_html_node(MARKDOWN).to_html()
+        self.assertEqual(markdown_to_html_node(MARKDOWN, inline_cache=cache).to_html(), expected)
+        # "[Home](/)" and "Title" repeat within the page, so they are memoized
+        # the second time; the rest only the second time the page renders
+        self.assertEqual((cache.hits, cache.misses), (0, 6))
+        self.assertEqual(sorted(cache.entries), ["Title", "[Home](/)"])
+        self.assertEqual(markdown_to_html_node(MARKDOWN, inline_cache=cache).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (4, 8))
+        self.assertEqual(markdown_to_html_node(MARKDOWN, inline_cache=cache).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (10, 8))
+        cache.close()
+
+    def test_entries_persist_across_connections(self):
+        cache = InlineCache(self.path)
+        markdown_to_html_node(MARKDOWN, inline_cache=cache)
+        cache.close()
+
+        cache = InlineCache(self.path)
+        self.assertEqual(len(cache.entries), 2)
+        markdown_to_html_node(MARKDOWN, inline_cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (4, 2))
+        cache.close()
+
+    def test_preload_keeps_most_used_entries(self):
+        cache = InlineCache(self.path)
+        for text in ["a", "b", "b", "c", "c", "c"]:
+            text_to_children(text, cache)
+        cache.close()
+
+        cache = InlineCache(self.path, capacity=2)
+        self.assertEqual(list(cache.entries), ["c", "b"])
+        cache.close()
+
+    def test_capacity_evicts_least_recently_used(self):
+        cache = InlineCache(self.path, capacity=2)
+        for text in ["one", "two", "one", "two", "one", "three", "three"]:
+            text_to_children(text, cache)
+        self.assertEqual(list(cache.entries), ["one", "three"])
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size, len("one") * 2 + len("three") * 2)
+        cache.close()
+
+    def test_long_text_is_not_memoized(self):
+        cache = InlineCache(self.path)
+        text = "word " * MAX_MEMO_TEXT
+        self.assertEqual(
+            "".join(child.to_html() for child in text_to_children(text, cache)),
+            "".join(child.to_html() for child in text_to_children(text)),
+        )
+        self.assertEqual(len(cache.entries), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        cache.close()
+
+    def test_build_writes_entries_once(self):
+        content_dir = os.path.join(self.tmp.name, "content")
+        template_path = os.path.join(self.tmp.name, "template.html")
+        write_file(template_path, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(3):
+            write_file(os.path.join(content_dir, f"page{i}.md"), MARKDOWN)
+        generate_pages_recursive(
+            content_dir, template_path, os.path.join(self.tmp.name, "public"), options=RenderOptions(inline_cache_path=self.path),
+        )
+        build_cache = open_inline_caches.pop(self.path)
+        self.addCleanup(build_cache.close)
+        self.assertEqual(build_cache.uses, {})
+
+        cache = InlineCache(self.path)
+        self.assertEqual(len(cache.entries), 4)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
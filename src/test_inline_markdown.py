@@ -1,3 +1,6 @@
+import io
+import random
+import timeit
 import unittest
 from htmlnode import HTMLNode
 from textnode import TextNode
@@ -17,7 +20,10 @@ from inline_markdown import (
     block_to_block_type, 
     text_to_children, 
     markdown_to_html_node,
-    extract_title
+    extract_title,
+    extract_markdown_images,
+    extract_markdown_links,
+    BlockScanner,
 )
 
 
@@ -170,6 +176,14 @@ class TestInlineMarkdown(unittest.TestCase):
         self.assertEqual(result[2].text_type, text_type_link)
         self.assertEqual(result[2].url, "url2")
 
+    def test_split_nodes_link_duplicates(self):
+        node = TextNode("[a](u) and [a](u), [a](u)", text_type_text)
+        result = split_nodes_link([node])
+        self.assertEqual(
+            [(n.text, n.text_type) for n in result],
+            [("a", text_type_link), (" and ", text_type_text), ("a", text_type_link), (", ", text_type_text), ("a", text_type_link)],
+        )
+
     def test_split_nodes_link_no_links(self):
         node = TextNode("This is text without links", text_type_text)
         result = split_nodes_link([node])
@@ -295,6 +309,76 @@ class TestInlineMarkdown(unittest.TestCase):
         self.assertEqual(nodes[0].text, text)
         self.assertEqual(nodes[0].text_type, text_type_text)
 
+    def test_text_to_textnodes_matches_chained_splitters(self):
+        def chained(text):
+            nodes = [TextNode(text, text_type_text)]
+            nodes = split_nodes(nodes, "**", text_type_bold)
+            nodes = split_nodes(nodes, "*", text_type_italic)
+            nodes = split_nodes(nodes, "`", text_type_code)
+            nodes = split_nodes_image(nodes)
+            nodes = split_nodes_link(nodes)
+            return [(node.text, node.text_type, node.url) for node in nodes if node.text != ""]
+
+        pieces = ["*", "**", "`", "[", "]", "(", ")", "!", "a", " ", "![x](u)", "[l](v)", "![](w)"]
+        rng = random.Random(1234)
+        for _ in range(5000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 14)))
+            nodes = [(node.text, node.text_type, node.url) for node in text_to_textnodes(text)]
+            self.assertEqual(nodes, chained(text), text)
+
+    def test_text_to_textnodes_link_inside_image_gap(self):
+        nodes = text_to_textnodes("[a ![b](c) and [d](e)")
+        self.assertEqual(
+            [(node.text, node.text_type, node.url) for node in nodes],
+            [
+                ("[a ", text_type_text, None),
+                ("b", text_type_image, "c"),
+                (" and ", text_type_text, None),
+                ("d", text_type_link, "e"),
+            ],
+        )
+
+    def test_text_to_textnodes_link_around_image_or_bang(self):
+        nodes = text_to_textnodes("[a](b![c](d) [wow!](e!)")
+        self.assertEqual(
+            [(node.text, node.text_type, node.url) for node in nodes],
+            [
+                ("[a](b", text_type_text, None),
+                ("c", text_type_image, "d"),
+                (" ", text_type_text, None),
+                ("wow!", text_type_link, "e!"),
+            ],
+        )
+
+    def test_unclosed_brackets_are_linear(self):
+        # Each of these made the old image and link regexes backtrack over
+        # the rest of the text from every bracket. Eight times the input
+        # should take about eight times as long, where the regexes took 64.
+        texts = [
+            lambda n: "[" + "![x](" * n,
+            lambda n: "![" * n + "]",
+            lambda n: "[a](" * n + ")",
+            lambda n: "[" * n,
+            lambda n: "[" * n + "](" * n,
+            lambda n: "![a](" + "[b](" * n,
+        ]
+        parsers = [
+            text_to_textnodes,
+            extract_markdown_images,
+            extract_markdown_links,
+            lambda text: split_nodes_image([TextNode(text, text_type_text)]),
+            lambda text: split_nodes_link([TextNode(text, text_type_text)]),
+        ]
+
+        def parse_time(parse, text):
+            return min(timeit.repeat(lambda: parse(text), number=5, repeat=5))
+
+        for make_text in texts:
+            small, large = make_text(500), make_text(4000)
+            for parse in parsers:
+                ratio = parse_time(parse, large) / parse_time(parse, small)
+                self.assertLess(ratio, 24, small[:20])
+
     def test_markdown_to_blocks_basic(self):
         markdown = """
 # This is a heading
@@ -360,6 +444,70 @@ And here's a paragraph after the code block.
         self.assertEqual(len(blocks), 1)
         self.assertEqual(blocks[0], "This is a single block without any newlines.")
 
+    def test_markdown_to_blocks_matches_split_on_blank_lines(self):
+        # Without fences, blocks are exactly the blank-line separated chunks
+        pieces = ["\n", "\n\n", "\n\n\n", " ", "\t", "a", "# h", "* x", "1. y", "> q", "`"]
+        rng = random.Random(1234)
+        for _ in range(2000):
+            markdown = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 16)))
+            expected = [block.strip() for block in markdown.split("\n\n") if block.strip()]
+            self.assertEqual(markdown_to_blocks(markdown), expected, repr(markdown))
+
+    def test_block_scanner_positions(self):
+        markdown = "# Title\n\n\n  indented\nline two\n\n* a\n* b\n"
+        scanner = BlockScanner()
+        blocks = list(scanner.scan(io.StringIO(markdown)))
+        self.assertEqual([block.text for block in blocks], ["# Title", "indented\nline two", "* a\n* b"])
+        self.assertEqual([block.line for block in blocks], [1, 4, 7])
+        for block in blocks:
+            self.assertTrue(markdown.startswith(block.text, block.offset))
+        self.assertEqual([block.block_type for block in blocks], ["heading", "paragraph", "unordered_list"])
+        self.assertEqual(blocks[2].lines, ["* a", "* b"])
+        self.assertEqual(scanner.title, "Title")
+
+    def test_markdown_to_blocks_code_block_with_blank_lines(self):
+        markdown = "Intro\n\n```python\nx = 1\n\n\n# not a title\ny = 2\n```\nAfter"
+        scanner = BlockScanner()
+        blocks = list(scanner.scan(markdown.split("\n")))
+        self.assertEqual([block.block_type for block in blocks], ["paragraph", "code", "paragraph"])
+        self.assertEqual(blocks[1].text, "```python\nx = 1\n\n\n# not a title\ny = 2\n```")
+        self.assertEqual(blocks[2].line, 10)
+        self.assertIsNone(scanner.title)
+
+    def test_markdown_to_blocks_fence_interrupts_paragraph(self):
+        blocks = markdown_to_blocks("Some text\n```\ncode\n```")
+        self.assertEqual(blocks, ["Some text", "```\ncode\n```"])
+
+    def test_markdown_to_blocks_unclosed_fence(self):
+        blocks = markdown_to_blocks("```\na\n\nb\n\n")
+        self.assertEqual(blocks, ["```\na\n\nb"])
+
+    def test_markdown_to_blocks_inline_code_is_not_a_fence(self):
+        blocks = markdown_to_blocks("```code```\n\nnext")
+        self.assertEqual(blocks, ["```code```", "next"])
+
+    def test_block_scanner_front_matter(self):
+        markdown = "---\ntitle: \"Custom: title\"\ndate: 2024-01-02\n---\n# Heading\n\nText"
+        scanner = BlockScanner()
+        blocks = list(scanner.scan(io.StringIO(markdown)))
+        self.assertEqual(scanner.front_matter, {"title": "Custom: title", "date": "2024-01-02"})
+        self.assertEqual([block.text for block in blocks], ["# Heading", "Text"])
+        self.assertEqual([block.line for block in blocks], [5, 7])
+        for block in blocks:
+            self.assertTrue(markdown.startswith(block.text, block.offset))
+
+    def test_block_scanner_unclosed_front_matter_is_markdown(self):
+        scanner = BlockScanner()
+        blocks = list(scanner.scan(["---", "title: x", "", "# Heading"]))
+        self.assertEqual(scanner.front_matter, {})
+        self.assertEqual([block.text for block in blocks], ["---\ntitle: x", "# Heading"])
+        self.assertEqual(scanner.title, "Heading")
+
+    def test_block_scanner_no_title(self):
+        scanner = BlockScanner()
+        list(scanner.scan(["just text", "", "## not a title"]))
+        self.assertIsNone(scanner.title)
+
     def test_block_to_block_type_paragraph(self):
         block = "This is a simple paragraph."
         self.assertEqual(block_to_block_type(block), "paragraph")
@@ -439,6 +587,21 @@ And here's a paragraph after the code block.
         self.assertEqual(html_node.children[0].tag, "h1")
         self.assertEqual(html_node.children[1].tag, "h2")
 
+    def test_heading_ids(self):
+        html_node = markdown_to_html_node("## Hello, **World**!\n\n### `re.sub()` & co-ops\n\n# ???")
+        self.assertEqual(
+            html_node.to_html(),
+            '<div><h2 id="hello-world">Hello, <b>World</b>!</h2>'
+            '<h3 id="resub--co-ops"><code>re.sub()</code> & co-ops</h3><h1>???</h1></div>',
+        )
+
+    def test_repeated_heading_ids_are_numbered(self):
+        html_node = markdown_to_html_node("# Setup\n\n## Setup\n\n## Setup 1\n\n### Setup!\n\n## Other")
+        self.assertEqual(
+            [child.props for child in html_node.children],
+            [{"id": "setup"}, {"id": "setup-1"}, {"id": "setup-1-1"}, {"id": "setup-2"}, {"id": "other"}],
+        )
+
     def test_markdown_to_html_node_code(self):
         markdown = "```\ncode block\n```"
         html_node = markdown_to_html_node(markdown)
@@ -447,6 +610,18 @@ And here's a paragraph after the code block.
         self.assertEqual(html_node.children[0].tag, "pre")
         self.assertEqual(html_node.children[0].children[0].tag, "code")
 
+    def test_markdown_to_html_node_code_is_escaped_not_parsed(self):
+        markdown = "````\nif a < b && *c*:\n\n    ```\n    [x](y)\n````"
+        html_node = markdown_to_html_node(markdown)
+        self.assertEqual(
+            html_node.to_html(),
+            "<div><pre><code>if a &lt; b &amp;&amp; *c*:\n\n    ```\n    [x](y)</code></pre></div>",
+        )
+
+    def test_markdown_to_html_node_indented_fence(self):
+        html_node = markdown_to_html_node("  ```\n  a\n    b\nc\n  ```")
+        self.assertEqual(html_node.to_html(), "<div><pre><code>a\n  b\nc</code></pre></div>")
+
     def test_markdown_to_html_node_quote(self):
         markdown = "> This is a quote\n> Multiple lines"
         html_node = markdown_to_html_node(markdown)
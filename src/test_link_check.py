@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from inline_markdown import BlockScanner
+from link_check import BrokenLink, LinkChecker, check_links, list_files, page_links
+from page_generator import generate_pages_recursive
+from site_files import PageRecords
+from test_helpers import TEMPLATE, write_file
+
+
+class TestLinkCheck(unittest.TestCase):
+    def test_page_links(self):
+        markdown = "See [a](/a/) and ![pic](/p.png)\n\n`[not](/a link)`\n\n```\n[code](/x)\n```\n\n* [a](/a/) again"
+        blocks = list(BlockScanner().scan(markdown.split("\n")))
+        self.assertEqual(page_links(blocks), ["/a/", "/p.png"])
+
+    def test_page_links_in_lists_and_quotes(self):
+        markdown = (
+            "* [one](/1)\n* [two](/2)\n* [three](/3)\n\n"
+            "1. [four](/4)\n2. [five](/5)\n\n"
+            "> [six](/6) and\n> [seven](/7)"
+        )
+        blocks = list(BlockScanner().scan(markdown.split("\n")))
+        self.assertEqual(page_links(blocks), ["/1", "/2", "/3", "/4", "/5", "/6", "/7"])
+
+    def test_check_url(self):
+        files = {"index.html", "blog/index.html", "blog/post.html", "images/cat.png"}
+        anchors = {"index.html": {"intro"}, "blog/post.html": {"setup", "usage"}}
+        checker = LinkChecker(files, anchors)
+        valid = [
+            "/", "/blog/", "/blog", "post.html", "./post.html#usage", "../images/cat.png", "/images/cat%2Epng",
+            "https://example.com/missing", "//cdn.example.com/x.js", "mailto:someone@example.com",
+            "/blog/post.html?page=2#setup", "/images/cat.png#anything", "#", "/#intro",
+        ]
+        for url in valid:
+            self.assertIsNone(checker.check_url("/blog/post.html", url), url)
+        self.assertEqual(checker.check_url("/blog/post.html", "missing.html"), "missing target")
+        self.assertEqual(checker.check_url("/blog/post.html", "/post.html"), "missing target")
+        self.assertEqual(checker.check_url("/blog/post.html", "#intro"), "missing anchor")
+        self.assertEqual(checker.check_url("/blog/", "post.html#nope"), "missing anchor")
+        self.assertIsNone(checker.check_url("/blog/", "post.html#setup"))
+
+    def test_check_links_after_build(self):
+        with tempfile.TemporaryDirectory() as root:
+            content_dir = os.path.join(root, "content")
+            public_dir = os.path.join(root, "public")
+            template_path = os.path.join(root, "template.html")
+            write_file(template_path, TEMPLATE)
+            write_file(os.path.join(public_dir, "images", "logo.png"), "")
+            write_file(os.path.join(content_dir, "index.md"), "# Home\n\n[Guide](/guide/#getting-started) ![logo](/images/logo.png)\n\n[Old](/old/) [Top](#home)")
+            write_file(os.path.join(content_dir, "guide", "index.md"), "# Guide\n\n## Getting started\n\n[Back](../) [Nowhere](../#nowhere)")
+
+            records = PageRecords(os.path.join(root, "records.json"))
+            generate_pages_recursive(content_dir, template_path, public_dir, records=records)
+            self.assertEqual(list_files(public_dir), {"index.html", "guide/index.html", "images/logo.png"})
+            self.assertEqual(
+                check_links(public_dir, records),
+                [BrokenLink("/", "/old/", "missing target"), BrokenLink("/guide/", "../#nowhere", "missing anchor")],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
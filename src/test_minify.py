@@ -0,0 +1,179 @@
+import io
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from fingerprint import fingerprint_directory
+from minify import HtmlMinifier, MinifyCache, MinifyStats, html_stats, minify_css
+from output_writer import ChangeList, RewriteWriter
+from page_generator import RenderOptions, generate_pages_recursive
+from pipeline import PagePipeline
+from static_sync import load_state, sync_directory
+from test_helpers import TempDirTestCase, read_file, write_file
+
+TEMPLATE = "<html>\n  <head>\n    <title>{{ Title }}</title>\n  </head>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n"
+CSS = "/* Site styles */\nbody {\n  color : black;\n  margin: 0;\n}\n\na:hover,\na > b { content: \" ;} \"; }\n"
+
+
+def minify_html(*chunks):
+    minifier = HtmlMinifier(MinifyStats())
+    return ''.join(minifier.rewrite(chunk, "/") for chunk in chunks)
+
+
+class TestHtmlMinifier(unittest.TestCase):
+    def test_collapses_whitespace(self):
+        self.assertEqual(
+            minify_html("<div>\n  <p>Some   <b>bold</b>\n  text </p>\n  <!-- note -->\n</div>\n"),
+            "<div><p>Some <b>bold</b> text</p></div>",
+        )
+
+    def test_keeps_preformatted_text(self):
+        html = "<div>\n<pre><code>a  b\n    c\n</code></pre>\n<textarea>  x\n</textarea>\n</div>"
+        self.assertEqual(minify_html(html), "<div><pre><code>a  b\n    c\n</code></pre><textarea>  x\n</textarea></div>")
+
+    def test_chunks_give_the_same_result(self):
+        chunks = ["<p>\n  one ", "<i>two</i>", "\n  three", "</p>\n", "<pre>", "<code>  four\n</code>", "</pre>", "\n"]
+        self.assertEqual(minify_html(*chunks), minify_html(''.join(chunks)))
+        self.assertEqual(minify_html(*chunks), "<p>one <i>two</i> three</p><pre><code>  four\n</code></pre>")
+
+    def test_keeps_non_breaking_spaces(self):
+        self.assertEqual(minify_html("<p>10\xa0km \xa0 and\xa0</p>"), "<p>10\xa0km \xa0 and\xa0</p>")
+        self.assertEqual(minify_css("p::after { content: ''; margin:\xa00 }"), "p::after{content:'';margin:\xa00}")
+
+    def test_placeholder_inside_a_tag(self):
+        html = '<head>\n  <meta name="description" content="Two  spaces">\n</head>\n'
+        out = io.StringIO()
+        writer = RewriteWriter(out, [HtmlMinifier(MinifyStats())], "/")
+        for chunk in ('<head>\n  <meta name="description" content="', "Two  spaces", '">\n</head>\n'):
+            writer.write(chunk)
+        writer.finish()
+        self.assertEqual(out.getvalue(), minify_html(html))
+        self.assertEqual(out.getvalue(), '<head><meta name="description" content="Two  spaces"></head>')
+
+    def test_counts_bytes(self):
+        stats = MinifyStats()
+        minifier = HtmlMinifier(stats)
+        minifier.rewrite("<p>\n  x\n</p>\n", "/")
+        self.assertEqual(stats.types, {".html": [1, 13, 8]})
+
+
+class TestMinifyCss(unittest.TestCase):
+    def test_minify_css(self):
+        self.assertEqual(minify_css(CSS), 'body{color :black;margin:0}a:hover,a>b{content:" ;} "}')
+
+    def test_keeps_licence_comments_and_separators(self):
+        self.assertEqual(
+            minify_css("/*! MIT */\n@media (min-width: 600px) { p { margin: calc(1px + 2px) } }\na/**/b {}"),
+            "/*! MIT */ @media (min-width:600px){p{margin:calc(1px + 2px)}}a b{}",
+        )
+
+
+class TestMinifyStatic(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        self.state_path = os.path.join(root, "cache", "static.json")
+        self.minifier = MinifyCache(os.path.join(root, "cache", "minify"))
+        self.write("site.css", CSS)
+        self.write("notes.txt", "  left  alone  ")
+
+    def write(self, rel_path, text):
+        write_file(os.path.join(self.static_dir, rel_path), text)
+
+    def read(self, rel_path):
+        return read_file(os.path.join(self.public_dir, rel_path))
+
+    def test_sync_writes_minified_css(self):
+        stats = sync_directory(self.static_dir, self.public_dir, self.state_path, minifier=self.minifier)
+        self.assertEqual((stats.copied, stats.unchanged), (2, 0))
+        self.assertEqual(self.read("site.css"), minify_css(CSS))
+        self.assertEqual(self.read("notes.txt"), "  left  alone  ")
+        self.assertEqual(self.minifier.stats.types, {".css": [1, len(CSS), len(minify_css(CSS))]})
+
+        # Unchanged files aren't hashed or minified again
+        os.remove(os.path.join(self.minifier.cache_dir, os.listdir(self.minifier.cache_dir)[0]))
+        stats = sync_directory(self.static_dir, self.public_dir, self.state_path, minifier=MinifyCache(self.minifier.cache_dir))
+        self.assertEqual((stats.copied, stats.unchanged), (0, 2))
+        self.assertEqual(os.listdir(self.minifier.cache_dir), [])
+
+        # Without a minifier the original comes back
+        changes = ChangeList()
+        sync_directory(self.static_dir, self.public_dir, self.state_path, changes=changes)
+        self.assertEqual(changes.written, {"site.css"})
+        self.assertEqual(self.read("site.css"), CSS)
+
+    def test_checksum_sync(self):
+        sync_directory(self.static_dir, self.public_dir, self.state_path, checksum=True, minifier=self.minifier)
+        stats = sync_directory(self.static_dir, self.public_dir, self.state_path, checksum=True, minifier=self.minifier)
+        self.assertEqual((stats.copied, stats.unchanged), (0, 2))
+        self.write("site.css", "p { margin : 0 }")
+        sync_directory(self.static_dir, self.public_dir, self.state_path, checksum=True, minifier=self.minifier)
+        self.assertEqual(self.read("site.css"), "p{margin :0}")
+
+    def test_fingerprinted_copies_are_minified(self):
+        asset_state_path = os.path.join(self.tmp.name, "cache", "assets.json")
+        fingerprint_directory(self.static_dir, self.public_dir, asset_state_path)
+        plain = load_state(asset_state_path)["site.css"]["output"]
+        stats = fingerprint_directory(self.static_dir, self.public_dir, asset_state_path, minifier=self.minifier)
+        self.assertEqual((stats.written, stats.removed), (1, 1))
+        minified = load_state(asset_state_path)["site.css"]["output"]
+        self.assertNotEqual(minified, plain)
+        self.assertEqual(self.read(minified), minify_css(CSS))
+        stats = fingerprint_directory(self.static_dir, self.public_dir, asset_state_path, minifier=self.minifier)
+        self.assertEqual((stats.written, stats.unchanged), (0, 2))
+
+
+class TestMinifyPages(unittest.TestCase):
+    def test_pages_are_rebuilt_when_minification_is_toggled(self):
+        with tempfile.TemporaryDirectory() as root:
+            content_dir = os.path.join(root, "content")
+            public_dir = os.path.join(root, "public")
+            template_path = os.path.join(root, "template.html")
+            manifest_path = os.path.join(root, "cache", "manifest.json")
+            write_file(template_path, TEMPLATE)
+            write_file(os.path.join(content_dir, "index.md"), "# Home\n\nSome *text*\nhere.\n\n```\nkeep   this\n```")
+
+            def build(minify_html):
+                changes = ChangeList()
+                generate_pages_recursive(
+                    content_dir, template_path, public_dir, BuildManifest.load(manifest_path), changes=changes,
+                    options=RenderOptions(minify_html=minify_html),
+                )
+                with open(os.path.join(public_dir, "index.html")) as f:
+                    return changes.written, f.read()
+
+            self.assertIn("\n    <div>", build(False)[1])
+            written, page = build(True)
+            self.assertEqual(written, {"index.html"})
+            self.assertEqual(
+                page,
+                '<html><head><title>Home</title></head><body><div><h1 id="home">Home</h1>'
+                '<p>Some <i>text</i> here.</p><pre><code>keep   this</code></pre></div></body></html>',
+            )
+            self.assertEqual(build(True)[0], set())
+
+    def test_pages_minified_by_workers_are_counted(self):
+        with tempfile.TemporaryDirectory() as root:
+            content_dir = os.path.join(root, "content")
+            template_path = os.path.join(root, "template.html")
+            write_file(template_path, TEMPLATE)
+            for name in ("a", "b", "c"):
+                write_file(os.path.join(content_dir, f"{name}.md"), f"# {name}\n\nSome   text")
+            options = RenderOptions(minify_html=True)
+            builds = [
+                {"jobs": 2},
+                {"pipeline": PagePipeline(template_path, 2, io_threads=2, options=options)},
+            ]
+            for index, build in enumerate(builds):
+                before = list(html_stats.types.get(".html", [0, 0, 0]))
+                generate_pages_recursive(content_dir, template_path, os.path.join(root, f"public{index}"), options=options, **build)
+                files, bytes_in, bytes_out = (after - start for after, start in zip(html_stats.types[".html"], before))
+                self.assertEqual(files, 3)
+                self.assertGreater(bytes_in, bytes_out)
+
+
+if __name__ == "__main__":
+    unittest.main()
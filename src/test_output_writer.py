@@ -0,0 +1,87 @@
+import io
+import os
+import unittest
+
+from output_writer import AtomicOutput, ChangeList, RewriteWriter, prune_directory, write_output
+from test_helpers import TempDirTestCase, write_file
+
+
+class TestOutputWriter(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.path = os.path.join(self.root, "page.html")
+
+    def test_unchanged_content_keeps_file(self):
+        self.assertTrue(write_output(self.path, "<p>hello</p>"))
+        os.utime(self.path, ns=(1_000_000_000, 1_000_000_000))
+        inode = os.stat(self.path).st_ino
+        self.assertFalse(write_output(self.path, "<p>hello</p>"))
+        stat = os.stat(self.path)
+        self.assertEqual((stat.st_mtime_ns, stat.st_ino), (1_000_000_000, inode))
+        self.assertEqual(os.listdir(self.root), ["page.html"])
+
+    def test_changed_content_replaces_file(self):
+        write_output(self.path, "<p>hello</p>")
+        # Same size, different content
+        self.assertTrue(write_output(self.path, "<p>world</p>"))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "<p>world</p>")
+        self.assertEqual(os.listdir(self.root), ["page.html"])
+
+    def test_abort_leaves_destination_alone(self):
+        write_output(self.path, "old")
+        output = AtomicOutput(self.path)
+        output.write("half a pa")
+        output.abort()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(self.root), ["page.html"])
+
+    def test_failed_rename_removes_temp_file(self):
+        os.makedirs(self.path)
+        with self.assertRaises(IsADirectoryError):
+            write_output(self.path, "text")
+        self.assertEqual(os.listdir(self.root), ["page.html"])
+
+    def test_change_list(self):
+        changes = ChangeList()
+        changes.write(os.path.join("blog", "post.html"))
+        changes.write("index.css")
+        changes.remove("old.html")
+        changes.remove("index.css")
+        list_path = os.path.join(self.root, "cache", "changed.txt")
+        changes.save(list_path)
+        with open(list_path) as f:
+            self.assertEqual(f.read(), "M blog/post.html\nD index.css\nD old.html\n")
+
+    def test_prune_directory(self):
+        for rel_path in ["keep.html", "drop.html", os.path.join("a", "b", "drop.html"), os.path.join("c", "keep.css")]:
+            write_file(os.path.join(self.root, rel_path), rel_path)
+        changes = ChangeList()
+        removed = prune_directory(self.root, {"keep.html", os.path.join("c", "keep.css")}, changes)
+        self.assertEqual(removed, 2)
+        self.assertEqual(sorted(os.listdir(self.root)), ["c", "keep.html"])
+        self.assertEqual(changes.removed, {"drop.html", "a/b/drop.html"})
+
+    def test_rewriters_see_whole_tags(self):
+        class Chunks:
+            def __init__(self):
+                self.chunks = []
+
+            def rewrite(self, html, page_path):
+                self.chunks.append(html)
+                return html
+
+        out = io.StringIO()
+        chunks = Chunks()
+        writer = RewriteWriter(out, [chunks], "/")
+        for text in ['<meta content="', 'a &gt; b', '"><p>x', '</p><!-- note <b> ', '-->', '<img src="']:
+            writer.write(text)
+        writer.finish()
+        self.assertEqual(out.getvalue(), '<meta content="a &gt; b"><p>x</p><!-- note <b> --><img src="')
+        self.assertEqual(chunks.chunks, ['<meta content="a &gt; b"><p>x', '</p>', '<!-- note <b> -->', '<img src="'])
+
+
+if __name__ == "__main__":
+    unittest.main()
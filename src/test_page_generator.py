@@ -0,0 +1,71 @@
+import os
+import unittest
+from unittest import mock
+
+import page_generator
+from output_writer import ChangeList
+from page_generator import generate_pages_recursive
+from test_helpers import TEMPLATE, TempDirTestCase, read_tree, write_file
+
+
+class TestGeneratePagesRecursive(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.template_path = os.path.join(root, "template.html")
+        write_file(self.template_path, TEMPLATE)
+        for i in range(8):
+            write_file(os.path.join(self.content_dir, f"section{i % 3}", f"page{i}.md"), f"# Page {i}\n\nSome **bold** text and a [link](/page{i})\n\n* one\n* two")
+
+    def test_parallel_output_matches_serial(self):
+        serial_dir = os.path.join(self.tmp.name, "serial")
+        parallel_dir = os.path.join(self.tmp.name, "parallel")
+        self.assertEqual(generate_pages_recursive(self.content_dir, self.template_path, serial_dir), [])
+        self.assertEqual(generate_pages_recursive(self.content_dir, self.template_path, parallel_dir, jobs=3), [])
+        serial = read_tree(serial_dir)
+        self.assertEqual(len(serial), 8)
+        self.assertEqual(serial, read_tree(parallel_dir))
+
+    def test_rebuild_only_rewrites_changed_pages(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        generate_pages_recursive(self.content_dir, self.template_path, public_dir)
+        with open(os.path.join(self.content_dir, "section1", "page1.md"), "a") as f:
+            f.write("\n\nMore text")
+        changes = ChangeList()
+        self.assertEqual(generate_pages_recursive(self.content_dir, self.template_path, public_dir, jobs=2, changes=changes), [])
+        self.assertEqual(changes.written, {"section1/page1.html"})
+
+    def test_errors_are_collected_per_page(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        # A directory where the output file should go makes that write fail
+        os.makedirs(os.path.join(public_dir, "section0", "page0.html"))
+        errors = generate_pages_recursive(self.content_dir, self.template_path, public_dir, jobs=2)
+        self.assertEqual([md_path for md_path, _ in errors], [os.path.join(self.content_dir, "section0", "page0.md")])
+        self.assertIn("IsADirectoryError", errors[0][1])
+        self.assertEqual(len(read_tree(public_dir)), 7)
+
+    def test_dead_workers_only_fail_their_page(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        parent = os.getpid()
+        render_page = page_generator.render_page
+        crashing = os.path.join(self.content_dir, "section1", "page4.md")
+
+        def crash_on_one_page(lines, mtime, from_path, page_path, template_path, fp, **kwargs):
+            if from_path == crashing:
+                if os.getpid() == parent:
+                    raise RuntimeError("rendered in the parent process")
+                # Dies halfway through writing the page
+                fp.write("<p>partial")
+                fp.flush()
+                os._exit(1)
+            return render_page(lines, mtime, from_path, page_path, template_path, fp, **kwargs)
+
+        # Workers are forked, so they see the patched function too
+        with mock.patch.object(page_generator, "render_page", crash_on_one_page):
+            errors = generate_pages_recursive(self.content_dir, self.template_path, public_dir, jobs=2)
+        self.assertEqual(errors, [(crashing, page_generator.WORKER_DIED)])
+        self.assertEqual(len(read_tree(public_dir)), 7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+from unittest import mock
+
+import pipeline as pipeline_module
+from page_generator import WORKER_DIED, generate_pages_recursive
+from pipeline import PagePipeline
+from profiling import BuildProfiler
+from test_helpers import TempDirTestCase, read_tree, write_file
+
+TEMPLATE = "<title>{{ Title }}</title><meta content=\"{{ Description }}\">{{ Date }} {{ Path }}<body>{{ Content }}</body>"
+
+
+class TestPagePipeline(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.template_path = os.path.join(root, "template.html")
+        write_file(self.template_path, TEMPLATE)
+        for i in range(20):
+            write_file(os.path.join(self.content_dir, f"section{i % 4}", f"page{i}.md"), f"# Page {i}\n\nSome **bold** text & a [link](/page{i})\n\n```\na < b\n\nc\n```")
+
+    def test_output_matches_direct_build(self):
+        direct_dir = os.path.join(self.tmp.name, "direct")
+        self.assertEqual(generate_pages_recursive(self.content_dir, self.template_path, direct_dir), [])
+        expected = read_tree(direct_dir)
+        self.assertEqual(len(expected), 20)
+        for jobs in (1, 2):
+            public_dir = os.path.join(self.tmp.name, f"pipeline{jobs}")
+            # Tiny queues make every stage wait on the next one
+            pipeline = PagePipeline(self.template_path, jobs, io_threads=2, queue_size=1)
+            errors = generate_pages_recursive(self.content_dir, self.template_path, public_dir, pipeline=pipeline)
+            self.assertEqual(errors, [])
+            self.assertEqual(read_tree(public_dir), expected)
+            self.assertEqual(len(pipeline.directories), 4)
+
+    def test_errors_are_collected_per_page(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        os.makedirs(os.path.join(public_dir, "section0", "page0.html"))
+        pipeline = PagePipeline(self.template_path, io_threads=3, queue_size=2)
+        errors = generate_pages_recursive(self.content_dir, self.template_path, public_dir, pipeline=pipeline)
+        self.assertEqual([md_path for md_path, _ in errors], [os.path.join(self.content_dir, "section0", "page0.md")])
+        self.assertIn("IsADirectoryError", errors[0][1])
+        self.assertEqual(len(read_tree(public_dir)), 19)
+
+    def test_dead_workers_only_fail_their_page(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        parent = os.getpid()
+        render_page = pipeline_module.render_page
+        crashing = os.path.join(self.content_dir, "section1", "page5.md")
+
+        def crash_on_one_page(lines, mtime, from_path, *args, **kwargs):
+            if from_path == crashing:
+                if os.getpid() == parent:
+                    raise RuntimeError("rendered in the parent process")
+                os._exit(1)
+            return render_page(lines, mtime, from_path, *args, **kwargs)
+
+        # Workers are forked, so they see the patched function too
+        with mock.patch.object(pipeline_module, "render_page", crash_on_one_page):
+            pipeline = PagePipeline(self.template_path, 2, io_threads=2, queue_size=4)
+            errors = generate_pages_recursive(self.content_dir, self.template_path, public_dir, pipeline=pipeline)
+        self.assertEqual(errors, [(crashing, WORKER_DIED)])
+        self.assertEqual(len(read_tree(public_dir)), 19)
+
+    def test_missing_source_is_reported_in_order(self):
+        public_dir = os.path.join(self.tmp.name, "public")
+        pages = [
+            (os.path.join(self.content_dir, "section0", "page0.md"), "a.md", os.path.join(public_dir, "a.html")),
+            (os.path.join(self.content_dir, "missing.md"), "b.md", os.path.join(public_dir, "b.html")),
+            (os.path.join(self.content_dir, "section1", "page1.md"), "c.md", os.path.join(public_dir, "c.html")),
+        ]
+        results = PagePipeline(self.template_path, io_threads=2).run(pages)
+        self.assertEqual([result[0] is None for result in results], [True, False, True])
+        self.assertIn("FileNotFoundError", results[1][0])
+        self.assertEqual(sorted(os.listdir(public_dir)), ["a.html", "c.html"])
+
+    def test_pages_are_profiled(self):
+        for jobs in (1, 2):
+            profiler = BuildProfiler()
+            public_dir = os.path.join(self.tmp.name, f"pipeline{jobs}")
+            pipeline = PagePipeline(self.template_path, jobs, io_threads=2)
+            generate_pages_recursive(self.content_dir, self.template_path, public_dir, profiler=profiler, pipeline=pipeline)
+            self.assertEqual(len(profiler.pages), 20)
+            self.assertTrue({"read", "parse", "serialize", "write"} <= set(profiler.stage_totals()))
+            page = next(page for page in profiler.pages if page.path.endswith("page0.md"))
+            self.assertEqual(page.bytes_written, os.path.getsize(os.path.join(public_dir, "section0", "page0.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import gzip
+import os
+import unittest
+
+from output_writer import ChangeList
+from precompress import precompress_directory
+from test_helpers import TempDirTestCase, write_file
+
+PAGE = "<html><body>" + "<p>The road goes ever on and on</p>" * 40 + "</body></html>"
+
+
+class TestPrecompress(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.write("index.html", PAGE)
+        self.write(os.path.join("blog", "post.html"), PAGE)
+        self.write("tiny.css", "a{}")
+        self.write("image.png", "not text" * 100)
+
+    def write(self, rel_path, text):
+        write_file(os.path.join(self.root, rel_path), text)
+
+    def test_compresses_text_files_above_min_size(self):
+        changes = ChangeList()
+        stats = precompress_directory(self.root, workers=2, changes=changes)
+        self.assertEqual(stats.compressed, 2)
+        self.assertEqual(stats.skipped, 1)
+        self.assertEqual(changes.written, {"index.html.gz", "blog/post.html.gz"})
+        with gzip.open(os.path.join(self.root, "index.html.gz"), "rt") as f:
+            self.assertEqual(f.read(), PAGE)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "image.png.gz")))
+
+    def test_up_to_date_siblings_are_skipped(self):
+        precompress_directory(self.root)
+        stats = precompress_directory(self.root)
+        self.assertEqual((stats.compressed, stats.unchanged), (0, 2))
+
+        self.write("index.html", PAGE + "<!-- changed -->")
+        os.utime(os.path.join(self.root, "index.html"), ns=(1, 1))
+        stats = precompress_directory(self.root)
+        self.assertEqual((stats.compressed, stats.unchanged), (1, 1))
+        with gzip.open(os.path.join(self.root, "index.html.gz"), "rt") as f:
+            self.assertTrue(f.read().endswith("<!-- changed -->"))
+
+    def test_orphaned_and_too_small_siblings_are_removed(self):
+        precompress_directory(self.root)
+        os.remove(os.path.join(self.root, "blog", "post.html"))
+        changes = ChangeList()
+        stats = precompress_directory(self.root, min_size=len(PAGE) + 1, changes=changes)
+        self.assertEqual(stats.removed, 2)
+        self.assertEqual(changes.removed, {"index.html.gz", "blog/post.html.gz"})
+        self.assertEqual(sorted(os.listdir(self.root)), ["blog", "image.png", "index.html", "tiny.css"])
+
+    def test_output_is_deterministic(self):
+        precompress_directory(self.root, gzip_level=6)
+        with open(os.path.join(self.root, "index.html.gz"), "rb") as f:
+            first = f.read()
+        os.utime(os.path.join(self.root, "index.html"), ns=(1, 1))
+        precompress_directory(self.root, gzip_level=6)
+        with open(os.path.join(self.root, "index.html.gz"), "rb") as f:
+            self.assertEqual(f.read(), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import time
+import unittest
+
+from page_generator import generate_pages_recursive
+from profiling import BuildProfiler, PageProfile, TimedReader, TimedWriter
+from test_helpers import TempDirTestCase, write_file
+
+
+class TestProfiling(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.template_path = os.path.join(root, "template.html")
+        self.public_dir = os.path.join(root, "public")
+        write_file(self.template_path, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(3):
+            write_file(os.path.join(self.content_dir, f"page{i}.md"), f"# Page {i}\n\n" + "Some **text**. " * (10 ** i))
+
+    def test_collects_stages_pages_and_bytes(self):
+        profiler = BuildProfiler()
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, profiler=profiler)
+        self.assertEqual(len(profiler.pages), 3)
+        self.assertEqual(
+            set(profiler.stage_totals()),
+            {"walk", "hash", "read", "parse", "serialize", "write"},
+        )
+        page = next(page for page in profiler.pages if page.path.endswith("page2.md"))
+        self.assertEqual(page.bytes_read, os.path.getsize(os.path.join(self.content_dir, "page2.md")))
+        self.assertEqual(page.bytes_written, os.path.getsize(os.path.join(self.public_dir, "page2.html")))
+        summary = profiler.summary(top=2)
+        self.assertIn("slowest 2 page(s)", summary)
+
+    def test_write_trace(self):
+        profiler = BuildProfiler()
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, profiler=profiler)
+        trace_path = os.path.join(self.tmp.name, "trace.json")
+        profiler.write_trace(trace_path)
+        with open(trace_path) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(len(events), len(profiler.spans))
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+
+    def test_mark_split(self):
+        profile = PageProfile("page.md")
+        profile.mark_split("serialize", "write", 0.0)
+        self.assertEqual([stage for stage, _, _ in profile.spans], ["serialize", "write"])
+        profile.mark_split("parse", "read", 0.0, first=True)
+        self.assertEqual([stage for stage, _, _ in profile.spans[2:]], ["read", "parse"])
+
+    def test_read_covers_reading_the_markdown(self):
+        write_file(os.path.join(self.content_dir, "big.md"), "# Big\n\n" + "A line of text.\n" * 50000)
+        profiler = BuildProfiler()
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, profiler=profiler)
+        page = next(page for page in profiler.pages if page.path.endswith("big.md"))
+        reads = [duration for stage, _, duration in page.spans if stage == "read"]
+        self.assertEqual(len(reads), 1)
+        self.assertGreater(reads[0], 0)
+
+    def test_timed_reader(self):
+        def slow_lines():
+            for line in ["a\n", "b\n"]:
+                time.sleep(0.01)
+                yield line
+
+        reader = TimedReader(slow_lines())
+        self.assertEqual(list(reader), ["a\n", "b\n"])
+        self.assertGreaterEqual(reader.seconds, 0.02)
+
+    def test_timed_writer_passes_through(self):
+        buffer = io.StringIO()
+        writer = TimedWriter(buffer)
+        writer.writelines(["<p>", "hi", "</p>"])
+        writer.flush()
+        self.assertEqual(buffer.getvalue(), "<p>hi</p>")
+        self.assertGreaterEqual(writer.seconds, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
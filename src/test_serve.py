@@ -0,0 +1,123 @@
+import gzip
+import http.client
+import os
+import threading
+import unittest
+
+from precompress import precompress_directory
+from serve import make_server, parse_range
+from test_helpers import TempDirTestCase, write_file
+
+PAGE = "<html><body>" + "<p>Not all those who wander are lost</p>" * 50 + "</body></html>"
+
+
+class TestServe(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.write("index.html", PAGE)
+        self.write(os.path.join("blog", "index.html"), "<p>blog</p>")
+        self.write("image.png", bytes(range(256)) * 8)
+
+        self.server = make_server(self.root, 0, "127.0.0.1")
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+        self.addCleanup(self.connection.close)
+
+    def write(self, rel_path, data):
+        write_file(os.path.join(self.root, rel_path), data)
+
+    def request(self, path, headers=None, method="GET"):
+        # Every request reuses the same keep-alive connection
+        self.connection.request(method, path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_keep_alive_and_directory_index(self):
+        response, body = self.request("/")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body.decode(), PAGE)
+        response, body = self.request("/blog/")
+        self.assertEqual(body, b"<p>blog</p>")
+        response, _ = self.request("/blog")
+        self.assertEqual((response.status, response.getheader("Location")), (301, "/blog/"))
+        response, _ = self.request("/missing.html")
+        self.assertEqual(response.status, 404)
+
+    def test_conditional_requests(self):
+        response, _ = self.request("/index.html")
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+        response, body = self.request("/index.html", {"If-None-Match": etag})
+        self.assertEqual((response.status, body), (304, b""))
+        response, body = self.request("/index.html", {"If-Modified-Since": last_modified})
+        self.assertEqual(response.status, 304)
+        response, body = self.request("/index.html", {"If-None-Match": '"stale"'})
+        self.assertEqual(response.status, 200)
+
+    def test_byte_ranges(self):
+        response, body = self.request("/image.png", {"Range": "bytes=10-19"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader("Content-Range"), "bytes 10-19/2048")
+        self.assertEqual(body, bytes(range(10, 20)))
+        response, body = self.request("/image.png", {"Range": "bytes=-4"})
+        self.assertEqual(body, bytes(range(252, 256)))
+        response, body = self.request("/image.png", {"Range": "bytes=5000-"})
+        self.assertEqual(response.status, 416)
+        response, body = self.request("/image.png", {"Range": "bytes=0-1", "If-Range": '"old"'})
+        self.assertEqual((response.status, len(body)), (200, 2048))
+        response, body = self.request("/image.png", {"Range": "bytes=--5"})
+        self.assertEqual((response.status, len(body)), (200, 2048))
+        self.write("empty.txt", "")
+        response, body = self.request("/empty.txt", {"Range": "bytes=-5"})
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), "bytes */0")
+
+    def test_precompressed_sibling(self):
+        precompress_directory(self.root)
+        response, body = self.request("/index.html", {"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(gzip.decompress(body).decode(), PAGE)
+        response, body = self.request("/index.html")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body.decode(), PAGE)
+
+    def test_edited_file_is_not_served_from_cache(self):
+        self.request("/blog/")
+        self.write(os.path.join("blog", "index.html"), "<p>edited</p>")
+        response, body = self.request("/blog/")
+        self.assertEqual(body, b"<p>edited</p>")
+
+    def test_fingerprinted_assets_are_immutable(self):
+        self.write("site.0123456789.css", "a{}")
+        response, _ = self.request("/site.0123456789.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=31536000, immutable")
+        response, _ = self.request("/index.html")
+        self.assertIsNone(response.getheader("Cache-Control"))
+
+    def test_head(self):
+        response, body = self.request("/index.html", method="HEAD")
+        self.assertEqual(response.getheader("Content-Length"), str(len(PAGE)))
+        self.assertEqual(body, b"")
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 50), (0, 49))
+        self.assertEqual(parse_range("bytes=10-", 50), (10, 49))
+        self.assertEqual(parse_range("bytes=-100", 50), (0, 49))
+        self.assertEqual(parse_range("bytes=60-70", 50), "unsatisfiable")
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 50))
+        self.assertIsNone(parse_range("items=0-1", 50))
+        self.assertIsNone(parse_range("bytes=--5", 50))
+        self.assertIsNone(parse_range("bytes=-+5", 50))
+        self.assertIsNone(parse_range("bytes=+1-5", 50))
+        self.assertIsNone(parse_range("bytes=-", 50))
+        self.assertEqual(parse_range("bytes=-5", 0), "unsatisfiable")
+        self.assertEqual(parse_range("bytes=0-", 0), "unsatisfiable")
+
+
+if __name__ == "__main__":
+    unittest.main()
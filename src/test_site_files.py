@@ -0,0 +1,114 @@
+import json
+import os
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from build_manifest import BuildManifest
+from output_writer import ChangeList
+from page_generator import generate_pages_recursive
+from pipeline import PagePipeline
+from site_files import PageRecords, search_terms, updated_time, write_site_files
+from test_helpers import TEMPLATE, TempDirTestCase, read_file, write_file
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+class TestSiteFiles(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.public_dir = os.path.join(root, "public")
+        self.records_path = os.path.join(root, "cache", "page-records.json")
+        self.template_path = os.path.join(root, "template.html")
+        write_file(self.template_path, TEMPLATE)
+        self.write("index.md", "# Home\n\nWelcome to the **Shire**, see [the road](/road/)\n\n## Hobbits & Men")
+        self.write(os.path.join("road", "index.md"), "---\ndate: 2024-05-01\n---\n# The Road\n\nThe road goes ever on\n\n```\nsecret code\n```")
+
+    def write(self, rel_path, text):
+        write_file(os.path.join(self.content_dir, rel_path), text)
+
+    def build(self, records, **kwargs):
+        errors = generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, records=records, **kwargs)
+        self.assertEqual(errors, [])
+        return write_site_files(self.public_dir, records, "https://example.com/", "Example")
+
+    def read(self, name):
+        return read_file(os.path.join(self.public_dir, name))
+
+    def test_search_terms(self):
+        self.assertEqual(
+            search_terms("The **road** and the [Road](/ignored/url) a"),
+            {"the": 2, "road": 2, "and": 1},
+        )
+
+    def test_repeated_anchors_are_numbered(self):
+        self.write("index.md", "# Home\n\n## Notes\n\nOne\n\n## Notes\n\n## Home")
+        records = PageRecords(self.records_path)
+        self.build(records)
+        self.assertEqual(records.pages["index.md"]["anchors"], ["home", "notes", "notes-1", "home-1"])
+        self.assertIn('<h2 id="notes-1">Notes</h2>', self.read("index.html"))
+
+    def test_records_and_site_files(self):
+        records = PageRecords(self.records_path)
+        self.assertEqual(self.build(records), ["sitemap.xml", "feed.xml", "search-index.json"])
+        home = records.pages["index.md"]
+        self.assertEqual(home["url"], "/")
+        self.assertEqual(home["headings"], ["Home", "Hobbits & Men"])
+        self.assertEqual(home["description"], "Welcome to the Shire, see the road")
+        self.assertEqual(records.pages[os.path.join("road", "index.md")]["updated"], "2024-05-01T00:00:00Z")
+
+        sitemap = ElementTree.fromstring(self.read("sitemap.xml"))
+        self.assertEqual(
+            [url[0].text for url in sitemap],
+            ["https://example.com/", "https://example.com/road/"],
+        )
+        feed = ElementTree.fromstring(self.read("feed.xml"))
+        self.assertEqual([entry.find(f"{ATOM}title").text for entry in feed.iter(f"{ATOM}entry")], ["Home", "The Road"])
+
+        index = json.loads(self.read("search-index.json"))
+        self.assertEqual([page[:2] for page in index["pages"]], [["/", "Home"], ["/road/", "The Road"]])
+        self.assertEqual(index["terms"]["road"], [0, 1, 1, 2])
+        self.assertNotIn("secret", index["terms"])
+        self.assertEqual(list(index["terms"]), sorted(index["terms"]))
+
+    def test_unchanged_site_files_are_not_rewritten(self):
+        self.build(PageRecords(self.records_path))
+        changes = ChangeList()
+        records = PageRecords(self.records_path)
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, records=records)
+        self.assertEqual(write_site_files(self.public_dir, records, "https://example.com", "Example", changes), [])
+        self.assertEqual(changes.written, set())
+
+    def test_incremental_build_keeps_records_of_skipped_pages(self):
+        manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+        records = PageRecords(self.records_path)
+        self.build(records, manifest=BuildManifest(manifest_path))
+        records.save()
+
+        os.remove(os.path.join(self.content_dir, "index.md"))
+        self.write("new.md", "# New page")
+        records = PageRecords.load(self.records_path)
+        self.build(records, manifest=BuildManifest.load(manifest_path))
+        self.assertEqual(sorted(records.pages), ["new.md", os.path.join("road", "index.md")])
+        self.assertIn("<loc>https://example.com/new.html</loc>", self.read("sitemap.xml"))
+
+    def test_pipeline_collects_the_same_records(self):
+        records = PageRecords(self.records_path)
+        self.build(records)
+        piped = PageRecords(self.records_path)
+        pipeline = PagePipeline(self.template_path, io_threads=2, collect_records=True)
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, pipeline=pipeline, records=piped)
+        self.assertEqual(piped.pages, records.pages)
+
+    def test_updated_time(self):
+        self.assertEqual(updated_time("2024-05-01", 0, "/"), "2024-05-01T00:00:00Z")
+        self.assertEqual(updated_time("2024-05-01T12:30:00+02:00", 0, "/"), "2024-05-01T10:30:00Z")
+        self.assertEqual(updated_time("2024-05-01T12:30:00", 0, "/"), "2024-05-01T12:30:00Z")
+        # Anything else would end up in the feed and sitemap as is
+        self.assertEqual(updated_time("last week", 86400, "/"), "1970-01-02T00:00:00Z")
+        self.assertEqual(updated_time("2024-13-01", 86400, "/"), "1970-01-02T00:00:00Z")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest import mock
+
+import page_generator
+from build_manifest import BuildManifest
+from output_writer import ChangeList
+from page_generator import generate_pages_recursive
+from site_index import HEAD_LINES, SiteIndex, read_metadata
+from test_helpers import TempDirTestCase, write_file
+
+
+class TestSiteIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content_dir = os.path.join(self.tmp.name, "content")
+        self.index_path = os.path.join(self.tmp.name, "cache", "site-index.json")
+        self.write("index.md", "# Home\n\nWelcome")
+        self.write(os.path.join("blog", "index.md"), "---\ntitle: The Blog\n---\n# Ignored heading")
+        self.write(os.path.join("blog", "first.md"), "No heading here")
+
+    def write(self, rel_path, text, mtime=None):
+        write_file(os.path.join(self.content_dir, rel_path), text, mtime)
+
+    def test_read_metadata_only_reads_the_head(self):
+        self.write("early.md", "Intro\n\n# Early\n\n" + "text\n\n" * HEAD_LINES)
+        self.assertEqual(read_metadata(os.path.join(self.content_dir, "early.md")), ("Early", {}))
+        self.write("late.md", "text\n\n" * HEAD_LINES + "# Late")
+        self.assertEqual(read_metadata(os.path.join(self.content_dir, "late.md")), (None, {}))
+
+    def test_update_and_entries(self):
+        index = SiteIndex(self.index_path)
+        self.assertEqual(index.update(self.content_dir), 3)
+        self.assertEqual(
+            [(rel_path, entry["title"], entry["url"]) for rel_path, entry in index.entries()],
+            [
+                ("blog/first.md", "Untitled", "/blog/first.html"),
+                ("blog/index.md", "The Blog", "/blog/"),
+                ("index.md", "Home", "/"),
+            ],
+        )
+        self.assertEqual([rel_path for rel_path, _ in index.entries("blog/")], ["blog/first.md", "blog/index.md"])
+        self.assertEqual(index.pages["blog/index.md"]["front_matter"], {"title": "The Blog"})
+
+    def test_only_changed_pages_are_reread(self):
+        index = SiteIndex(self.index_path)
+        index.update(self.content_dir)
+        index.save()
+
+        index = SiteIndex.load(self.index_path)
+        self.assertEqual(index.update(self.content_dir), 0)
+        old_hash = index.pages["index.md"]["hash"]
+        self.write("index.md", "# New home", mtime=1_000_000_000)
+        os.remove(os.path.join(self.content_dir, "blog", "first.md"))
+        self.assertEqual(index.update(self.content_dir), 2)
+        self.assertEqual(index.pages["index.md"]["title"], "New home")
+        self.assertNotEqual(index.pages["index.md"]["hash"], old_hash)
+        self.assertNotIn("blog/first.md", index.pages)
+
+    def test_build_reuses_index_hashes(self):
+        template_path = os.path.join(self.tmp.name, "template.html")
+        write_file(template_path, "<title>{{ Title }}</title>{{ Content }}")
+        public_dir = os.path.join(self.tmp.name, "public")
+        manifest_path = os.path.join(self.tmp.name, "cache", "manifest.json")
+
+        def build():
+            index = SiteIndex.load(self.index_path)
+            index.update(self.content_dir)
+            index.save()
+            changes = ChangeList()
+            with mock.patch.object(page_generator, "hash_file", wraps=page_generator.hash_file) as hash_file:
+                generate_pages_recursive(
+                    self.content_dir, template_path, public_dir, BuildManifest.load(manifest_path), changes=changes,
+                    site_index=index,
+                )
+            # Only the template is hashed; pages come from the index
+            self.assertEqual(hash_file.call_count, 1)
+            return changes.written
+
+        self.assertEqual(len(build()), 3)
+        self.assertEqual(build(), set())
+        self.write("index.md", "# Changed")
+        self.assertEqual(build(), {"index.html"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+
+from static_sync import sync_directory
+from test_helpers import TempDirTestCase, write_file
+
+
+class TestStaticSync(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        self.state_path = os.path.join(root, ".build_cache", "static.json")
+        write_file(os.path.join(self.static_dir, "index.css"), "body {}")
+        write_file(os.path.join(self.static_dir, "images", "logo.png"), "png-bytes")
+
+    def sync(self, **kwargs):
+        return sync_directory(self.static_dir, self.public_dir, self.state_path, **kwargs)
+
+    def test_first_sync_copies_everything(self):
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.unchanged), (2, 0))
+        self.assertEqual(stats.bytes_copied, len("body {}") + len("png-bytes"))
+        with open(os.path.join(self.public_dir, "images", "logo.png")) as f:
+            self.assertEqual(f.read(), "png-bytes")
+
+    def test_second_sync_copies_nothing(self):
+        self.sync()
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.unchanged, stats.removed), (0, 2, 0))
+
+    def test_changed_file_is_recopied(self):
+        self.sync()
+        css_path = os.path.join(self.static_dir, "index.css")
+        write_file(css_path, "body { color: red }")
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.unchanged), (1, 1))
+
+    def test_checksum_skips_touched_but_identical_files(self):
+        self.sync()
+        css_path = os.path.join(self.static_dir, "index.css")
+        os.utime(css_path, ns=(0, 0))
+        stats = self.sync(checksum=True)
+        self.assertEqual((stats.copied, stats.unchanged), (0, 2))
+        self.assertEqual(os.stat(os.path.join(self.public_dir, "index.css")).st_mtime_ns, 0)
+
+    def test_removed_source_is_deleted_but_other_files_kept(self):
+        self.sync()
+        write_file(os.path.join(self.public_dir, "index.html"), "generated page")
+        os.remove(os.path.join(self.static_dir, "images", "logo.png"))
+        stats = self.sync()
+        self.assertEqual(stats.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "images", "logo.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, "index.html")))
+
+    def test_link_mode_hardlinks_and_never_writes_through(self):
+        stats = self.sync(link=True)
+        self.assertEqual(stats.linked, 2)
+        css_path = os.path.join(self.static_dir, "index.css")
+        public_css = os.path.join(self.public_dir, "index.css")
+        self.assertTrue(os.path.samefile(css_path, public_css))
+        # Replace the source with a new file; the old link must not be reused
+        os.remove(css_path)
+        write_file(css_path, "body { margin: 0 }")
+        self.sync()
+        self.assertFalse(os.path.samefile(css_path, public_css))
+        with open(public_css) as f:
+            self.assertEqual(f.read(), "body { margin: 0 }")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import os
+import tempfile
+import unittest
+
+from htmlnode import LeafNode, ParentNode
+from template import Template, load_template
+from page_generator import page_url
+from test_helpers import write_file
+
+
+class TestTemplate(unittest.TestCase):
+    def test_compiles_segments_and_slots(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}!")
+        self.assertEqual(template.segments, ["<title>", "</title>", "!"])
+        self.assertEqual(template.names, {"Title", "Content"})
+
+    def test_render_fills_every_slot(self):
+        template = Template("<h1>{{ Title }}</h1><p>{{ Date }}</p><h1>{{ Title }}</h1>")
+        self.assertEqual(
+            template.render({"Title": "Hi", "Date": "2024-01-01"}),
+            "<h1>Hi</h1><p>2024-01-01</p><h1>Hi</h1>",
+        )
+
+    def test_missing_values_are_left_in_place(self):
+        template = Template("{{ Title }} {{Unknown}}")
+        self.assertEqual(template.render({"Title": "Hi"}), "Hi {{Unknown}}")
+
+    def test_streams_html_nodes(self):
+        template = Template("<article>{{ Content }}</article>")
+        node = ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")])
+        buffer = io.StringIO()
+        template.write(buffer, {"Content": node})
+        self.assertEqual(buffer.getvalue(), "<article><p><b>bold</b> text</p></article>")
+
+    def test_load_template_is_cached_until_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            write_file(path, "{{ Title }}")
+            template = load_template(path)
+            self.assertIs(load_template(path), template)
+            write_file(path, "<b>{{ Title }}</b>")
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(load_template(path).render({"Title": "x"}), "<b>x</b>")
+
+    def test_page_url(self):
+        self.assertEqual(page_url("index.md"), "/")
+        self.assertEqual(page_url(os.path.join("majesty", "index.md")), "/majesty/")
+        self.assertEqual(page_url(os.path.join("blog", "post.md")), "/blog/post.html")
+
+
+if __name__ == "__main__":
+    unittest.main()
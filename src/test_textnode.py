@@ -9,6 +9,10 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a text node", "bold")
         self.assertEqual(node, node2)
 
+    def test_slots(self):
+        node = TextNode("This is a text node", "bold")
+        self.assertFalse(hasattr(node, "__dict__"))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
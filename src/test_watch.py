@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from build_manifest import BuildManifest, hash_file
+from page_generator import generate_pages_recursive
+from test_helpers import TempDirTestCase, read_file, write_file
+from watch import SiteWatcher, diff_snapshots
+
+
+class TestSiteWatcher(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        self.template_path = os.path.join(root, "template.html")
+        write_file(self.template_path, "{{ Title }}|{{ Content }}")
+        write_file(os.path.join(self.content_dir, "index.md"), "# Home")
+        write_file(os.path.join(self.content_dir, "about.md"), "# About")
+        write_file(os.path.join(self.static_dir, "images", "logo.png"), "png")
+        manifest = BuildManifest(os.path.join(root, "manifest.json"))
+        generate_pages_recursive(self.content_dir, self.template_path, self.public_dir, manifest)
+        self.watcher = SiteWatcher(self.content_dir, self.static_dir, self.template_path, self.public_dir, manifest)
+
+    def read(self, *parts):
+        return read_file(os.path.join(self.public_dir, *parts))
+
+    def test_no_changes(self):
+        self.assertIsNone(self.watcher.poll())
+
+    def test_rebuilds_only_the_edited_page(self):
+        about_mtime = os.path.getmtime(os.path.join(self.public_dir, "about.html"))
+        write_file(os.path.join(self.content_dir, "index.md"), "# Home\n\nEdited", mtime_ns=1)
+        self.assertEqual(self.watcher.poll(), (1, 0))
+        self.assertIn("Edited", self.read("index.html"))
+        self.assertEqual(os.path.getmtime(os.path.join(self.public_dir, "about.html")), about_mtime)
+
+    def test_template_change_rebuilds_every_page(self):
+        write_file(self.template_path, "<{{ Title }}>", mtime_ns=1)
+        self.assertEqual(self.watcher.poll(), (2, 0))
+        self.assertEqual(self.read("about.html"), "<About>")
+
+    def test_removed_page_and_static_sync(self):
+        os.remove(os.path.join(self.content_dir, "about.md"))
+        write_file(os.path.join(self.static_dir, "images", "new.png"), "new")
+        self.assertEqual(self.watcher.poll(), (1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "about.html")))
+        self.assertEqual(self.read("images", "new.png"), "new")
+        self.assertNotIn("about.md", self.watcher.manifest.pages)
+
+    def test_manifest_is_saved_after_each_rebuild(self):
+        write_file(os.path.join(self.content_dir, "index.md"), "# Home\n\nEdited", mtime_ns=1)
+        self.watcher.poll()
+        saved = BuildManifest.load(self.watcher.manifest.path)
+        self.assertEqual(saved.pages["index.md"]["source_hash"], hash_file(os.path.join(self.content_dir, "index.md")))
+
+    def test_removing_the_last_file_removes_its_directory(self):
+        write_file(os.path.join(self.content_dir, "blog", "2024", "post.md"), "# Post")
+        write_file(os.path.join(self.static_dir, "fonts", "a.woff"), "font")
+        self.assertEqual(self.watcher.poll(), (1, 1))
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, "blog", "2024", "post.html")))
+        os.remove(os.path.join(self.content_dir, "blog", "2024", "post.md"))
+        os.remove(os.path.join(self.static_dir, "fonts", "a.woff"))
+        self.assertEqual(self.watcher.poll(), (1, 1))
+        self.assertEqual(sorted(os.listdir(self.public_dir)), ["about.html", "index.html"])
+
+    def test_diff_snapshots(self):
+        old = {"a": (1, 1), "b": (1, 1)}
+        new = {"a": (2, 1), "c": (1, 1)}
+        self.assertEqual(diff_snapshots(old, new), (["a", "c"], ["b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,8 @@ text_type_image = "image"
 
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -0,0 +1,249 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from build_manifest import BuildManifest, hash_file
+from inline_cache import flush_inline_caches
+from main import CONTENT_DIR, STATIC_DIR, PUBLIC_DIR, TEMPLATE_PATH, MANIFEST_PATH, BLOCK_CACHE_PATH, INLINE_CACHE_PATH, main as build_site
+from page_generator import RenderOptions, generate_page, page_url
+from static_sync import transfer
+
+# Injected into every HTML page served by the watch server; the page reloads
+# itself whenever a rebuild finishes.
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = (
+    '<script>new EventSource("' + LIVE_RELOAD_PATH + '").onmessage = function () { location.reload(); };</script>'
+)
+
+
+def snapshot(root):
+    # Maps every file under root (relative path) to its (mtime, size)
+    files = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    stat = entry.stat()
+                    files[os.path.relpath(entry.path, root)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff_snapshots(old, new):
+    changed = [path for path, stat in new.items() if old.get(path) != stat]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class ReloadSignal:
+    def __init__(self):
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, reload_signal=None, **kwargs):
+        self.reload_signal = reload_signal
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            self.send_reload_events()
+            return
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, "index.html")
+        if path.endswith(".html") and os.path.isfile(path):
+            self.send_html_with_reload(path)
+            return
+        super().do_GET()
+
+    def send_html_with_reload(self, path):
+        with open(path, 'rb') as f:
+            body = f.read()
+        script = LIVE_RELOAD_SCRIPT.encode()
+        index = body.rfind(b"</body>")
+        body = body[:index] + script + body[index:] if index != -1 else body + script
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_reload_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        version = self.reload_signal.version
+        while True:
+            new_version = self.reload_signal.wait(version, timeout=15)
+            message = b"data: reload\n\n" if new_version != version else b": ping\n\n"
+            version = new_version
+            try:
+                self.wfile.write(message)
+                self.wfile.flush()
+            except OSError:
+                return
+
+    def log_message(self, format, *args):
+        if not self.path.startswith(LIVE_RELOAD_PATH):
+            super().log_message(format, *args)
+
+
+class SiteWatcher:
+    # Keeps the previous view of content/, static/ and template.html in
+    # memory and rebuilds only what depends on the files that changed:
+    # a markdown file maps to its page, a static file to its copy, and the
+    # template to every page.
+    def __init__(self, content_dir, static_dir, template_path, public_dir, manifest, options=None):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.public_dir = public_dir
+        self.manifest = manifest
+        self.options = options if options is not None else RenderOptions()
+        self.content = snapshot(content_dir)
+        self.static = snapshot(static_dir)
+        self.template_stat = self.stat_template()
+
+    def stat_template(self):
+        stat = os.stat(self.template_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self):
+        # Returns (pages rebuilt, assets synced), or None when nothing changed
+        content = snapshot(self.content_dir)
+        static = snapshot(self.static_dir)
+        template_stat = self.stat_template()
+
+        changed_pages, removed_pages = diff_snapshots(self.content, content)
+        changed_assets, removed_assets = diff_snapshots(self.static, static)
+        if template_stat != self.template_stat:
+            changed_pages = list(content)
+        changed_pages = [path for path in changed_pages if path.endswith('.md')]
+        removed_pages = [path for path in removed_pages if path.endswith('.md')]
+
+        self.content = content
+        self.static = static
+        self.template_stat = template_stat
+        if not (changed_pages or removed_pages or changed_assets or removed_assets):
+            return None
+
+        template_hash = hash_file(self.template_path)
+        for rel_path in changed_pages:
+            self.build_page(rel_path, template_hash)
+        if changed_pages and self.options.inline_cache_path:
+            flush_inline_caches()
+        for rel_path in removed_pages:
+            self.manifest.forget(rel_path)
+            self.remove_output(rel_path[:-3] + '.html')
+        if changed_pages or removed_pages:
+            # Saved as it changes, so a watcher that is killed doesn't
+            # leave the next build a stale manifest
+            self.manifest.save()
+        for rel_path in changed_assets:
+            transfer(os.path.join(self.static_dir, rel_path), os.path.join(self.public_dir, rel_path))
+        for rel_path in removed_assets:
+            self.remove_output(rel_path)
+        return len(changed_pages) + len(removed_pages), len(changed_assets) + len(removed_assets)
+
+    def build_page(self, rel_path, template_hash):
+        md_path = os.path.join(self.content_dir, rel_path)
+        output = rel_path[:-3] + '.html'
+        dest_path = os.path.join(self.public_dir, output)
+        self.manifest.forget(rel_path)
+        try:
+            generate_page(md_path, self.template_path, dest_path, page_url(rel_path), options=self.options)
+        except Exception as e:
+            print(f"Failed to generate page {md_path}: {type(e).__name__}: {e}")
+            return
+        self.manifest.record(rel_path, hash_file(md_path), template_hash, output)
+
+    def remove_output(self, output):
+        # Directories left empty go too, as with prune_directory
+        path = os.path.normpath(os.path.join(self.public_dir, output))
+        if os.path.exists(path):
+            os.remove(path)
+        directory = os.path.dirname(path)
+        while directory != os.path.normpath(self.public_dir) and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+
+def serve(public_dir, port, reload_signal):
+    handler = partial(LiveReloadHandler, directory=public_dir, reload_signal=reload_signal)
+    server = ThreadingHTTPServer(("", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the site on change and serve it with live reload")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.05,
+        help="seconds between polls of content/, static/ and template.html (default: 0.05)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Start from an up-to-date tree; later edits are rebuilt in-process
+    build_site(["--incremental", "--block-cache", "--inline-cache"])
+    manifest = BuildManifest.load(MANIFEST_PATH)
+    # Most saves touch a block or two, so the rest come from the block cache
+    options = RenderOptions(block_cache_path=BLOCK_CACHE_PATH, inline_cache_path=INLINE_CACHE_PATH)
+    watcher = SiteWatcher(CONTENT_DIR, STATIC_DIR, TEMPLATE_PATH, PUBLIC_DIR, manifest, options)
+
+    reload_signal = ReloadSignal()
+    server = serve(PUBLIC_DIR, args.port, reload_signal)
+    print(f"Serving {PUBLIC_DIR} at http://localhost:{args.port}/ (watching for changes)")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            start = time.perf_counter()
+            result = watcher.poll()
+            if result is None:
+                continue
+            pages, assets = result
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Rebuilt {pages} page(s) and {assets} asset(s) in {elapsed:.1f} ms")
+            reload_signal.notify()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
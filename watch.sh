@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# Build the site, then rebuild changed pages and assets on save and serve
+# public/ with live reload
+python3 src/watch.py --port 8888
\ No newline at end of file